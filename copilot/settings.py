@@ -117,3 +117,142 @@ CSRF_COOKIE_SECURE = False
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+
+# Vector index used by retrieve_top_k.
+# "memory": each process keeps its own resident index.
+# "mmap": the index is published as a read-only snapshot in VECTOR_SNAPSHOT_DIR
+# and memory-mapped by every worker, so they share the OS page cache.
+VECTOR_INDEX_STORAGE = os.getenv("VECTOR_INDEX_STORAGE", "memory")
+VECTOR_SNAPSHOT_DIR = os.path.join(BASE_DIR, "vector_snapshot")
+
+# Approximate nearest-neighbour search. "exact" scans every vector; "ivf" uses
+# an inverted-file index once the collection has ANN_MIN_VECTORS rows.
+# IVF_NLIST=0 picks ~sqrt(n) cells; raise IVF_NPROBE for recall, lower it for
+# latency (see `python manage.py ann_report`).
+VECTOR_INDEX_ANN = os.getenv("VECTOR_INDEX_ANN", "exact")
+ANN_MIN_VECTORS = 20000
+IVF_NLIST = 0
+IVF_NPROBE = 8
+
+# Int8 scalar quantization of the index (see productcatalogue/quantize.py):
+# "int8" scans one byte per dimension once the collection has QUANT_MIN_VECTORS
+# rows, then rescores the best QUANT_RESCORE_CANDIDATES rows in float32
+# (see `python manage.py ann_report --int8` for the recall/latency trade-off).
+VECTOR_INDEX_QUANTIZATION = os.getenv("VECTOR_INDEX_QUANTIZATION", "none")
+QUANT_MIN_VECTORS = 20000
+QUANT_RESCORE_CANDIDATES = 100
+
+# Batched exact scans (VectorIndex.search_batch) score as many queries per
+# matrix product as fit their float32 score matrix in this many MB.
+SEARCH_BATCH_MEMORY_MB = 64
+
+# Where vectors live: "numpy" (SQL table + resident index), "sql" (SQL table,
+# scanned per query) or "chroma" (Chroma collection CHROMA_COLLECTION on disk).
+VECTOR_STORE = os.getenv("VECTOR_STORE", "numpy")
+CHROMA_PATH = os.path.join(BASE_DIR, "chroma_db")
+CHROMA_COLLECTION = "copilot_vectors"
+# Rows per Chroma upsert() call when writing vectors (see ChromaBatchWriter).
+CHROMA_WRITE_BATCH_SIZE = 256
+
+# Rows per bulk upsert batch in store_product_and_embeddings /
+# store_faq_chunks_and_embeddings.
+INGEST_BATCH_SIZE = 1000
+
+# Upload ingestion embeds rows in batches bounded by an estimated token budget
+# and an item count, storing each batch before reading the next.
+EMBEDDING_BATCH_MAX_TOKENS = 50000
+EMBEDDING_BATCH_MAX_ITEMS = 256
+
+# Threads per process that run queued ingestion jobs (upload with async=true).
+# A "running" job with no progress for INGEST_JOB_STALE_SECONDS is requeued
+# (failed the second time) when a process starts its job pool.
+INGEST_WORKERS = 2
+INGEST_JOB_STALE_SECONDS = 900
+
+# Reuse stored embeddings for texts that were already embedded with the same
+# model (EmbeddingCache, keyed by sha256 of the text).
+EMBEDDING_CACHE_ENABLED = True
+
+# OpenAIAdapter.get_embeddings splits input into provider requests of at most
+# EMBEDDING_REQUEST_MAX_ITEMS texts / EMBEDDING_REQUEST_MAX_TOKENS estimated
+# tokens, runs EMBEDDING_CONCURRENCY of them at once within the per-minute
+# limits (0 = unlimited), and retries transient failures with backoff.
+EMBEDDING_REQUEST_MAX_ITEMS = 64
+EMBEDDING_REQUEST_MAX_TOKENS = 8000
+EMBEDDING_CONCURRENCY = 4
+EMBEDDING_REQUESTS_PER_MINUTE = int(os.getenv("EMBEDDING_REQUESTS_PER_MINUTE", "3000"))
+EMBEDDING_TOKENS_PER_MINUTE = int(os.getenv("EMBEDDING_TOKENS_PER_MINUTE", "1000000"))
+EMBEDDING_MAX_RETRIES = 3
+EMBEDDING_RETRY_BACKOFF = 0.5
+
+# Shared keep-alive connection pool for provider calls (see registry.py), and
+# whether the WSGI/ASGI app builds the adapter and vector index at startup.
+HTTP_MAX_CONNECTIONS = 20
+HTTP_MAX_KEEPALIVE = 10
+HTTP_KEEPALIVE_EXPIRY = 60.0
+OPENAI_TIMEOUT = 60.0
+WARM_UP_ON_START = os.getenv("WARM_UP_ON_START", "0") == "1"
+
+# Semantic answer cache (see productcatalogue/answer_cache.py): reuse an answer
+# when a question is this similar to a cached one and retrieves the same context.
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "1") == "1"
+ANSWER_CACHE_THRESHOLD = 0.95
+ANSWER_CACHE_TTL = 3600
+ANSWER_CACHE_MAX_ENTRIES = 1000
+ANSWER_CACHE_MAX_BYTES = 16 * 1024 * 1024
+
+# Per-process caches (answer cache, BM25 and attribute indexes) re-read the
+# ingest generation (productcatalogue/generation.py) at most this often and
+# drop anything built before another worker's ingest.
+DATA_GENERATION_CHECK_SECONDS = 1.0
+
+# Chat query embeddings: in-process LRU of normalised query text -> vector per
+# embedding model (0 disables); PERSIST also keeps them in the EmbeddingCache table
+# under "query:<model>", at most PERSIST_MAX rows per model (oldest pruned every
+# PRUNE_SECONDS, 0 = no cap).
+QUERY_EMBEDDING_CACHE_SIZE = 1024
+QUERY_EMBEDDING_CACHE_PERSIST = os.getenv("QUERY_EMBEDDING_CACHE_PERSIST", "0") == "1"
+QUERY_EMBEDDING_CACHE_PERSIST_MAX = 100000
+QUERY_EMBEDDING_CACHE_PRUNE_SECONDS = 60
+
+# Write-behind queue (see productcatalogue/writebehind.py) for query logs and
+# persisted query embeddings: records are batched to the database by a
+# background thread; when the queue is full a chat request waits at most
+# WRITE_BEHIND_PUT_TIMEOUT seconds, then the record is dropped.
+QUERY_LOG_ENABLED = os.getenv("QUERY_LOG_ENABLED", "0") == "1"
+WRITE_BEHIND_QUEUE_SIZE = 10000
+WRITE_BEHIND_BATCH_SIZE = 200
+WRITE_BEHIND_PUT_TIMEOUT = 0.05
+WRITE_BEHIND_BACKGROUND = True
+
+# Hybrid retrieval: fuse the top HYBRID_CANDIDATES vector and BM25 results with
+# reciprocal-rank fusion (score = sum of 1 / (RRF_K + rank)).
+HYBRID_SEARCH_ENABLED = True
+HYBRID_CANDIDATES = 50
+RRF_K = 60
+# BM25 skips query terms found in more than this fraction of the documents
+# (template words such as "Product name") when the query has rarer terms.
+LEXICAL_MAX_DF = 0.5
+
+# Reranking (see productcatalogue/rerank.py): rescore the best RERANK_CANDIDATES
+# rows by a weighted sum of cosine, query-token overlap and product popularity.
+RERANK_ENABLED = True
+RERANK_CANDIDATES = 50
+RERANK_WEIGHTS = {"cosine": 0.7, "lexical": 0.2, "popularity": 0.1}
+
+# /api/chat/batch/: questions per request and concurrent completion calls.
+CHAT_BATCH_MAX_ITEMS = 500
+CHAT_BATCH_CONCURRENCY = 4
+
+# PDF FAQ ingestion (see productcatalogue/pdf.py): extraction processes, pages
+# per worker task, minimum size before using the pool, and max chunk length.
+PDF_WORKERS = min(4, os.cpu_count() or 1)
+PDF_PAGES_PER_TASK = 32
+PDF_PARALLEL_MIN_PAGES = 64
+PDF_CHUNK_CHARS = 1200
+
+# Data endpoints (/api/products/, /api/faqs/): default and maximum page size,
+# and rows read per database round-trip for ?export=ndjson.
+DATA_PAGE_SIZE = 100
+DATA_PAGE_MAX = 1000
+DATA_EXPORT_CHUNK_SIZE = 2000
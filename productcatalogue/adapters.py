@@ -1,48 +1,114 @@
 import json
 import hashlib
+import threading
 from django.conf import settings
-import chromadb
+
+from .batching import RateLimiter, arun_batches, batch_by_token_budget, estimate_tokens, run_batches
+
+_limiter_lock = threading.Lock()
+_embedding_limiter = None
+
+
+FALLBACK_ANSWER = "Fallback: I used the provided context snippets."
+# Recorded as the embedding model of rows stored with _get_fallback_embeddings vectors.
+FALLBACK_EMBEDDING_MODEL = "fallback-hash"
+
+
+class StreamInterrupted(Exception):
+    """A completion stream failed after some deltas were already yielded; the answer is incomplete."""
+
+
+def get_embedding_rate_limiter():
+    """Process-wide limiter shared by every OpenAIAdapter's embedding calls."""
+    global _embedding_limiter
+    with _limiter_lock:
+        if _embedding_limiter is None:
+            _embedding_limiter = RateLimiter(
+                requests_per_minute=getattr(settings, "EMBEDDING_REQUESTS_PER_MINUTE", 0),
+                tokens_per_minute=getattr(settings, "EMBEDDING_TOKENS_PER_MINUTE", 0),
+            )
+        return _embedding_limiter
+
+
+def hash_embeddings(texts):
+    """Deterministic 16-dim pseudo-embeddings from sha256 of each text."""
+    vectors = []
+    for t in texts:
+        h = hashlib.sha256(t.encode("utf-8")).digest()
+        vec = [((b % 128) / 127.0) * (1 if i % 2 == 0 else -1)
+               for i, b in enumerate(h[:16])]
+        vectors.append(vec)
+    return vectors
 
 
 class MockAdapter:
     """A simple mock adapter for testing or demo use."""
 
+    embedding_model = "mock-sha256-16"
+
     def __init__(self):
         pass
 
-    def get_embeddings(self, texts):
+    def get_embeddings(self, texts, fallback=True):
         """Generate deterministic fake embeddings using hashing."""
-        vectors = []
-        for t in texts:
-            h = hashlib.sha256(t.encode("utf-8")).digest()
-            vec = [((b % 128) / 127.0) * (1 if i % 2 == 0 else -1)
-                   for i, b in enumerate(h[:16])]
-            vectors.append(vec)
-        return vectors
+        return hash_embeddings(texts)
 
-    def get_completion(self, messages, mode, context_snippets):
-        """Generate fake completion response with citations."""
-        snippet_ids = [s.get("id") for s in context_snippets]
-        product_ids = [s["id"] for s in context_snippets if s.get("source") == "product"]
-        answer = "Mock answer: I used provided snippets to answer."
+    def fallback_embeddings(self, texts):
+        """Vectors used when the provider fails; never calls get_embeddings."""
+        return hash_embeddings(texts)
 
+    def _compared_products(self, messages, context_snippets):
+        product_ids = [s["id"] for s in context_snippets if s.get("source") == "product"]
         if 'compare' in messages[-1]["content"].lower() and len(product_ids) >= 2:
-            answer = f"Mock compare: {product_ids[0]} seems stronger than {product_ids[1]}."
-            citations = product_ids[:2]
+            return product_ids[:2]
+        return None
+
+    def citations_for(self, messages, context_snippets):
+        """Snippet ids get_completion cites; streamed answers send them before the first token."""
+        return self._compared_products(messages, context_snippets) or [s.get("id") for s in context_snippets][:3]
+
+    def get_completion(self, messages, mode, context_snippets):
+        """Generate fake completion response with citations."""
+        compared = self._compared_products(messages, context_snippets)
+        if compared:
+            answer = f"Mock compare: {compared[0]} seems stronger than {compared[1]}."
         else:
-            citations = snippet_ids[:3]
+            answer = "Mock answer: I used provided snippets to answer."
+        return {"answer": answer, "citations": self.citations_for(messages, context_snippets)}
+
+    def stream_completion(self, messages, mode, context_snippets):
+        """Yield the mock answer word by word, like a streamed completion."""
+        answer = self.get_completion(messages, mode, context_snippets)["answer"]
+        for i, word in enumerate(answer.split(" ")):
+            yield word if i == 0 else " " + word
+
+    async def aget_embeddings(self, texts, fallback=True):
+        return self.get_embeddings(texts, fallback=fallback)
+
+    async def aget_completion(self, messages, mode, context_snippets):
+        return self.get_completion(messages, mode, context_snippets)
 
-        return {"answer": answer, "citations": citations}
+    async def astream_completion(self, messages, mode, context_snippets):
+        for delta in self.stream_completion(messages, mode, context_snippets):
+            yield delta
 
 
 class OpenAIAdapter:
     """Adapter for OpenAI or OpenRouter embedding + chat completions."""
 
-    def __init__(self, api_key):
+    embedding_model = "text-embedding-3-small"
+
+    def __init__(self, api_key, http_client=None):
+        """
+        `http_client` is an optional shared httpx client (see registry.py) so
+        every adapter reuses the same keep-alive connection pool.
+        """
+        self.api_key = api_key
+        self._async_client = None
         try:
             from openai import OpenAI as OpenAIClient
             base_url = getattr(settings, "OPENAI_BASE_URL", "https://api.openai.com/v1")
-            self.client = OpenAIClient(api_key=api_key, base_url=base_url)
+            self.client = OpenAIClient(api_key=api_key, base_url=base_url, http_client=http_client)
             self.client_type = "openai_sdk_object"
             print(f"✅ Connected to OpenAI client with base_url={base_url}")
         except Exception:
@@ -56,89 +122,168 @@ class OpenAIAdapter:
             except Exception:
                 raise
 
-        # 🟢 Persistent Chroma client (saved on disk)
-        self.chroma_client = chromadb.PersistentClient(path="chroma_db")
-        self.collection = self.chroma_client.get_or_create_collection(name="faq_collection")
-        print("✅ Connected to ChromaDB (persistent collection: faq_collection)")
-
     # ✅ FIXED FINAL VERSION — handles all response formats
-    def get_embeddings(self, texts):
-        """Get and store embeddings safely, compatible with OpenAI + OpenRouter."""
+    def get_embeddings(self, texts, fallback=True):
+        """
+        Get embeddings safely, compatible with OpenAI + OpenRouter.
+        Vectors are only returned; persisting them is the vector store's job.
+
+        Input is split into provider-sized batches (EMBEDDING_REQUEST_MAX_ITEMS /
+        EMBEDDING_REQUEST_MAX_TOKENS) that run on EMBEDDING_CONCURRENCY threads
+        under the shared rate limiter, retrying transient errors with jittered
+        backoff. Output order matches input order.
+
+        With fallback=False errors are raised instead of being replaced by
+        hash pseudo-embeddings, so ingest can report the failed batch.
+        """
         try:
             if isinstance(texts, str):
                 texts = [texts]
+            if not texts:
+                return []
 
-            # Call embedding API (SDK or legacy)
-            if self.client_type == "openai_sdk_object":
-                response = self.client.embeddings.create(
-                    model="text-embedding-3-small",
-                    input=texts
-                )
-            else:
-                response = self.client.Embedding.create(
-                    model="text-embedding-3-small",
-                    input=texts
-                )
+            batches = batch_by_token_budget(
+                texts,
+                str,
+                getattr(settings, "EMBEDDING_REQUEST_MAX_TOKENS", 8000),
+                getattr(settings, "EMBEDDING_REQUEST_MAX_ITEMS", 64),
+            )
+            results = run_batches(
+                batches,
+                self._embed_batch,
+                max_workers=getattr(settings, "EMBEDDING_CONCURRENCY", 4),
+                limiter=get_embedding_rate_limiter(),
+                cost=lambda batch: sum(estimate_tokens(t) for t in batch),
+                retries=getattr(settings, "EMBEDDING_MAX_RETRIES", 3),
+                backoff=getattr(settings, "EMBEDDING_RETRY_BACKOFF", 0.5),
+            )
+            embeddings = [vec for batch in results for vec in batch]
 
-            # 🧠 Handle multiple response formats
-            if isinstance(response, str):
-                response = json.loads(response)
-
-            # Extract data safely
-            data = None
-            if hasattr(response, "data"):
-                data = response.data
-            elif isinstance(response, dict) and "data" in response:
-                data = response["data"]
-            else:
-                print("⚠️ Unexpected embedding response format:", type(response))
-                data = []
-
-            embeddings = []
-            for item in data:
-                emb = None
-                if isinstance(item, dict):
-                    emb = item.get("embedding")
-                elif hasattr(item, "embedding"):
-                    emb = item.embedding
-                if emb is not None:
-                    embeddings.append([float(x) for x in emb])
-
-            if not embeddings:
-                print("⚠️ No embeddings returned — using fallback.")
-                return self._get_fallback_embeddings(texts)
-
-            # 🟢 Save embeddings to ChromaDB
-            for i, text in enumerate(texts):
-                try:
-                    self.collection.add(
-                        documents=[text],
-                        embeddings=[embeddings[i]],
-                        metadatas=[{"source": "pdf"}],
-                        ids=[f"doc_{hash(text)}"]
-                    )
-                except Exception as e:
-                    print(f"⚠️ Error saving to ChromaDB: {e}")
-
-            print(f"✅ Got and saved {len(embeddings)} embeddings to ChromaDB.")
+            print(f"✅ Got {len(embeddings)} embeddings in {len(results)} requests.")
             return embeddings
 
         except Exception as e:
             print(f"❌ Error getting embeddings: {e}")
+            if not fallback:
+                raise
+            return self._get_fallback_embeddings(texts)
+
+    @property
+    def async_client(self):
+        """AsyncOpenAI client with its own pool (same limits), created on first async call."""
+        if self._async_client is None:
+            import httpx
+            from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+            self._async_client = AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=getattr(settings, "OPENAI_BASE_URL", "https://api.openai.com/v1"),
+                http_client=DefaultAsyncHttpxClient(
+                    limits=httpx.Limits(
+                        max_connections=getattr(settings, "HTTP_MAX_CONNECTIONS", 20),
+                        max_keepalive_connections=getattr(settings, "HTTP_MAX_KEEPALIVE", 10),
+                        keepalive_expiry=getattr(settings, "HTTP_KEEPALIVE_EXPIRY", 60.0),
+                    ),
+                    timeout=getattr(settings, "OPENAI_TIMEOUT", 60.0),
+                ),
+            )
+        return self._async_client
+
+    async def aget_embeddings(self, texts, fallback=True):
+        """Async get_embeddings: same batching, limits, retries and fallback."""
+        if isinstance(texts, str):
+            texts = [texts]
+        if not texts:
+            return []
+        if self.client_type != "openai_sdk_object":
+            return self.get_embeddings(texts, fallback=fallback)
+        try:
+            batches = batch_by_token_budget(
+                texts,
+                str,
+                getattr(settings, "EMBEDDING_REQUEST_MAX_TOKENS", 8000),
+                getattr(settings, "EMBEDDING_REQUEST_MAX_ITEMS", 64),
+            )
+            results = await arun_batches(
+                list(batches),
+                self._aembed_batch,
+                max_concurrency=getattr(settings, "EMBEDDING_CONCURRENCY", 4),
+                limiter=get_embedding_rate_limiter(),
+                cost=lambda batch: sum(estimate_tokens(t) for t in batch),
+                retries=getattr(settings, "EMBEDDING_MAX_RETRIES", 3),
+                backoff=getattr(settings, "EMBEDDING_RETRY_BACKOFF", 0.5),
+            )
+            return [vec for batch in results for vec in batch]
+        except Exception as e:
+            print(f"❌ Error getting embeddings: {e}")
+            if not fallback:
+                raise
             return self._get_fallback_embeddings(texts)
 
+    async def _aembed_batch(self, texts):
+        response = await self.async_client.with_options(max_retries=0).embeddings.create(
+            model=self.embedding_model,
+            input=texts
+        )
+        embeddings = [[float(x) for x in item.embedding] for item in response.data]
+        if len(embeddings) != len(texts):
+            raise ValueError(f"Expected {len(texts)} embeddings, got {len(embeddings)}")
+        return embeddings
+
+    def _embed_batch(self, texts):
+        """One embeddings request; raises if the provider returns the wrong count."""
+        # Call embedding API (SDK or legacy). Retries are handled by run_batches.
+        if self.client_type == "openai_sdk_object":
+            response = self.client.with_options(max_retries=0).embeddings.create(
+                model=self.embedding_model,
+                input=texts
+            )
+        else:
+            response = self.client.Embedding.create(
+                model=self.embedding_model,
+                input=texts
+            )
+
+        # 🧠 Handle multiple response formats
+        if isinstance(response, str):
+            response = json.loads(response)
+
+        # Extract data safely
+        data = None
+        if hasattr(response, "data"):
+            data = response.data
+        elif isinstance(response, dict) and "data" in response:
+            data = response["data"]
+        else:
+            print("⚠️ Unexpected embedding response format:", type(response))
+            data = []
+
+        embeddings = []
+        for item in data:
+            emb = None
+            if isinstance(item, dict):
+                emb = item.get("embedding")
+            elif hasattr(item, "embedding"):
+                emb = item.embedding
+            if emb is not None:
+                embeddings.append([float(x) for x in emb])
+
+        if len(embeddings) != len(texts):
+            raise ValueError(f"Expected {len(texts)} embeddings, got {len(embeddings)}")
+        return embeddings
+
     def _get_fallback_embeddings(self, texts):
         """Fallback deterministic pseudo-embeddings if API fails."""
-        vectors = []
-        for t in texts:
-            h = hashlib.sha256(t.encode("utf-8")).digest()
-            vec = [((b % 128) / 127.0) * (1 if i % 2 == 0 else -1)
-                   for i, b in enumerate(h[:16])]
-            vectors.append(vec)
-        return vectors
+        return hash_embeddings(texts)
 
-    def get_completion(self, messages, mode, context_snippets):
-        """Generate a completion using context and user question."""
+    def fallback_embeddings(self, texts):
+        """
+        Public fallback for callers that already saw get_embeddings(fallback=False)
+        fail: returns the pseudo-embeddings without another provider round-trip.
+        """
+        return self._get_fallback_embeddings(texts)
+
+    def _completion_request(self, messages, mode, context_snippets):
+        """Return (model_name, temperature, messages) for a chat completion call."""
         if mode == "fast":
             model_name = "gpt-3.5-turbo"
             temperature = 0.7
@@ -166,6 +311,11 @@ class OpenAIAdapter:
             {"role": "system", "content": full_context},
             {"role": "user", "content": user_query}
         ]
+        return model_name, temperature, enhanced_messages
+
+    def get_completion(self, messages, mode, context_snippets):
+        """Generate a completion using context and user question."""
+        model_name, temperature, enhanced_messages = self._completion_request(messages, mode, context_snippets)
 
         try:
             if self.client_type == "openai_sdk_object":
@@ -185,16 +335,95 @@ class OpenAIAdapter:
                 )
                 answer = response["choices"][0]["message"]["content"].strip()
 
-            citations = [s["id"] for s in context_snippets[:3]]
-            return {"answer": answer, "citations": citations}
+            return {"answer": answer, "citations": self.citations_for(messages, context_snippets)}
 
         except Exception as e:
             print(f"❌ Error getting completion: {e}")
             return self._get_fallback_completion(messages, mode, context_snippets)
 
+    def stream_completion(self, messages, mode, context_snippets):
+        """
+        Yield answer text deltas as the provider streams them. The legacy
+        client and provider errors yield the whole (or fallback) answer at once;
+        an error after the first delta raises StreamInterrupted.
+        """
+        if self.client_type != "openai_sdk_object":
+            yield self.get_completion(messages, mode, context_snippets)["answer"]
+            return
+
+        model_name, temperature, enhanced_messages = self._completion_request(messages, mode, context_snippets)
+        sent_any = False
+        try:
+            stream = self.client.chat.completions.create(
+                model=model_name,
+                messages=enhanced_messages,
+                temperature=temperature,
+                max_tokens=300,
+                stream=True
+            )
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    sent_any = True
+                    yield delta
+        except Exception as e:
+            print(f"❌ Error streaming completion: {e}")
+            if sent_any:
+                raise StreamInterrupted(str(e)) from e
+            yield self._get_fallback_completion(messages, mode, context_snippets)["answer"]
+
+    async def aget_completion(self, messages, mode, context_snippets):
+        """Async get_completion using the AsyncOpenAI client."""
+        if self.client_type != "openai_sdk_object":
+            return self.get_completion(messages, mode, context_snippets)
+        model_name, temperature, enhanced_messages = self._completion_request(messages, mode, context_snippets)
+        try:
+            response = await self.async_client.chat.completions.create(
+                model=model_name,
+                messages=enhanced_messages,
+                temperature=temperature,
+                max_tokens=300
+            )
+            answer = response.choices[0].message.content.strip()
+            return {"answer": answer, "citations": self.citations_for(messages, context_snippets)}
+        except Exception as e:
+            print(f"❌ Error getting completion: {e}")
+            return self._get_fallback_completion(messages, mode, context_snippets)
+
+    async def astream_completion(self, messages, mode, context_snippets):
+        """Async stream_completion: yields answer text deltas."""
+        if self.client_type != "openai_sdk_object":
+            yield self.get_completion(messages, mode, context_snippets)["answer"]
+            return
+        model_name, temperature, enhanced_messages = self._completion_request(messages, mode, context_snippets)
+        sent_any = False
+        try:
+            stream = await self.async_client.chat.completions.create(
+                model=model_name,
+                messages=enhanced_messages,
+                temperature=temperature,
+                max_tokens=300,
+                stream=True
+            )
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    sent_any = True
+                    yield delta
+        except Exception as e:
+            print(f"❌ Error streaming completion: {e}")
+            if sent_any:
+                raise StreamInterrupted(str(e)) from e
+            yield self._get_fallback_completion(messages, mode, context_snippets)["answer"]
+
+    def citations_for(self, messages, context_snippets):
+        """Snippet ids every completion cites; streamed answers send them before the first token."""
+        return [s.get("id") for s in context_snippets[:3]]
+
     def _get_fallback_completion(self, messages, mode, context_snippets):
         """Fallback to mock completion."""
-        snippet_ids = [s.get("id") for s in context_snippets]
-        answer = "Fallback: I used the provided context snippets."
-        citations = snippet_ids[:3]
-        return {"answer": answer, "citations": citations}
+        return {"answer": FALLBACK_ANSWER, "citations": self.citations_for(messages, context_snippets)}
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Product, FAQChunk, EmbeddingVector
+from .models import Product, FAQChunk, EmbeddingVector, IngestionJob
 
 
 @admin.register(Product)
@@ -37,8 +37,8 @@ class FAQChunkAdmin(admin.ModelAdmin):
 
 @admin.register(EmbeddingVector)
 class EmbeddingVectorAdmin(admin.ModelAdmin):
-    list_display = ('id', 'source', 'source_obj_id', 'has_vector', 'created_at', 'text_preview')
-    list_filter = ('source', 'created_at')
+    list_display = ('id', 'source', 'source_obj_id', 'has_vector', 'dim', 'embedding_model', 'created_at', 'text_preview')
+    list_filter = ('source', 'embedding_model', 'created_at')
     search_fields = ('source_obj_id', 'text')
     readonly_fields = ('created_at',)
     list_per_page = 20
@@ -50,6 +50,14 @@ class EmbeddingVectorAdmin(admin.ModelAdmin):
 
     def has_vector(self, obj):
         # Shows ✅ if embedding is saved correctly
-        return bool(obj.vector)
+        return bool(obj.vector_blob or obj.vector)
     has_vector.boolean = True
     has_vector.short_description = "Embedding Saved?"
+
+
+@admin.register(IngestionJob)
+class IngestionJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'status', 'stage', 'rows_processed', 'created_at', 'finished_at')
+    list_filter = ('status', 'created_at')
+    readonly_fields = ('created_at', 'started_at', 'finished_at', 'updated_at')
+    ordering = ('-created_at',)
@@ -0,0 +1,118 @@
+"""
+Approximate nearest-neighbour search for the resident vector index.
+
+IVFIndex partitions the (L2-normalised) index matrix into `nlist` cells with
+spherical k-means. A query is scored against the centroids first and only the
+rows in the `nprobe` closest cells are scored exactly. The exact full scan in
+VectorIndex.search stays the ground truth and the default for small indexes.
+"""
+import time
+
+import numpy as np
+
+ASSIGN_CHUNK = 65536
+
+
+def _nearest_centroid(matrix, centroids):
+    """Return the best centroid for every row, scoring in bounded chunks."""
+    out = np.empty(matrix.shape[0], dtype=np.int32)
+    for start in range(0, matrix.shape[0], ASSIGN_CHUNK):
+        block = np.asarray(matrix[start:start + ASSIGN_CHUNK], dtype=np.float32)
+        out[start:start + ASSIGN_CHUNK] = np.argmax(block @ centroids.T, axis=1)
+    return out
+
+
+class IVFIndex:
+    """
+    Inverted-file index: centroids plus, for each row of the index matrix,
+    the cell it belongs to. Like VectorIndex it is never mutated in place;
+    with_inserts() returns a new instance.
+    """
+
+    def __init__(self, centroids, assignments, trained_size):
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.assignments = np.asarray(assignments, dtype=np.int32)
+        self.trained_size = trained_size
+        order = np.argsort(self.assignments, kind='stable')
+        bounds = np.searchsorted(self.assignments[order], np.arange(len(self.centroids) + 1))
+        self.lists = [order[bounds[i]:bounds[i + 1]] for i in range(len(self.centroids))]
+
+    @property
+    def nlist(self):
+        return len(self.centroids)
+
+    @classmethod
+    def train(cls, matrix, nlist=0, iterations=10, seed=0, sample_per_list=256):
+        """
+        Spherical k-means over a sample of `matrix` (rows must be unit length).
+        nlist=0 picks roughly sqrt(n) cells.
+        """
+        n = matrix.shape[0]
+        nlist = nlist or max(1, int(np.sqrt(n)))
+        nlist = min(nlist, n)
+        rng = np.random.default_rng(seed)
+
+        sample_size = min(n, nlist * sample_per_list)
+        sample = np.asarray(matrix[np.sort(rng.choice(n, sample_size, replace=False))], dtype=np.float32)
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+
+        for _ in range(iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            counts = np.bincount(assign, minlength=nlist)
+            empty = counts == 0
+            if empty.any():
+                sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids = sums / norms
+
+        return cls(centroids, _nearest_centroid(matrix, centroids), trained_size=n)
+
+    def with_inserts(self, matrix, positions):
+        """
+        Return a new index that also covers `positions` of `matrix`, which may
+        be appended rows or rows whose vector was replaced.
+        """
+        assignments = np.empty(matrix.shape[0], dtype=np.int32)
+        assignments[:len(self.assignments)] = self.assignments
+        positions = np.asarray(positions, dtype=np.int64)
+        if positions.size:
+            assignments[positions] = _nearest_centroid(matrix[positions], self.centroids)
+        return IVFIndex(self.centroids, assignments, self.trained_size)
+
+    def candidates(self, query, nprobe=8):
+        """Row positions in the `nprobe` cells closest to a unit-length query."""
+        nprobe = max(1, min(nprobe, self.nlist))
+        cell_scores = self.centroids @ query
+        cells = np.argpartition(-cell_scores, nprobe - 1)[:nprobe]
+        return np.concatenate([self.lists[c] for c in cells])
+
+
+def recall_report(index, queries, k=8, nprobes=(1, 2, 4, 8, 16, 32)):
+    """
+    Compare IVF search against the exact scan for each nprobe.
+    Returns a list of {nprobe, recall_at_k, avg_ms, exact_avg_ms} dicts.
+    """
+    exact_ids, exact_ms = [], 0.0
+    for q in queries:
+        t0 = time.perf_counter()
+        exact_ids.append({r['id'] for r in index.search(q, k=k, threshold=-1.0, exact=True)})
+        exact_ms += (time.perf_counter() - t0) * 1000
+
+    report = []
+    for nprobe in nprobes:
+        hits, elapsed = 0, 0.0
+        for q, truth in zip(queries, exact_ids):
+            t0 = time.perf_counter()
+            found = index.search(q, k=k, threshold=-1.0, nprobe=nprobe)
+            elapsed += (time.perf_counter() - t0) * 1000
+            hits += len(truth & {r['id'] for r in found})
+        report.append({
+            'nprobe': nprobe,
+            'recall_at_k': hits / max(1, sum(len(t) for t in exact_ids)),
+            'avg_ms': elapsed / max(1, len(queries)),
+            'exact_avg_ms': exact_ms / max(1, len(queries)),
+        })
+    return report
@@ -0,0 +1,174 @@
+"""
+Semantic answer cache in front of adapter.get_completion.
+
+A cached answer is reused when a new question's embedding is within
+ANSWER_CACHE_THRESHOLD cosine similarity of a cached question AND retrieval
+returned the same context ids (in the same mode). Requiring the same context
+means an answer is never served against different source material; entries
+citing a product or FAQ chunk are dropped as soon as that row is re-ingested
+with different content (see utils._upsert_batch). Because the cache is per
+process, every entry also records the ingest generation (generation.py) it
+was answered under; once any worker ingests, entries from older generations
+are misses in every process.
+
+Entries are evicted least-recently-used once ANSWER_CACHE_MAX_ENTRIES or
+ANSWER_CACHE_MAX_BYTES is exceeded, and expire after ANSWER_CACHE_TTL
+seconds. The cache is per process.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+
+
+class SemanticAnswerCache:
+    def __init__(self, threshold=0.95, ttl=3600, max_entries=1000, max_bytes=16 * 1024 * 1024, clock=time.monotonic):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # entry id -> entry dict, oldest first
+        self._buckets = {}             # (mode, context ids) -> set of entry ids
+        self._bytes = 0
+        self._next_id = 0
+
+    @staticmethod
+    def _key(context_ids, mode):
+        return mode, tuple(sorted(context_ids))
+
+    @staticmethod
+    def _unit(vector):
+        vec = np.asarray(vector, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, query_vector, context_ids, mode="fast", generation=0):
+        """Return a copy of the cached response, or None on a miss (including entries from older generations)."""
+        qv = self._unit(query_vector)
+        now = self.clock()
+        with self._lock:
+            best, best_score = None, self.threshold
+            for entry_id in list(self._buckets.get(self._key(context_ids, mode), ())):
+                entry = self._entries[entry_id]
+                if entry["expires"] <= now or entry["generation"] < generation:
+                    self._drop(entry_id)
+                    continue
+                if entry["vector"].shape != qv.shape:
+                    continue
+                score = float(entry["vector"] @ qv)
+                if score >= best_score:
+                    best, best_score = entry_id, score
+            if best is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(best)
+            return json.loads(self._entries[best]["response"])
+
+    def put(self, query_vector, context_ids, mode, response, generation=0):
+        vector = self._unit(query_vector)
+        payload = json.dumps(response)
+        size = vector.nbytes + len(payload)
+        if size > self.max_bytes:
+            return
+        key = self._key(context_ids, mode)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = {
+                "key": key,
+                "vector": vector,
+                "response": payload,
+                "size": size,
+                "expires": self.clock() + self.ttl,
+                "generation": generation,
+            }
+            self._buckets.setdefault(key, set()).add(entry_id)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._drop(next(iter(self._entries)))
+
+    def invalidate_ids(self, ids):
+        """Drop every entry whose context includes one of `ids`. Returns the count."""
+        ids = set(ids)
+        if not ids:
+            return 0
+        with self._lock:
+            stale = [
+                entry_id for key, bucket in self._buckets.items()
+                if ids.intersection(key[1]) for entry_id in bucket
+            ]
+            for entry_id in stale:
+                self._drop(entry_id)
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+            self._bytes = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+    def _drop(self, entry_id):
+        entry = self._entries.pop(entry_id)
+        self._bytes -= entry["size"]
+        bucket = self._buckets.get(entry["key"])
+        if bucket is not None:
+            bucket.discard(entry_id)
+            if not bucket:
+                del self._buckets[entry["key"]]
+
+
+_lock = threading.Lock()
+_cache = None
+
+
+def get_answer_cache():
+    """Process-wide cache built from settings, or None when ANSWER_CACHE_ENABLED is off."""
+    global _cache
+    if not getattr(settings, "ANSWER_CACHE_ENABLED", True):
+        return None
+    if _cache is None:
+        with _lock:
+            if _cache is None:
+                _cache = SemanticAnswerCache(
+                    threshold=getattr(settings, "ANSWER_CACHE_THRESHOLD", 0.95),
+                    ttl=getattr(settings, "ANSWER_CACHE_TTL", 3600),
+                    max_entries=getattr(settings, "ANSWER_CACHE_MAX_ENTRIES", 1000),
+                    max_bytes=getattr(settings, "ANSWER_CACHE_MAX_BYTES", 16 * 1024 * 1024),
+                )
+    return _cache
+
+
+def invalidate_answers(ids):
+    """Drop cached answers that cite any of the given EmbeddingVector ids."""
+    if _cache is not None:
+        dropped = _cache.invalidate_ids(ids)
+        if dropped:
+            print(f"🧹 Dropped {dropped} cached answers after re-ingest")
+
+
+def reset_answer_cache():
+    """Forget the process-wide cache (tests, settings changes)."""
+    global _cache
+    with _lock:
+        _cache = None
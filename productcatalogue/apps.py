@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ProductcatalogueConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'productcatalogue'
+
+    def ready(self):
+        from . import signals  # noqa: F401  (registers the generation receivers)
@@ -0,0 +1,157 @@
+"""
+Batching, rate limiting and retry helpers for provider calls.
+
+batch_by_token_budget() splits texts into request-sized groups, RateLimiter
+enforces requests/tokens per minute across threads, and run_batches() runs
+the groups on a bounded thread pool with jittered exponential backoff,
+returning results in input order. arun_batches() is the asyncio equivalent.
+"""
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (~4 characters per token for English text)."""
+    return len(text) // 4 + 1
+
+
+def batch_by_token_budget(items, text_of, max_tokens, max_items):
+    """
+    Group an iterable into lists whose estimated token total stays under
+    max_tokens and whose length stays under max_items. A single oversized
+    item still gets its own batch.
+    """
+    batch, tokens = [], 0
+    for item in items:
+        cost = estimate_tokens(text_of(item))
+        if batch and (tokens + cost > max_tokens or len(batch) >= max_items):
+            yield batch
+            batch, tokens = [], 0
+        batch.append(item)
+        tokens += cost
+    if batch:
+        yield batch
+
+
+class RateLimiter:
+    """
+    Token-bucket limiter for requests per minute and tokens per minute,
+    shared by every thread that calls acquire(). A limit of 0 disables it.
+    """
+
+    def __init__(self, requests_per_minute=0, tokens_per_minute=0, clock=time.monotonic, sleep=time.sleep):
+        self.rpm = requests_per_minute
+        self.tpm = tokens_per_minute
+        self.clock = clock
+        self.sleep = sleep
+        self._lock = threading.Lock()
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute)
+        self._updated = clock()
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        self._updated = now
+        if self.rpm:
+            self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60.0)
+        if self.tpm:
+            self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60.0)
+
+    def acquire(self, tokens=0):
+        """Block until one request costing `tokens` fits in both budgets."""
+        tokens = min(tokens, self.tpm) if self.tpm else 0
+        while True:
+            with self._lock:
+                self._refill(self.clock())
+                wait = 0.0
+                if self.rpm and self._requests < 1:
+                    wait = max(wait, (1 - self._requests) * 60.0 / self.rpm)
+                if self.tpm and self._tokens < tokens:
+                    wait = max(wait, (tokens - self._tokens) * 60.0 / self.tpm)
+                if wait == 0.0:
+                    if self.rpm:
+                        self._requests -= 1
+                    if self.tpm:
+                        self._tokens -= tokens
+                    return
+            self.sleep(wait)
+
+
+def is_transient_error(exc):
+    """Connection problems, timeouts, 408/409/429 and 5xx responses are worth retrying."""
+    status = getattr(exc, "status_code", None)
+    if status is not None:
+        return status in (408, 409, 429) or status >= 500
+    if isinstance(exc, (ConnectionError, TimeoutError)):
+        return True
+    try:
+        import openai
+    except ImportError:
+        return False
+    return isinstance(exc, (openai.APIConnectionError, openai.APITimeoutError))
+
+
+def call_with_retry(fn, arg, retries=3, backoff=0.5, is_transient=is_transient_error, sleep=time.sleep):
+    """Call fn(arg), retrying transient errors with full-jitter exponential backoff."""
+    attempt = 0
+    while True:
+        try:
+            return fn(arg)
+        except Exception as e:
+            if attempt >= retries or not is_transient(e):
+                raise
+            delay = random.uniform(0, backoff * (2 ** attempt))
+            print(f"⚠️ Transient error ({e}); retry {attempt + 1}/{retries} in {delay:.2f}s")
+            sleep(delay)
+            attempt += 1
+
+
+def run_batches(batches, fn, max_workers=4, limiter=None, cost=None, retries=3, backoff=0.5):
+    """
+    Run fn(batch) for every batch on a bounded thread pool and return the
+    results in input order. Each call first takes `cost(batch)` tokens from
+    `limiter`; the first non-transient (or exhausted) error is re-raised.
+    """
+    batches = list(batches)
+
+    def run_one(batch):
+        def attempt(b):
+            if limiter is not None:
+                limiter.acquire(cost(b) if cost else 0)
+            return fn(b)
+        return call_with_retry(attempt, batch, retries=retries, backoff=backoff)
+
+    if len(batches) <= 1 or max_workers <= 1:
+        return [run_one(b) for b in batches]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(batches))) as pool:
+        return list(pool.map(run_one, batches))
+
+
+async def arun_batches(batches, afn, max_concurrency=4, limiter=None, cost=None, retries=3, backoff=0.5):
+    """
+    asyncio version of run_batches: await afn(batch) for every batch with at
+    most `max_concurrency` in flight, results in input order. The limiter is
+    waited on in a worker thread so the event loop never blocks.
+    """
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def run_one(batch):
+        async with semaphore:
+            attempt = 0
+            while True:
+                if limiter is not None:
+                    await asyncio.to_thread(limiter.acquire, cost(batch) if cost else 0)
+                try:
+                    return await afn(batch)
+                except Exception as e:
+                    if attempt >= retries or not is_transient_error(e):
+                        raise
+                    delay = random.uniform(0, backoff * (2 ** attempt))
+                    print(f"⚠️ Transient error ({e}); retry {attempt + 1}/{retries} in {delay:.2f}s")
+                    await asyncio.sleep(delay)
+                    attempt += 1
+
+    return await asyncio.gather(*(run_one(b) for b in batches))
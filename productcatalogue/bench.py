@@ -0,0 +1,140 @@
+"""
+Synthetic retrieval / ingestion benchmark used by `python manage.py bench`.
+
+For every catalogue size it generates products and FAQ chunks with
+deterministic vectors (a sha256 of the text seeds the generator, like
+MockAdapter, but at any dimension), stores them through the normal store
+functions, and measures:
+
+    ingest        rows/s through store_product_and_embeddings /
+                  store_faq_chunks_and_embeddings
+    index build   time to build the resident vector index and the BM25 index
+                  from the database
+    retrieve      retrieve_top_k latency percentiles over noisy copies of
+                  stored vectors (with product names as the query text)
+    memory        index size (float32 / int8) and the process's peak RSS
+
+run_size() does not clean up after itself; the bench command runs it against
+a scratch database, inside a transaction that is rolled back.
+"""
+import hashlib
+import time
+
+import numpy as np
+
+from .index import get_index, invalidate_index
+from .lexical import get_lexical_index
+from .pdf import peak_rss_mb
+from .utils import retrieve_top_k, store_faq_chunks_and_embeddings, store_product_and_embeddings
+
+ACCORDS = ["citrus", "woody", "floral", "amber", "musky", "fresh", "spicy", "powdery", "aquatic", "leather"]
+SEASONS = ["spring", "summer", "autumn", "winter", "all"]
+WORDS = ["bright", "warm", "soft", "deep", "clean", "smoky", "sweet", "green", "dark", "velvet", "rose", "oud"]
+
+
+def synthetic_vector(text, dim):
+    """Deterministic unit-variance vector for `text`: same text, same vector."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    return np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+
+
+def synthetic_products(n, start=0):
+    for i in range(start, start + n):
+        words = [WORDS[(i * 7 + j) % len(WORDS)] for j in range(3)]
+        yield {
+            'id': f"bench_{i}",
+            'name': f"{words[0].title()} {words[1].title()} {i}",
+            'notes': f"{' '.join(words)} notes",
+            'accords': ", ".join(ACCORDS[(i + j) % len(ACCORDS)] for j in range(2)),
+            'price': float(20 + i % 180),
+            'longevity': f"{4 + i % 8}-{6 + i % 8}h",
+            'season': SEASONS[i % len(SEASONS)],
+            'imageUrl': '',
+            'popularity': float(i % 100),
+        }
+
+
+def synthetic_faqs(n, start=0):
+    for i in range(start, start + n):
+        words = [WORDS[(i * 5 + j) % len(WORDS)] for j in range(4)]
+        yield {'id': f"bench_{i}", 'heading': f"Question {i}", 'text': f"How {' '.join(words)} is item {i}?"}
+
+
+def _batched(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _ingest(store, items, dim, batch_size):
+    """Store `items` in batches; returns {rows, seconds, rows_per_sec} for the store calls only."""
+    rows, seconds = 0, 0.0
+    for batch in _batched(items, batch_size):
+        vectors = [synthetic_vector(it.get('name') or it['text'], dim) for it in batch]
+        t0 = time.perf_counter()
+        store(batch, vectors, model=f"bench-{dim}")
+        seconds += time.perf_counter() - t0
+        rows += len(batch)
+    return {'rows': rows, 'seconds': round(seconds, 4), 'rows_per_sec': round(rows / seconds, 1) if seconds else 0.0}
+
+
+def percentiles(samples_ms):
+    samples = np.asarray(samples_ms, dtype=np.float64)
+    if not samples.size:
+        return {}
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    return {
+        'p50_ms': round(float(p50), 3),
+        'p95_ms': round(float(p95), 3),
+        'p99_ms': round(float(p99), 3),
+        'mean_ms': round(float(samples.mean()), 3),
+        'queries': int(samples.size),
+    }
+
+
+def run_size(size, dim=384, faq_ratio=0.1, queries=200, k=8, batch_size=1000, seed=0):
+    """Ingest a synthetic catalogue of `size` vectors and benchmark it. Returns one result dict."""
+    n_faqs = int(size * faq_ratio)
+    n_products = size - n_faqs
+    result = {'vectors': size, 'products': n_products, 'faqs': n_faqs, 'dim': dim}
+
+    result['ingest'] = {
+        'products': _ingest(store_product_and_embeddings, synthetic_products(n_products), dim, batch_size),
+        'faqs': _ingest(store_faq_chunks_and_embeddings, synthetic_faqs(n_faqs), dim, batch_size),
+    }
+
+    invalidate_index()
+    t0 = time.perf_counter()
+    index = get_index()
+    vector_ms = (time.perf_counter() - t0) * 1000
+    t0 = time.perf_counter()
+    get_lexical_index()
+    lexical_ms = (time.perf_counter() - t0) * 1000
+    result['index_build'] = {'vector_ms': round(vector_ms, 2), 'lexical_ms': round(lexical_ms, 2)}
+
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(n_products, min(queries, n_products), replace=False) if n_products else []
+    samples, stages = [], {}
+    for n, i in enumerate(picks):
+        product = next(synthetic_products(1, start=int(i)))
+        query = synthetic_vector(product['name'], dim) + 0.1 * rng.standard_normal(dim).astype(np.float32)
+        timings = {}
+        t0 = time.perf_counter()
+        retrieve_top_k(query, k=k, query_text=product['name'], timings=timings)
+        elapsed = (time.perf_counter() - t0) * 1000
+        if n == 0:
+            continue  # first query pays for the attribute index and lazy row maps
+        samples.append(elapsed)
+        for stage, ms in timings.items():
+            stages[stage] = stages.get(stage, 0.0) + ms
+    result['retrieve'] = percentiles(samples)
+    if samples:
+        result['retrieve']['stages_mean_ms'] = {s: round(ms / len(samples), 3) for s, ms in stages.items()}
+
+    result['memory'] = dict(index.memory_report(), peak_rss_mb=peak_rss_mb())
+    return result
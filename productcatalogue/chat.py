@@ -0,0 +1,352 @@
+"""
+Chat pipeline shared by ChatView: embed the question, retrieve context and
+ask the adapter for an answer, either as one JSON body or as server-sent
+events (citations first, then completion tokens). Single-question chats
+go through the semantic answer cache (see answer_cache.py) before paying
+for a completion.
+
+The a*-prefixed functions are the same pipeline on the adapters' async
+methods, used by the native async view when served under ASGI.
+
+Answered questions are handed to the write-behind queue (writebehind.py)
+when QUERY_LOG_ENABLED is on; nothing here writes to the database.
+"""
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from .adapters import FALLBACK_ANSWER, StreamInterrupted
+from .answer_cache import get_answer_cache
+from .embedding_cache import aembed_query, embed_queries, embed_query
+from .generation import data_generation
+from .utils import aretrieve_top_k, retrieve_top_k, retrieve_top_k_batch
+from .writebehind import log_query
+
+NO_RESULTS_ANSWER = "Sorry, I couldn't find any relevant information."
+STREAM_INTERRUPTED = "The answer stream was interrupted; the answer is incomplete."
+
+
+class ChatError(Exception):
+    """Request problem reported to the client as {"error": ...} with `status`."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def query_text_of(messages):
+    """The question (last message's content); ChatError unless `messages` is a list of {role, content} dicts."""
+    if not isinstance(messages, list) or not messages:
+        raise ChatError("messages must be a non-empty list")
+    if not all(isinstance(m, dict) and isinstance(m.get("content"), str) for m in messages):
+        raise ChatError("messages must include content")
+    return messages[-1]["content"]
+
+
+def _snippets(top, top_n):
+    return [{"id": t["id"], "source": t["source"], "text": t["text"]} for t in top[:top_n]]
+
+
+def _log_timings(timings):
+    print("⏱️ Retrieval stages: " + ", ".join(f"{name}={ms}" for name, ms in timings.items()))
+
+
+def _retrieve(adapter, query_text, k=8, top_n=3, filters=None, timings=None):
+    """Return (query_vector, top_n context snippets); per-stage timings go into `timings`."""
+    timings = {} if timings is None else timings
+    vector = embed_query(adapter, query_text)
+    if vector is None:
+        raise ChatError("Failed to compute query embedding", status=500)
+    top = retrieve_top_k(vector, k=k, query_text=query_text, filters=filters, timings=timings)
+    _log_timings(timings)
+    return vector, _snippets(top, top_n)
+
+
+async def _aretrieve(adapter, query_text, k=8, top_n=3, filters=None, timings=None):
+    timings = {} if timings is None else timings
+    vector = await aembed_query(adapter, query_text)
+    if vector is None:
+        raise ChatError("Failed to compute query embedding", status=500)
+    top = await aretrieve_top_k(vector, k=k, query_text=query_text, filters=filters, timings=timings)
+    _log_timings(timings)
+    return vector, _snippets(top, top_n)
+
+
+def retrieve_context(adapter, query_text, k=8, top_n=3, filters=None):
+    """Embed the question and return the top_n context snippets."""
+    return _retrieve(adapter, query_text, k, top_n, filters)[1]
+
+
+async def aretrieve_context(adapter, query_text, k=8, top_n=3, filters=None):
+    """Async retrieve_context."""
+    return (await _aretrieve(adapter, query_text, k, top_n, filters))[1]
+
+
+def _answer_cache(messages):
+    """The answer cache, or None when disabled or the chat has earlier turns."""
+    return get_answer_cache() if len(messages) == 1 else None
+
+
+async def _ageneration():
+    from asgiref.sync import sync_to_async
+    return await sync_to_async(data_generation)()
+
+
+def _cache_answer(cache, query_vector, context_snippets, mode, resp, generation):
+    if cache is not None and resp.get("answer") and resp["answer"] != FALLBACK_ANSWER:
+        cache.put(query_vector, [c["id"] for c in context_snippets], mode, resp, generation)
+
+
+def _log_answer(messages, mode, resp, started, block=True):
+    """Queue a QueryLog row for an answered chat (a no-op unless QUERY_LOG_ENABLED)."""
+    question = messages[-1].get("content", "") if messages else ""
+    latency_ms = round((time.perf_counter() - started) * 1000, 2)
+    log_query(question, mode, resp.get("answer"), resp.get("citations"), latency_ms, block=block)
+
+
+def answer(adapter, messages, mode="fast", provided_context=None, filters=None):
+    """Run the whole pipeline and return {"answer", "citations"}."""
+    started = time.perf_counter()
+    if provided_context:
+        resp = adapter.get_completion(messages=messages, mode=mode, context_snippets=provided_context)
+    else:
+        query_vector, context_snippets = _retrieve(adapter, query_text_of(messages), filters=filters)
+        resp = _complete(adapter, messages, mode, query_vector, context_snippets)
+    _log_answer(messages, mode, resp, started)
+    return resp
+
+
+def _complete(adapter, messages, mode, query_vector, context_snippets, generation=None):
+    """Answer from retrieved context, going through the answer cache."""
+    if not context_snippets:
+        return {"answer": NO_RESULTS_ANSWER, "citations": []}
+
+    cache = _answer_cache(messages)
+    if cache is not None:
+        generation = data_generation() if generation is None else generation
+        cached = cache.get(query_vector, [c["id"] for c in context_snippets], mode, generation)
+        if cached is not None:
+            return cached
+
+    resp = adapter.get_completion(messages=messages, mode=mode, context_snippets=context_snippets)
+    if "citations" not in resp:
+        resp["citations"] = [c["id"] for c in context_snippets]
+    _cache_answer(cache, query_vector, context_snippets, mode, resp, generation)
+    return resp
+
+
+def answer_batch(adapter, conversations, mode="fast", filters=None, k=8, top_n=3, max_workers=None):
+    """
+    Answer many independent chats (each a messages list). All questions are
+    embedded through one batched adapter call, retrieved with one matrix
+    product (retrieve_top_k_batch), and completed on a pool of at most
+    `max_workers` (CHAT_BATCH_CONCURRENCY) threads. Returns one
+    {"answer", "citations"} or {"error"} dict per chat, in input order.
+    """
+    started = time.perf_counter()
+    results = [None] * len(conversations)
+    texts = {}
+    for i, messages in enumerate(conversations):
+        try:
+            texts[i] = query_text_of(messages)
+        except ChatError as e:
+            results[i] = {"error": str(e)}
+
+    pending = list(texts)
+    vectors = embed_queries(adapter, [texts[i] for i in pending])
+    for i, vector in zip(pending, vectors):
+        if vector is None:
+            results[i] = {"error": "Failed to compute query embedding"}
+    pending = [(i, vector) for i, vector in zip(pending, vectors) if vector is not None]
+
+    timings = {}
+    tops = retrieve_top_k_batch(
+        [vector for _, vector in pending], k=k,
+        query_texts=[texts[i] for i, _ in pending], filters=filters, timings=timings,
+    )
+    _log_timings(timings)
+    shared = time.perf_counter() - started  # embedding + retrieval, paid once for every item
+
+    def complete(job):
+        (i, vector), top = job
+        # Logged latency is the shared work plus this item's own completion,
+        # not the time it spent queued behind other items in the pool.
+        item_started = time.perf_counter() - shared
+        try:
+            resp = _complete(adapter, conversations[i], mode, vector, _snippets(top, top_n), generation)
+            _log_answer(conversations[i], mode, resp, item_started)
+            return i, resp
+        except Exception as e:
+            print(f"❌ Batch chat item {i} failed: {e}")
+            return i, {"error": str(e)}
+
+    generation = data_generation()  # read once here, not from every pool thread
+    workers = max_workers or getattr(settings, "CHAT_BATCH_CONCURRENCY", 4)
+    if pending:
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(pending)))) as pool:
+            for i, resp in pool.map(complete, zip(pending, tops)):
+                results[i] = resp
+    return results
+
+
+async def aanswer(adapter, messages, mode="fast", provided_context=None, filters=None):
+    """Async answer(); the query log record is dropped rather than waited for when the queue is full."""
+    started = time.perf_counter()
+    resp = await _acomplete(adapter, messages, mode, provided_context, filters)
+    _log_answer(messages, mode, resp, started, block=False)
+    return resp
+
+
+async def _acomplete(adapter, messages, mode, provided_context, filters):
+    if provided_context:
+        return await adapter.aget_completion(messages=messages, mode=mode, context_snippets=provided_context)
+
+    query_vector, context_snippets = await _aretrieve(adapter, query_text_of(messages), filters=filters)
+    if not context_snippets:
+        return {"answer": NO_RESULTS_ANSWER, "citations": []}
+
+    cache, generation = _answer_cache(messages), None
+    if cache is not None:
+        generation = await _ageneration()
+        cached = cache.get(query_vector, [c["id"] for c in context_snippets], mode, generation)
+        if cached is not None:
+            return cached
+
+    resp = await adapter.aget_completion(messages=messages, mode=mode, context_snippets=context_snippets)
+    if "citations" not in resp:
+        resp["citations"] = [c["id"] for c in context_snippets]
+    _cache_answer(cache, query_vector, context_snippets, mode, resp, generation)
+    return resp
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _stream_citations(adapter, messages, context_snippets, cached):
+    """The citations answer() would return for the same question, known before the first token."""
+    if cached is not None:
+        return cached["citations"]
+    if not context_snippets:
+        return []
+    return adapter.citations_for(messages, context_snippets)
+
+
+def stream_answer(adapter, messages, mode="fast", provided_context=None, started=None, filters=None):
+    """
+    Yield SSE events: `citations` as soon as retrieval finishes, one `token`
+    per completion delta, then `done` with time-to-first-byte (citations) and
+    time-to-first-token in milliseconds, measured from `started`, plus the
+    per-stage retrieval timings from retrieve_top_k. If the provider stream
+    breaks mid-answer an `error` event precedes `done` (complete=false) and
+    the partial answer is not cached.
+    """
+    started = started or time.perf_counter()
+    timings = {}
+
+    def elapsed_ms():
+        return round((time.perf_counter() - started) * 1000, 2)
+
+    query_vector, cache, cached, generation = None, None, None, 0
+    retrieval = {}
+    try:
+        if provided_context:
+            context_snippets = provided_context
+        else:
+            query_vector, context_snippets = _retrieve(
+                adapter, query_text_of(messages), filters=filters, timings=retrieval
+            )
+            cache = _answer_cache(messages) if context_snippets else None
+    except ChatError as e:
+        yield sse_event("error", {"error": str(e)})
+        return
+
+    if cache is not None:
+        generation = data_generation()
+        cached = cache.get(query_vector, [c["id"] for c in context_snippets], mode, generation)
+    citations = _stream_citations(adapter, messages, context_snippets, cached)
+    yield sse_event("citations", {"citations": citations})
+    timings["ttfb_ms"] = elapsed_ms()
+
+    if not context_snippets:
+        deltas = iter([NO_RESULTS_ANSWER])
+    elif cached is not None:
+        deltas = iter([cached["answer"]])
+    else:
+        deltas = adapter.stream_completion(messages=messages, mode=mode, context_snippets=context_snippets)
+    parts, complete = [], True
+    try:
+        for delta in deltas:
+            if "first_token_ms" not in timings:
+                timings["first_token_ms"] = elapsed_ms()
+            parts.append(delta)
+            yield sse_event("token", {"text": delta})
+    except StreamInterrupted:
+        complete = False
+        yield sse_event("error", {"error": STREAM_INTERRUPTED})
+    if cache is not None and cached is None and complete:
+        _cache_answer(
+            cache, query_vector, context_snippets, mode, {"answer": "".join(parts), "citations": citations}, generation
+        )
+
+    timings["total_ms"] = elapsed_ms()
+    _log_answer(messages, mode, {"answer": "".join(parts), "citations": citations}, started)
+    print(f"📡 Streamed chat: ttfb={timings['ttfb_ms']}ms first_token={timings.get('first_token_ms')}ms total={timings['total_ms']}ms")
+    yield sse_event("done", dict(timings, citations=citations, retrieval=retrieval, complete=complete))
+
+
+async def astream_answer(adapter, messages, mode="fast", provided_context=None, started=None, filters=None):
+    """Async stream_answer(): the same events, from the adapter's async stream."""
+    started = started or time.perf_counter()
+    timings = {}
+
+    def elapsed_ms():
+        return round((time.perf_counter() - started) * 1000, 2)
+
+    query_vector, cache, cached, generation = None, None, None, 0
+    retrieval = {}
+    try:
+        if provided_context:
+            context_snippets = provided_context
+        else:
+            query_vector, context_snippets = await _aretrieve(
+                adapter, query_text_of(messages), filters=filters, timings=retrieval
+            )
+            cache = _answer_cache(messages) if context_snippets else None
+    except ChatError as e:
+        yield sse_event("error", {"error": str(e)})
+        return
+
+    if cache is not None:
+        generation = await _ageneration()
+        cached = cache.get(query_vector, [c["id"] for c in context_snippets], mode, generation)
+    citations = _stream_citations(adapter, messages, context_snippets, cached)
+    yield sse_event("citations", {"citations": citations})
+    timings["ttfb_ms"] = elapsed_ms()
+
+    parts, complete = [], True
+    if not context_snippets or cached is not None:
+        timings["first_token_ms"] = elapsed_ms()
+        parts.append(cached["answer"] if cached is not None else NO_RESULTS_ANSWER)
+        yield sse_event("token", {"text": parts[0]})
+    else:
+        try:
+            async for delta in adapter.astream_completion(messages=messages, mode=mode, context_snippets=context_snippets):
+                if "first_token_ms" not in timings:
+                    timings["first_token_ms"] = elapsed_ms()
+                parts.append(delta)
+                yield sse_event("token", {"text": delta})
+        except StreamInterrupted:
+            complete = False
+            yield sse_event("error", {"error": STREAM_INTERRUPTED})
+        if cache is not None and complete:
+            _cache_answer(
+                cache, query_vector, context_snippets, mode, {"answer": "".join(parts), "citations": citations}, generation
+            )
+
+    timings["total_ms"] = elapsed_ms()
+    _log_answer(messages, mode, {"answer": "".join(parts), "citations": citations}, started, block=False)
+    print(f"📡 Streamed chat (async): ttfb={timings['ttfb_ms']}ms first_token={timings.get('first_token_ms')}ms total={timings['total_ms']}ms")
+    yield sse_event("done", dict(timings, citations=citations, retrieval=retrieval, complete=complete))
@@ -1,7 +1,24 @@
-import chromadb
+import threading
 
-# Create a persistent Chroma database folder named "chroma_db"
-client = chromadb.PersistentClient(path="chroma_db")
+from django.conf import settings
 
-# Create or get the collection where chat data will be saved
-collection = client.get_or_create_collection("chatbot_data")
\ No newline at end of file
+# Chroma is only opened when the "chroma" vector store is in use, not at import.
+_lock = threading.Lock()
+_client = None
+
+
+def get_chroma_client():
+    """Return the process-wide persistent Chroma client (folder CHROMA_PATH)."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                import chromadb
+                _client = chromadb.PersistentClient(path=str(getattr(settings, "CHROMA_PATH", "chroma_db")))
+    return _client
+
+
+def get_collection(name=None):
+    """Get or create the collection vectors are stored in (cosine distance)."""
+    name = name or getattr(settings, "CHROMA_COLLECTION", "copilot_vectors")
+    return get_chroma_client().get_or_create_collection(name=name, metadata={"hnsw:space": "cosine"})
@@ -0,0 +1,284 @@
+"""
+Embedding caches.
+
+Ingestion: texts are looked up by (adapter.embedding_model, sha256(text)) in
+the EmbeddingCache table; only misses are sent to the provider, and fresh
+vectors are written back. Fallback (hash) vectors are never cached, and
+rows stored with them are recorded under FALLBACK_EMBEDDING_MODEL.
+
+Chat queries: embed_query() keeps a bounded in-process LRU of normalised
+query text -> vector, namespaced by embedding model, so repeated questions
+(quick replies, retries) skip the provider round-trip. With
+QUERY_EMBEDDING_CACHE_PERSIST the EmbeddingCache table is used as a second
+tier that survives restarts, under model "query:<model>" so normalised
+queries never answer ingest lookups; new query vectors reach it through the
+write-behind queue (writebehind.py), never on the request thread, which also
+keeps at most QUERY_EMBEDDING_CACHE_PERSIST_MAX rows per model.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .adapters import FALLBACK_EMBEDDING_MODEL
+from .utils import pack_vector, unpack_vector
+from .writebehind import persist_query_embedding
+
+
+QUERY_MODEL_PREFIX = "query:"
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def query_model_key(model):
+    """EmbeddingCache.model for persisted chat queries, kept apart from ingest rows."""
+    return QUERY_MODEL_PREFIX + model
+
+
+def embed_with_cache(adapter, texts, fallback=True):
+    """
+    Return (vectors, stats) for `texts` in input order.
+    stats = {"hits": n, "misses": n}. With fallback=False provider errors
+    are raised; otherwise the adapter's fallback vectors are returned
+    uncached for the whole batch (so it never mixes dimensions) and stats
+    gains "fallback": n; store such rows under stored_model(adapter, stats).
+    """
+    from .models import EmbeddingCache
+
+    texts = list(texts)
+    if not getattr(settings, "EMBEDDING_CACHE_ENABLED", True) or not texts:
+        try:
+            return adapter.get_embeddings(texts, fallback=False), {"hits": 0, "misses": len(texts)}
+        except Exception:
+            if not fallback:
+                raise
+            return adapter.fallback_embeddings(texts), {"hits": 0, "misses": len(texts), "fallback": len(texts)}
+
+    model = adapter.embedding_model
+    hashes = [text_hash(t) for t in texts]
+    cached = {
+        h: unpack_vector(bytes(blob)).tolist()
+        for h, blob in EmbeddingCache.objects.filter(model=model, text_hash__in=set(hashes))
+        .values_list('text_hash', 'vector_blob')
+    }
+
+    missing = {}  # hash -> text, de-duplicated, in first-seen order
+    for h, t in zip(hashes, texts):
+        if h not in cached:
+            missing.setdefault(h, t)
+
+    if missing:
+        try:
+            fresh = adapter.get_embeddings(list(missing.values()), fallback=False)
+        except Exception:
+            if not fallback:
+                raise
+            return adapter.fallback_embeddings(texts), {"hits": 0, "misses": len(texts), "fallback": len(texts)}
+        EmbeddingCache.objects.bulk_create(
+            [
+                EmbeddingCache(model=model, text_hash=h, vector_blob=pack_vector(vec), dim=len(vec))
+                for h, vec in zip(missing, fresh)
+            ],
+            ignore_conflicts=True,
+        )
+        cached.update(zip(missing, fresh))
+
+    misses = sum(1 for h in hashes if h in missing)
+    return [cached[h] for h in hashes], {"hits": len(texts) - misses, "misses": misses}
+
+
+def stored_model(adapter, stats):
+    """Embedding model to record for vectors returned by embed_with_cache."""
+    return FALLBACK_EMBEDDING_MODEL if stats.get("fallback") else adapter.embedding_model
+
+
+def cache_summary(stats):
+    total = stats["hits"] + stats["misses"]
+    return dict(stats, hit_rate=round(stats["hits"] / total, 4) if total else 0.0)
+
+
+class QueryEmbeddingLRU:
+    """Thread-safe LRU of (model, normalised query) -> vector."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, model, query):
+        with self._lock:
+            vec = self._entries.get((model, query))
+            if vec is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end((model, query))
+            return vec
+
+    def put(self, model, query, vector):
+        with self._lock:
+            self._entries[(model, query)] = vector
+            self._entries.move_to_end((model, query))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        return dict(cache_summary({"hits": self.hits, "misses": self.misses}), entries=len(self._entries))
+
+
+_query_lock = threading.Lock()
+_query_cache = None
+
+
+def normalize_query(text):
+    """Case-fold and collapse whitespace so trivially different phrasings share an entry."""
+    return " ".join(text.split()).casefold()
+
+
+def get_query_cache():
+    """Process-wide query LRU, or None when QUERY_EMBEDDING_CACHE_SIZE is 0."""
+    global _query_cache
+    size = getattr(settings, "QUERY_EMBEDDING_CACHE_SIZE", 1024)
+    if not size:
+        return None
+    if _query_cache is None:
+        with _query_lock:
+            if _query_cache is None:
+                _query_cache = QueryEmbeddingLRU(size)
+    return _query_cache
+
+
+def reset_query_cache():
+    global _query_cache
+    with _query_lock:
+        _query_cache = None
+
+
+def _load_persisted(model, key_hash):
+    from .models import EmbeddingCache
+    blob = (
+        EmbeddingCache.objects.filter(model=query_model_key(model), text_hash=key_hash)
+        .values_list('vector_blob', flat=True).first()
+    )
+    return unpack_vector(bytes(blob)).tolist() if blob is not None else None
+
+
+def embed_query(adapter, text):
+    """
+    Return the embedding of one chat query, or None if the provider returned
+    nothing. Provider errors fall back to the adapter's fallback vector,
+    which is returned but not cached.
+    """
+    cache = get_query_cache()
+    if cache is None:
+        vectors = adapter.get_embeddings([text])
+        return vectors[0] if vectors else None
+
+    model, query = adapter.embedding_model, normalize_query(text)
+    vec = cache.get(model, query)
+    if vec is not None:
+        return vec
+    persist = getattr(settings, "QUERY_EMBEDDING_CACHE_PERSIST", False)
+    key_hash = text_hash(query)
+    if persist:
+        vec = _load_persisted(model, key_hash)
+    if vec is None:
+        try:
+            vectors = adapter.get_embeddings([text], fallback=False)
+        except Exception:
+            # The provider already ran its retries; do not send the query again.
+            return adapter.fallback_embeddings([text])[0]
+        if not vectors:
+            return None
+        vec = vectors[0]
+        if persist:
+            persist_query_embedding(query_model_key(model), key_hash, vec)
+    cache.put(model, query, vec)
+    return vec
+
+
+def embed_queries(adapter, texts):
+    """
+    Batched embed_query: cache misses are de-duplicated and embedded in one
+    adapter call (which splits them into provider requests). Returns vectors
+    in input order, None where the provider returned nothing.
+    """
+    texts = list(texts)
+    cache = get_query_cache()
+    if cache is None:
+        vectors = adapter.get_embeddings(texts) if texts else []
+        return [vectors[i] if i < len(vectors) else None for i in range(len(texts))]
+
+    model = adapter.embedding_model
+    queries = [normalize_query(t) for t in texts]
+    found = {q: cache.get(model, q) for q in set(queries)}
+    missing = {}  # normalised query -> first original text
+    for q, t in zip(queries, texts):
+        if found[q] is None:
+            missing.setdefault(q, t)
+
+    persist = getattr(settings, "QUERY_EMBEDDING_CACHE_PERSIST", False)
+    if persist and missing:
+        from .models import EmbeddingCache
+        hashes = {text_hash(q): q for q in missing}
+        for h, blob in EmbeddingCache.objects.filter(model=query_model_key(model), text_hash__in=list(hashes)).values_list(
+            'text_hash', 'vector_blob'
+        ):
+            q = hashes[h]
+            found[q] = unpack_vector(bytes(blob)).tolist()
+            cache.put(model, q, found[q])
+            del missing[q]
+
+    if missing:
+        try:
+            fresh = adapter.get_embeddings(list(missing.values()), fallback=False)
+        except Exception:
+            # Fallback vectors are used for this batch only, never cached.
+            found.update(zip(missing, adapter.fallback_embeddings(list(missing.values()))))
+        else:
+            found.update(zip(missing, fresh))
+            for q, vec in zip(missing, fresh):
+                cache.put(model, q, vec)
+            if persist:
+                for q, vec in zip(missing, fresh):
+                    persist_query_embedding(query_model_key(model), text_hash(q), vec)
+    return [found.get(q) for q in queries]
+
+
+async def aembed_query(adapter, text):
+    """Async embed_query; the persistent tier is read via sync_to_async."""
+    from asgiref.sync import sync_to_async
+
+    cache = get_query_cache()
+    if cache is None:
+        vectors = await adapter.aget_embeddings([text])
+        return vectors[0] if vectors else None
+
+    model, query = adapter.embedding_model, normalize_query(text)
+    vec = cache.get(model, query)
+    if vec is not None:
+        return vec
+    persist = getattr(settings, "QUERY_EMBEDDING_CACHE_PERSIST", False)
+    key_hash = text_hash(query)
+    if persist:
+        vec = await sync_to_async(_load_persisted)(model, key_hash)
+    if vec is None:
+        try:
+            vectors = await adapter.aget_embeddings([text], fallback=False)
+        except Exception:
+            return adapter.fallback_embeddings([text])[0]
+        if not vectors:
+            return None
+        vec = vectors[0]
+        if persist:
+            persist_query_embedding(query_model_key(model), key_hash, vec, block=False)
+    cache.put(model, query, vec)
+    return vec
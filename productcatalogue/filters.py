@@ -0,0 +1,202 @@
+"""
+Structured attribute filters applied before vector scoring.
+
+AttributeIndex holds the product attributes column-wise: prices sorted once
+(range queries are two binary searches), parsed longevity hours, one boolean
+mask ("bitset") per season and accord token, and popularity for the reranker
+(see rerank.py). match() turns a filter dict into the set of matching
+product ids, and retrieval only scores the index rows of those products plus
+every FAQ row. The index is per process and is rebuilt whenever the ingest
+generation (generation.py) moves on, whichever process ingested.
+
+Supported filters (all optional, combined with AND):
+    price_min, price_max      inclusive price bounds
+    season                    a season or list of seasons; "all" products always match
+    accords                   an accord or list of accords, all of which must be present
+    longevity_min             product lasts at least this many hours (upper end of its range)
+    longevity_max             product's range starts at or below this many hours
+"""
+import re
+import threading
+
+import numpy as np
+
+FILTER_KEYS = ("price_min", "price_max", "season", "accords", "longevity_min", "longevity_max")
+ALL_SEASONS = "all"
+
+_LONGEVITY_RE = re.compile(
+    r"(\d+(?:\.\d+)?)\s*(?:(?:-|–|to)\s*(\d+(?:\.\d+)?))?\s*(h|hr|hrs|hour|hours|d|day|days)?",
+    re.IGNORECASE,
+)
+
+
+def parse_longevity(text):
+    """
+    Parse "8-10h", "12h", "6 to 8 hours" or "2 days" into (min_hours,
+    max_hours). Returns (None, None) when no number is present.
+    """
+    match = _LONGEVITY_RE.search(text or "")
+    if not match:
+        return None, None
+    low = float(match.group(1))
+    high = float(match.group(2)) if match.group(2) else low
+    if (match.group(3) or "").lower().startswith("d"):
+        low, high = low * 24, high * 24
+    return min(low, high), max(low, high)
+
+
+def _tokens(value):
+    """Split a comma/slash separated attribute ("citrus, woody") into lower-case tokens."""
+    if isinstance(value, (list, tuple)):
+        return [t for v in value for t in _tokens(v)]
+    return [t.strip().casefold() for t in re.split(r"[,/;|]", value or "") if t.strip()]
+
+
+def parse_filters(data):
+    """
+    Validate a filters dict from a request body. Returns a cleaned dict (None
+    when empty) and raises ValueError on unknown keys or bad values.
+    """
+    if not data:
+        return None
+    if not isinstance(data, dict):
+        raise ValueError("filters must be an object")
+    unknown = set(data) - set(FILTER_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown filters: {', '.join(sorted(unknown))}")
+    cleaned = {}
+    for key, value in data.items():
+        if value in (None, "", []):
+            continue
+        if key in ("season", "accords"):
+            values = value if isinstance(value, (list, tuple)) else [value]
+            if not all(isinstance(v, str) for v in values):
+                raise ValueError(f"{key} must be a string or a list of strings")
+            cleaned[key] = _tokens(value)
+        else:
+            try:
+                cleaned[key] = float(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"{key} must be a number")
+    return cleaned or None
+
+
+class AttributeIndex:
+    def __init__(self, ids, prices, longevity_min, longevity_max, seasons, accords, popularity=None):
+        self.ids = np.asarray(ids, dtype=object)
+        self.positions = {pid: pos for pos, pid in enumerate(ids)}
+        n = len(self.ids)
+        prices = np.asarray(prices, dtype=np.float64)
+        self.price_order = np.argsort(prices, kind="stable")
+        self.sorted_prices = prices[self.price_order]
+        self.longevity_min = np.asarray(longevity_min, dtype=np.float64)
+        self.longevity_max = np.asarray(longevity_max, dtype=np.float64)
+        self.season_masks = self._masks(seasons, n)
+        self.accord_masks = self._masks(accords, n)
+        self.popularity = np.asarray(popularity if popularity is not None else np.zeros(n), dtype=np.float64)
+        self.generation = 0  # ingest generation of the rows, set by get_attribute_index
+
+    def __len__(self):
+        return len(self.ids)
+
+    @staticmethod
+    def _masks(values, n):
+        masks = {}
+        for pos, value in enumerate(values):
+            for token in _tokens(value):
+                masks.setdefault(token, np.zeros(n, dtype=bool))[pos] = True
+        return masks
+
+    @classmethod
+    def from_rows(cls, rows):
+        """rows: (id, price, longevity_min_hours, longevity_max_hours, season, accords, popularity) tuples."""
+        rows = list(rows)
+        nan = float("nan")
+        return cls(
+            ids=[r[0] for r in rows],
+            prices=[r[1] if r[1] is not None else nan for r in rows],
+            longevity_min=[r[2] if r[2] is not None else nan for r in rows],
+            longevity_max=[r[3] if r[3] is not None else nan for r in rows],
+            seasons=[r[4] for r in rows],
+            accords=[r[5] for r in rows],
+            popularity=[r[6] or 0.0 for r in rows],
+        )
+
+    def _price_mask(self, low, high):
+        # NaN prices sort last and never fall inside a bounded range.
+        start = 0 if low is None else np.searchsorted(self.sorted_prices, low, side="left")
+        stop = (
+            np.searchsorted(self.sorted_prices, high, side="right") if high is not None
+            else len(self.sorted_prices) - int(np.isnan(self.sorted_prices).sum())
+        )
+        mask = np.zeros(len(self), dtype=bool)
+        mask[self.price_order[start:stop]] = True
+        return mask
+
+    def match(self, filters):
+        """Return the set of product ids that satisfy every filter."""
+        mask = np.ones(len(self), dtype=bool)
+        if "price_min" in filters or "price_max" in filters:
+            mask &= self._price_mask(filters.get("price_min"), filters.get("price_max"))
+        if filters.get("season"):
+            season_mask = self.season_masks.get(ALL_SEASONS, np.zeros(len(self), dtype=bool)).copy()
+            for season in filters["season"]:
+                if season in self.season_masks:
+                    season_mask |= self.season_masks[season]
+            mask &= season_mask
+        for accord in filters.get("accords", ()):
+            mask &= self.accord_masks.get(accord, np.zeros(len(self), dtype=bool))
+        with np.errstate(invalid="ignore"):
+            if "longevity_min" in filters:
+                mask &= self.longevity_max >= filters["longevity_min"]
+            if "longevity_max" in filters:
+                mask &= self.longevity_min <= filters["longevity_max"]
+        return set(self.ids[mask])
+
+    def popularity_of(self, product_ids):
+        """Popularity scaled to [0, 1] by the catalogue maximum; unknown ids get 0."""
+        top = self.popularity.max() if len(self) else 0.0
+        values = np.array([
+            self.popularity[self.positions[pid]] if pid in self.positions else 0.0 for pid in product_ids
+        ], dtype=np.float64)
+        return values / top if top > 0 else values
+
+
+_lock = threading.Lock()
+_index = None
+
+
+def get_attribute_index():
+    """
+    Process-wide AttributeIndex, built from the Product table on first use and
+    again whenever data_generation() has moved past the one it was built at.
+    """
+    from .generation import current_generation, data_generation
+    from .models import Product
+
+    global _index
+    generation = data_generation()
+    idx = _index
+    if idx is not None and idx.generation >= generation:
+        return idx
+    with _lock:
+        if _index is None or _index.generation < generation:
+            built_at = current_generation()[0]  # before the rows, see lexical._build_from_store
+            index = AttributeIndex.from_rows(Product.objects.values_list(
+                'id', 'price', 'longevity_min_hours', 'longevity_max_hours', 'season', 'accords', 'popularity'
+            ))
+            index.generation = built_at
+            _index = index
+        return _index
+
+
+def invalidate_attribute_index():
+    """Called whenever product rows change; the next query that needs it rebuilds."""
+    global _index
+    with _lock:
+        _index = None
+
+
+def match_products(filters):
+    """Product ids matching `filters` (already cleaned by parse_filters)."""
+    return get_attribute_index().match(filters)
@@ -0,0 +1,57 @@
+"""
+Ingest generation counter: one DataGeneration row whose value goes up in the
+same transaction as every batch that inserts or updates Product / FAQChunk
+rows. Readers use it as a cheap "has the catalogue changed?" check, e.g. the
+ETag / Last-Modified of the data endpoints.
+
+data_generation() is the same value for per-process caches (answer cache,
+BM25 and attribute indexes): every worker re-reads it at most every
+DATA_GENERATION_CHECK_SECONDS and drops what it built from an older
+generation, so an ingest in one process reaches all of them.
+"""
+import time
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+GENERATION_ID = 1
+
+_checked = None  # (value, time.monotonic() of the read)
+
+
+def current_generation():
+    """Return (value, updated_at); (0, None) before the first ingest."""
+    from .models import DataGeneration
+    row = DataGeneration.objects.filter(pk=GENERATION_ID).values_list('value', 'updated_at').first()
+    return row or (0, None)
+
+
+def data_generation():
+    """Generation value, read from the database at most every DATA_GENERATION_CHECK_SECONDS."""
+    global _checked
+    now = time.monotonic()
+    checked = _checked
+    if checked is not None and now - checked[1] < getattr(settings, "DATA_GENERATION_CHECK_SECONDS", 1.0):
+        return checked[0]
+    value = current_generation()[0]
+    _checked = (value, now)
+    return value
+
+
+def forget_generation():
+    """Make the next data_generation() call read the database."""
+    global _checked
+    _checked = None
+
+
+def bump_generation():
+    """Advance the counter and return the new value; call inside the transaction that changes the rows."""
+    from .models import DataGeneration
+    now = timezone.now()
+    if not DataGeneration.objects.filter(pk=GENERATION_ID).update(value=F('value') + 1, updated_at=now):
+        _, created = DataGeneration.objects.get_or_create(pk=GENERATION_ID, defaults={'value': 1, 'updated_at': now})
+        if not created:
+            DataGeneration.objects.filter(pk=GENERATION_ID).update(value=F('value') + 1, updated_at=now)
+    forget_generation()
+    return DataGeneration.objects.values_list('value', flat=True).get(pk=GENERATION_ID)
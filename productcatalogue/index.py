@@ -0,0 +1,467 @@
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+import numpy as np
+from django.conf import settings
+
+from . import snapshot
+from .ann import IVFIndex
+from .filters import invalidate_attribute_index
+from .lexical import invalidate_lexical_index
+from .quantize import ScalarQuantizer
+
+
+class VectorIndex:
+    """
+    Immutable in-memory snapshot of every stored embedding.
+
+    Rows of `matrix` are L2-normalised float32, so cosine similarity against a
+    normalised query is a single matrix-vector product. A snapshot is never
+    mutated after construction: writers build a new one and swap the module
+    level reference, so readers always see a complete index.
+
+    `ann` is an optional IVFIndex (see ann.py) over the same rows; when set,
+    search() only scores the rows in the closest cells unless exact=True.
+    `quant` is an optional ScalarQuantizer (see quantize.py); when set,
+    search() scores the int8 codes and rescores the best rows exactly.
+
+    `generation` is the ingest generation (generation.py) the rows reflect;
+    get_index() rebuilds the resident index once the database has moved on.
+    """
+
+    def __init__(self, ids, sources, source_obj_ids, texts, matrix, version=0, ann=None, quant=None, generation=0):
+        self.ids = list(ids)
+        self.sources = list(sources)
+        self.source_obj_ids = list(source_obj_ids)
+        self.texts = list(texts)
+        self.matrix = matrix
+        self.version = version
+        self.ann = ann
+        self.quant = quant
+        self.generation = generation
+        self.positions = {vid: i for i, vid in enumerate(self.ids)}
+        self._product_rows = None  # built on first filtered search
+        self._other_rows = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def dim(self):
+        return self.matrix.shape[1] if self.matrix.ndim == 2 and len(self.ids) else None
+
+    @staticmethod
+    def normalize(vectors):
+        """Return a float32 copy of `vectors` with every row scaled to unit length."""
+        mat = np.array(vectors, dtype=np.float32, ndmin=2)
+        norms = np.linalg.norm(mat, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return mat / norms
+
+    @classmethod
+    def empty(cls, version=0):
+        return cls([], [], [], [], np.zeros((0, 0), dtype=np.float32), version)
+
+    @classmethod
+    def from_items(cls, items, version=0):
+        """
+        Build an index from load_all_vectors() style dicts.
+        Vectors whose dimension differs from the most common one are skipped,
+        since they cannot be scored against the same query.
+        """
+        items = [it for it in items if len(it['vector'])]
+        if not items:
+            return cls.empty(version)
+
+        dim = Counter(len(it['vector']) for it in items).most_common(1)[0][0]
+        kept = [it for it in items if len(it['vector']) == dim]
+        if len(kept) != len(items):
+            print(f"⚠️ Vector index skipped {len(items) - len(kept)} vectors not matching dim={dim}")
+
+        return cls(
+            ids=[it['id'] for it in kept],
+            sources=[it['source'] for it in kept],
+            source_obj_ids=[it['source_obj_id'] for it in kept],
+            texts=[it['text'] for it in kept],
+            matrix=cls.normalize(np.vstack([it['vector'] for it in kept])),
+            version=version,
+        )
+
+    def with_upserts(self, items, version):
+        """
+        Return a new snapshot with `items` inserted or replaced by id.
+        Returns None when the items cannot be merged (dimension change), in
+        which case the caller should rebuild from the database.
+        """
+        if not items:
+            return self
+        dims = {len(it['vector']) for it in items}
+        if len(dims) != 1 or (self.dim is not None and self.dim not in dims):
+            return None
+
+        ids = list(self.ids)
+        sources = list(self.sources)
+        source_obj_ids = list(self.source_obj_ids)
+        texts = list(self.texts)
+        positions = dict(self.positions)
+        rows = self.normalize(np.vstack([it['vector'] for it in items]))
+
+        touched, replace_at, replace_rows, append_rows = [], [], [], []
+        for it, row in zip(items, rows):
+            pos = positions.get(it['id'])
+            if pos is None:
+                pos = len(ids)
+                positions[it['id']] = pos
+                ids.append(it['id'])
+                sources.append(it['source'])
+                source_obj_ids.append(it['source_obj_id'])
+                texts.append(it['text'])
+                append_rows.append(row)
+                touched.append(pos)
+            else:
+                sources[pos] = it['source']
+                source_obj_ids[pos] = it['source_obj_id']
+                texts[pos] = it['text']
+                replace_at.append(pos)
+                replace_rows.append(row)
+                touched.append(pos)
+
+        if self.dim is None:
+            matrix = np.vstack(append_rows)
+        else:
+            parts = [self.matrix] + ([np.vstack(append_rows)] if append_rows else [])
+            matrix = np.vstack(parts) if len(parts) > 1 else self.matrix.copy()
+        if replace_at:
+            matrix[replace_at] = np.vstack(replace_rows)
+
+        ann = self.ann.with_inserts(matrix, touched) if self.ann is not None else None
+        quant = self.quant.with_inserts(matrix, touched) if self.quant is not None else None
+        return VectorIndex(ids, sources, source_obj_ids, texts, matrix, version, ann, quant, self.generation)
+
+    def memory_report(self):
+        """Size of the float32 matrix and, when attached, of the int8 codes, in MB."""
+        mb = 1024 * 1024
+        float_bytes = len(self) * (self.dim or 0) * 4
+        report = {'vectors': len(self), 'dim': self.dim, 'float32_mb': round(float_bytes / mb, 3)}
+        if self.quant is not None:
+            report['int8_mb'] = round(self.quant.nbytes / mb, 3)
+            report['savings_pct'] = round(100 * (1 - self.quant.nbytes / float_bytes), 1) if float_bytes else 0.0
+        return report
+
+    def rows_for_products(self, product_ids):
+        """
+        Sorted row positions of every non-product row plus the product rows
+        whose source_obj_id is in `product_ids` (see filters.py).
+        """
+        if self._product_rows is None:
+            product_rows, other = {}, []
+            for pos, (source, obj_id) in enumerate(zip(self.sources, self.source_obj_ids)):
+                if source == 'product':
+                    product_rows.setdefault(obj_id, []).append(pos)
+                else:
+                    other.append(pos)
+            self._product_rows = product_rows
+            self._other_rows = other
+        rows = list(self._other_rows)
+        for pid in product_ids:
+            rows.extend(self._product_rows.get(pid, ()))
+        return np.array(sorted(rows), dtype=np.int64)
+
+    def search(self, query_vector, k=8, threshold=0.35, nprobe=None, exact=False, rows=None, rescore=None):
+        """
+        Returns top_k rows above similarity threshold, best first.
+        Uses the IVF index when one is attached, probing `nprobe` cells
+        (IVF_NPROBE by default); exact=True always scans every row.
+        With int8 codes attached the scan uses the codes and the best
+        `rescore` rows (QUANT_RESCORE_CANDIDATES by default) are rescored
+        with the float32 matrix, so returned scores are always exact.
+        `rows` (sorted positions, e.g. from rows_for_products) restricts
+        scoring to that subset of the matrix.
+        """
+        if not len(self):
+            return []
+        qv = np.asarray(query_vector, dtype=np.float32).reshape(-1)
+        if qv.shape[0] != self.dim:
+            print(f"⚠️ Query dim {qv.shape[0]} does not match index dim {self.dim}")
+            return []
+
+        norm = np.linalg.norm(qv)
+        if norm:
+            qv = qv / norm
+        if self.ann is not None and not exact:
+            probed = np.sort(self.ann.candidates(qv, nprobe or getattr(settings, "IVF_NPROBE", 8)))
+            rows = probed if rows is None else np.intersect1d(probed, rows, assume_unique=True)
+        if rows is not None and not len(rows):
+            return []
+        if self.quant is not None and not exact:
+            return self._search_quantized(qv, k, threshold, rows, rescore)
+        if rows is not None:
+            scores = np.asarray(self.matrix[rows]) @ qv
+        else:
+            scores = self.matrix @ qv
+
+        return self._top(scores, k, threshold, rows)
+
+    def _search_quantized(self, qv, k, threshold, rows, rescore):
+        approx = self.quant.scores(qv, rows)
+        depth = max(k, rescore or getattr(settings, "QUANT_RESCORE_CANDIDATES", 100))
+        best = np.argpartition(-approx, depth - 1)[:depth] if approx.size > depth else np.arange(approx.size)
+        # Sorted positions keep the float32 reads sequential (and mmap friendly).
+        candidates = np.sort(rows[best] if rows is not None else best)
+        return self._top(np.asarray(self.matrix[candidates]) @ qv, k, threshold, candidates)
+
+    def search_batch(self, query_vectors, k=8, threshold=0.35, rows=None, block=None):
+        """
+        search() for many queries. Exact scans score a block of queries with
+        one matrix product; the block is sized so its score matrix stays
+        within SEARCH_BATCH_MEMORY_MB (`block` overrides). With an IVF index
+        or int8 codes attached every query goes through search(), so batch
+        and single queries always take the same path. Returns one list per query.
+        """
+        queries = np.array(query_vectors, dtype=np.float32, ndmin=2)
+        if not len(self) or queries.shape[1] != self.dim or (rows is not None and not len(rows)):
+            if len(self) and queries.shape[1] != self.dim:
+                print(f"⚠️ Query dim {queries.shape[1]} does not match index dim {self.dim}")
+            return [[] for _ in range(queries.shape[0])]
+        if self.ann is not None or self.quant is not None:
+            return [self.search(q, k=k, threshold=threshold, rows=rows) for q in queries]
+        queries = self.normalize(queries)
+        matrix = self.matrix if rows is None else np.asarray(self.matrix[rows])
+        if block is None:
+            budget = getattr(settings, "SEARCH_BATCH_MEMORY_MB", 64) * 1024 * 1024
+            block = max(1, budget // (matrix.shape[0] * 4))  # float32 scores per query
+        results = []
+        for start in range(0, queries.shape[0], block):
+            for scores in queries[start:start + block] @ matrix.T:
+                results.append(self._top(scores, k, threshold, rows))
+        return results
+
+    def _top(self, scores, k, threshold, rows):
+        """Result dicts for the k best `scores` at or above threshold; `rows` maps score positions to rows."""
+        candidates = np.flatnonzero(scores >= threshold)
+        if not candidates.size:
+            return []
+        if candidates.size > k:
+            # O(n) selection of the k best, then sort only those k.
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        order = candidates[np.argsort(-scores[candidates], kind='stable')]
+        positions = rows[order] if rows is not None else order
+
+        return [
+            {
+                'id': self.ids[pos],
+                'source': self.sources[pos],
+                'source_obj_id': self.source_obj_ids[pos],
+                'text': self.texts[pos],
+                'score': float(scores[i]),
+            }
+            for i, pos in zip(order, positions)
+        ]
+
+
+_lock = threading.Lock()
+_index = None
+_version = 0
+_defer_depth = 0  # > 0 while an mmap writer batches snapshot publishes
+_deferred = []  # items stored meanwhile, merged and published on the way out
+
+
+def _use_mmap():
+    return getattr(settings, "VECTOR_INDEX_STORAGE", "memory") == "mmap"
+
+
+def _snapshot_dir():
+    return str(getattr(settings, "VECTOR_SNAPSHOT_DIR", "vector_snapshot"))
+
+
+def _with_ann(index):
+    """
+    Attach (or retrain) an IVF index when VECTOR_INDEX_ANN="ivf" and the
+    collection is large enough; small collections keep the exact scan.
+    Called on snapshots that have not been published yet.
+    """
+    if getattr(settings, "VECTOR_INDEX_ANN", "exact") != "ivf":
+        index.ann = None
+        return index
+    if len(index) < getattr(settings, "ANN_MIN_VECTORS", 20000):
+        index.ann = None
+        return index
+    if index.ann is None or len(index) >= 2 * index.ann.trained_size:
+        index.ann = IVFIndex.train(index.matrix, nlist=getattr(settings, "IVF_NLIST", 0))
+        print(f"✅ Trained IVF index: {index.ann.nlist} cells over {len(index)} vectors")
+    return index
+
+
+def _with_quant(index):
+    """
+    Attach (or retrain) int8 codes when VECTOR_INDEX_QUANTIZATION="int8" and
+    the collection has QUANT_MIN_VECTORS rows. Codes are retrained once the
+    index has doubled since training, so the per-dimension ranges stay current.
+    """
+    if getattr(settings, "VECTOR_INDEX_QUANTIZATION", "none") != "int8" or not len(index):
+        index.quant = None
+        return index
+    if len(index) < getattr(settings, "QUANT_MIN_VECTORS", 20000):
+        index.quant = None
+        return index
+    if index.quant is None or len(index) >= 2 * index.quant.trained_size:
+        index.quant = ScalarQuantizer.train(index.matrix)
+        report = index.memory_report()
+        print(f"✅ Quantized vector index: {report['float32_mb']} MB float32 -> {report['int8_mb']} MB int8")
+    return index
+
+
+def _prepare(index):
+    """Attach the optional search structures (IVF cells, int8 codes) to an unpublished snapshot."""
+    return _with_quant(_with_ann(index))
+
+
+def _build_from_db():
+    from .generation import current_generation
+    from .utils import load_all_vectors
+    built_at = current_generation()[0]  # before the rows, see lexical._build_from_store
+    index = VectorIndex.from_items(load_all_vectors(), version=_version)
+    index.generation = built_at
+    return _prepare(index)
+
+
+def _publish(index):
+    """Write `index` as a new shared snapshot and return its read-only mapping."""
+    directory = _snapshot_dir()
+    generation = snapshot.write_snapshot(index, directory)
+    return snapshot.load_snapshot(directory, generation)
+
+
+def _get_mmap_index(idx):
+    """
+    Return the latest published snapshot, mapping a newer generation if another
+    process has published one since our last query.
+    """
+    global _index
+    directory = _snapshot_dir()
+    if idx is not None and idx.version == snapshot.current_generation(directory):
+        return idx
+    with _lock:
+        generation = snapshot.current_generation(directory)
+        if _index is not None and _index.version == generation:
+            return _index
+        if generation:
+            _index = _prepare(snapshot.load_snapshot(directory, generation))
+        else:
+            with snapshot.publish_lock(directory):
+                generation = snapshot.current_generation(directory)
+                if generation:
+                    _index = _prepare(snapshot.load_snapshot(directory, generation))
+                else:
+                    _index = _publish(_build_from_db())
+        return _index
+
+
+def get_index():
+    """
+    Return the process-wide index, building it from the database on first use.
+    Reads after the first build are lock-free. With VECTOR_INDEX_STORAGE="mmap"
+    the index is the shared on-disk snapshot (see snapshot.py); otherwise it is
+    rebuilt once data_generation() has moved past the generation it was built at.
+    """
+    from .generation import data_generation
+    global _index
+    idx = _index
+    if _use_mmap():
+        return _get_mmap_index(idx)
+    generation = data_generation()
+    if idx is not None and idx.generation >= generation:
+        return idx
+    with _lock:
+        if _index is None or _index.generation < generation:
+            _index = _build_from_db()
+            print(f"✅ Built vector index: {len(_index)} vectors (version {_index.version})")
+        return _index
+
+
+@contextmanager
+def deferred_publish():
+    """
+    In mmap mode, collect the vectors stored inside the block and publish them
+    as one snapshot generation when the outermost block exits, instead of
+    rewriting the whole snapshot for every store batch. Readers keep the
+    previous generation until then. Does nothing in memory mode.
+    """
+    global _defer_depth, _deferred
+    with _lock:
+        _defer_depth += 1
+    try:
+        yield
+    finally:
+        with _lock:
+            _defer_depth -= 1
+            items = _deferred if not _defer_depth else []
+            if not _defer_depth:
+                _deferred = []
+        if items:
+            upsert_into_index(items)
+
+
+def upsert_into_index(items, generation=None):
+    """
+    Merge freshly stored vectors into the resident index.
+    If no index has been built yet the next get_index() call will pick them
+    up from the database, so only the version is bumped. In mmap mode the
+    merged index is published as a new snapshot generation for all workers.
+    `generation` is the value bump_generation() returned for the batch, as in
+    lexical.upsert_into_lexical_index.
+    """
+    global _index, _version
+    if not items:
+        # Only catalogue fields changed: the rows are still current.
+        with _lock:
+            if _index is not None and generation is not None and _index.generation == generation - 1:
+                _index.generation = generation
+        return
+    with _lock:
+        if _use_mmap() and _defer_depth:
+            _deferred.extend(items)
+            return
+        _version += 1
+        if _use_mmap():
+            directory = _snapshot_dir()
+            with snapshot.publish_lock(directory):
+                generation = snapshot.current_generation(directory)
+                if not generation:
+                    _index = None
+                    return
+                base = _index
+                if base is None or base.version != generation:
+                    base = snapshot.load_snapshot(directory, generation)
+                updated = base.with_upserts(items, generation)
+                _index = _publish(_prepare(updated) if updated is not None else _build_from_db())
+            return
+        if _index is None:
+            return
+        base = _index
+        updated = base.with_upserts(items, _version)
+        if updated is None:
+            _index = _build_from_db()
+            return
+        if generation is not None and base.generation == generation - 1:
+            updated.generation = generation
+        _index = _prepare(updated)
+
+
+def invalidate_index():
+    """
+    Drop the resident index (and the lexical and attribute indexes); the next
+    query rebuilds it from the database. In mmap mode a fresh snapshot is
+    rebuilt and published immediately so other workers drop theirs as well.
+    """
+    global _index, _version
+    invalidate_lexical_index()
+    invalidate_attribute_index()
+    with _lock:
+        _version += 1
+        _index = None
+        if _use_mmap():
+            directory = _snapshot_dir()
+            with snapshot.publish_lock(directory):
+                _index = _publish(_build_from_db())
@@ -0,0 +1,309 @@
+"""
+Ingestion pipelines used by UploadIngestView and background ingestion jobs.
+
+Uploads are decoded incrementally and grouped into embedding batches sized
+to a token budget, and each batch is embedded and stored before the next one
+is read. Memory use therefore stays flat regardless of file size, and a
+provider error only loses the batch it happened in.
+"""
+import codecs
+import csv
+import hashlib
+import os
+import time
+
+from django.conf import settings
+
+from . import batching
+from .embedding_cache import cache_summary, embed_with_cache, stored_model
+from .index import deferred_publish, get_index
+from .utils import chunk_faq_markdown, store_product_and_embeddings, store_faq_chunks_and_embeddings
+from .vectorstores import get_vector_store
+
+
+def batch_by_token_budget(items, text_of, max_tokens=None, max_items=None):
+    """
+    Group rows into ingest batches bounded by EMBEDDING_BATCH_MAX_TOKENS and
+    EMBEDDING_BATCH_MAX_ITEMS (see batching.batch_by_token_budget).
+    """
+    return batching.batch_by_token_budget(
+        items,
+        text_of,
+        max_tokens or getattr(settings, "EMBEDDING_BATCH_MAX_TOKENS", 50000),
+        max_items or getattr(settings, "EMBEDDING_BATCH_MAX_ITEMS", 256),
+    )
+
+
+def _parse_number(raw):
+    """CSV number cell as a float; blank, "null" or unparseable cells become 0.0."""
+    try:
+        return float(raw) if raw not in (None, "", "null", "NULL") else 0.0
+    except (ValueError, TypeError):
+        return 0.0
+
+
+def parse_product_row(row):
+    """Turn one products.csv row into the dict store_product_and_embeddings expects."""
+    return {
+        "id": row.get("id") or row.get("ID") or row.get("Id"),
+        "name": row.get("name", ""),
+        "notes": row.get("notes", ""),
+        "accords": row.get("accords", ""),
+        "price": _parse_number(row.get("price")),
+        "longevity": row.get("longevity", ""),
+        "season": row.get("season", ""),
+        "imageUrl": row.get("imageUrl", ""),
+        "popularity": _parse_number(row.get("popularity")),
+    }
+
+
+def product_embed_text(prod):
+    return (
+        f"Product name: {prod['name']}. "
+        f"Description: {prod['notes']}. "
+        f"Price: ${prod['price']:.2f}. "
+        f"Features/Accords: {prod['accords']}. "
+        f"Longevity: {prod['longevity']}. "
+        f"Recommended season: {prod['season']}."
+    )
+
+
+def iter_csv_dicts(fileobj, encoding="utf-8"):
+    """
+    Yield csv.DictReader rows from a binary file object (or Django
+    UploadedFile) line by line, decoding incrementally.
+    """
+    return csv.DictReader(codecs.iterdecode(fileobj, encoding))
+
+
+def _summary(report):
+    keys = (
+        "inserted", "updated", "unchanged", "skipped", "batches", "errors", "write_failures", "seconds",
+        "pages", "pages_per_sec", "peak_rss_mb",
+    )
+    summary = {key: report[key] for key in keys if key in report}
+    if "cache" in report:
+        summary["embedding_cache"] = cache_summary(report["cache"])
+    return summary
+
+
+def ingest_products_csv(fileobj, adapter, max_tokens=None, max_items=None, progress=None):
+    """
+    Stream products.csv: parse rows, embed them in token-budgeted batches and
+    store each batch before reading the next.
+
+    Returns a report with rows stored, inserted/updated/unchanged counts,
+    skipped rows (no id), per-batch errors, vector store write failures and
+    embedding cache hits/misses.
+    `progress(stage, rows)` is called after every batch.
+    """
+    report = {
+        "rows": 0, "inserted": 0, "updated": 0, "unchanged": 0,
+        "skipped": 0, "batches": 0, "errors": [], "write_failures": [], "seconds": 0.0,
+        "cache": {"hits": 0, "misses": 0},
+    }
+    started = time.perf_counter()
+
+    def products():
+        for row in iter_csv_dicts(fileobj):
+            prod = parse_product_row(row)
+            if not prod["id"]:
+                report["skipped"] += 1
+                continue
+            prod["embed_text"] = product_embed_text(prod)
+            yield prod
+
+    for batch_no, batch in enumerate(batch_by_token_budget(products(), lambda p: p["embed_text"], max_tokens, max_items)):
+        report["batches"] += 1
+        try:
+            vectors, cache = embed_with_cache(adapter, [p["embed_text"] for p in batch], fallback=False)
+            report["cache"]["hits"] += cache["hits"]
+            report["cache"]["misses"] += cache["misses"]
+            stored = store_product_and_embeddings(batch, vectors, model=adapter.embedding_model)
+        except Exception as e:
+            print(f"❌ Product batch {batch_no} ({len(batch)} rows) failed: {e}")
+            report["errors"].append({
+                "batch": batch_no,
+                "first_id": batch[0]["id"],
+                "rows": len(batch),
+                "error": str(e),
+            })
+            continue
+        report["rows"] += len(batch)
+        for key in ("inserted", "updated", "unchanged"):
+            report[key] += stored[key]
+        report["write_failures"].extend(stored["write_failures"])
+        if progress:
+            progress("products", report["rows"])
+
+    report["seconds"] = round(time.perf_counter() - started, 4)
+    print(f"✅ Streamed {report['rows']} products in {report['batches']} batches ({report['seconds']}s)")
+    return report
+
+
+def find_faq_upload(uploads):
+    """Return the (key, upload) of the first FAQ file (.pdf or .md), else (None, None)."""
+    for key, upload in uploads.items():
+        name = upload["name"].lower()
+        if name.endswith(".pdf") or key.lower().endswith(".pdf"):
+            print(f"📂 Detected PDF upload with key='{key}', filename='{upload['name']}'")
+            return key, upload
+        elif name.endswith(".md") or key.lower() in ["faq", "faq.md"]:
+            print(f"📄 Detected Markdown upload with key='{key}', filename='{upload['name']}'")
+            return key, upload
+    return None, None
+
+
+def pdf_chunk_ids(chunks, source_name):
+    """
+    Give each chunk a stable id: faq_pdf_<name key>_p<first page>_<n>, where
+    the key is a hash of the uploaded file name and n counts the chunks that
+    start on that page. Different PDFs never share ids, and re-uploading a
+    file only moves the ids of pages whose text changed.
+    """
+    key = hashlib.sha1(source_name.encode("utf-8")).hexdigest()[:10]
+    seen = {}
+    for c in chunks:
+        seen[c["page_start"]] = n = seen.get(c["page_start"], 0) + 1
+        yield f"faq_pdf_{key}_p{c['page_start']}_{n}", c
+
+
+def ingest_pdf(path, adapter, progress=None, workers=None, max_chars=None, source_name=None):
+    """
+    Extract the PDF in page ranges on a process pool (PDF_WORKERS, only for
+    documents of PDF_PARALLEL_MIN_PAGES or more), chunk the page stream to at
+    most PDF_CHUNK_CHARS characters with page provenance in the heading, and
+    embed/store the chunks in token-budgeted batches as they arrive.
+    Chunk ids come from `source_name` (the uploaded file name, default the
+    basename of `path`) and the pages, see pdf_chunk_ids.
+
+    Returns the ingest report plus pages, pages_per_sec and peak_rss_mb
+    (lifetime memory high-water marks of this process and of its worker
+    processes, see pdf.peak_rss_mb), or None when no text was extracted.
+    """
+    from .pdf import chunk_pages, iter_pdf_pages, page_count, peak_rss_mb
+
+    print("🧾 Starting PDF processing (using fitz)...")
+    started = time.perf_counter()
+    total = page_count(path)
+    if workers is None:
+        workers = getattr(settings, "PDF_WORKERS", 4)
+    if total < getattr(settings, "PDF_PARALLEL_MIN_PAGES", 64):
+        workers = 1
+    pages = iter_pdf_pages(path, workers=workers, pages_per_task=getattr(settings, "PDF_PAGES_PER_TASK", 32), total=total)
+    chunks = (
+        {
+            "id": chunk_id,
+            "heading": f"Page {c['page_start']}" if c["page_start"] == c["page_end"]
+            else f"Pages {c['page_start']}-{c['page_end']}",
+            "text": c["text"],
+        }
+        for chunk_id, c in pdf_chunk_ids(
+            chunk_pages(pages, max_chars or getattr(settings, "PDF_CHUNK_CHARS", 1200)),
+            source_name or os.path.basename(path),
+        )
+    )
+
+    report = {
+        "rows": 0, "pages": total, "inserted": 0, "updated": 0, "unchanged": 0,
+        "batches": 0, "write_failures": [], "seconds": 0.0, "cache": {"hits": 0, "misses": 0},
+    }
+    if progress:
+        progress("faq_embedding", 0)
+    for batch in batch_by_token_budget(chunks, lambda c: c["text"]):
+        # vectors could be fallback vectors if API failed; still save
+        vectors, cache = embed_with_cache(adapter, [c["text"] for c in batch])
+        stored = store_faq_chunks_and_embeddings(batch, vectors, model=stored_model(adapter, cache))
+        report["batches"] += 1
+        report["rows"] += len(batch)
+        for key in ("inserted", "updated", "unchanged"):
+            report[key] += stored[key]
+        report["write_failures"].extend(stored["write_failures"])
+        for key in ("hits", "misses"):
+            report["cache"][key] += cache[key]
+        if progress:
+            progress("faq", report["rows"])
+
+    report["seconds"] = round(time.perf_counter() - started, 4)
+    report["pages_per_sec"] = round(total / report["seconds"], 2) if report["seconds"] else 0.0
+    report["peak_rss_mb"] = peak_rss_mb()
+    print(
+        f"✅ PDF: {total} pages -> {report['rows']} chunks in {report['batches']} batches "
+        f"({report['pages_per_sec']} pages/s, {workers} workers, peak RSS {report['peak_rss_mb']} MB)"
+    )
+    if not report["rows"]:
+        print("⚠️ No text extracted from PDF.")
+        return None
+    return report
+
+
+def ingest_markdown(path, adapter, progress=None):
+    print("📘 Processing Markdown FAQ file...")
+    with open(path, encoding="utf-8") as fh:
+        chunks = chunk_faq_markdown(fh.read())
+    print(f"🧩 Created {len(chunks)} chunks from Markdown")
+    chunk_objs = [
+        {"id": f"faq_{i + 1}", "heading": heading, "text": chunk_text}
+        for i, (heading, chunk_text) in enumerate(chunks)
+    ]
+
+    if progress:
+        progress("faq_embedding", 0)
+    vectors, cache = embed_with_cache(adapter, [c["text"] for c in chunk_objs])
+    report = store_faq_chunks_and_embeddings(chunk_objs, vectors, model=stored_model(adapter, cache))
+    report["rows"] = len(chunk_objs)
+    report["cache"] = cache
+    if progress:
+        progress("faq", len(chunk_objs))
+    return report
+
+
+def run_ingestion(uploads, adapter, progress=None):
+    """
+    Ingest saved upload files. `uploads` maps the upload key to
+    {"name": original filename, "path": saved path}; this is what
+    UploadIngestView passes directly, and what IngestionJob.files stores.
+
+    Returns the upload response body: row counts plus ingest summaries and
+    the overall embedding cache hit rate. With index quantization on (and the
+    numpy store) it also reports the float32 vs int8 size of the vector index.
+    """
+    results = {}
+    cache_totals = {"hits": 0, "misses": 0}
+
+    # One snapshot publish for the whole upload in mmap mode (see index.py).
+    with deferred_publish():
+        products = uploads.get("products.csv") or uploads.get("products")
+        if products:
+            print(f"📦 Detected product upload: {products['name']}")
+            if progress:
+                progress("products", 0)
+            with open(products["path"], "rb") as fh:
+                report = ingest_products_csv(fh, adapter, progress=progress)
+            results["products"] = report["rows"]
+            results["products_ingest"] = _summary(report)
+            cache_totals["hits"] += report["cache"]["hits"]
+            cache_totals["misses"] += report["cache"]["misses"]
+
+        faq_key, faq = find_faq_upload(uploads)
+        if faq:
+            if faq["name"].lower().endswith(".pdf") or faq_key.lower().endswith(".pdf"):
+                report = ingest_pdf(faq["path"], adapter, progress=progress, source_name=faq["name"])
+            else:
+                report = ingest_markdown(faq["path"], adapter, progress=progress)
+            if report is not None:
+                results["faq_chunks"] = report["rows"]
+                results["faq_ingest"] = _summary(report)
+                cache_totals["hits"] += report["cache"]["hits"]
+                cache_totals["misses"] += report["cache"]["misses"]
+                print(f"✅ Stored {report['rows']} FAQ chunks successfully.")
+        else:
+            print("⚠️ No FAQ file (.md or .pdf) found in upload request.")
+
+    if results:
+        results["embedding_cache"] = cache_summary(cache_totals)
+        # Only the numpy store keeps a resident index; building one just to
+        # report its size would load every vector in sql/chroma mode.
+        if getattr(settings, "VECTOR_INDEX_QUANTIZATION", "none") != "none" and get_vector_store().name == "numpy":
+            results["vector_index"] = get_index().memory_report()
+    return results
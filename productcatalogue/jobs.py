@@ -0,0 +1,155 @@
+"""
+Background ingestion jobs: an IngestionJob row per upload plus a small
+in-process thread pool (INGEST_WORKERS) that runs them, so large uploads do
+not hold the HTTP request open and no external queue is needed.
+
+A job whose process dies mid-run would stay "running" for ever, so when a
+process starts its pool it first recovers jobs that have not written progress
+for INGEST_JOB_STALE_SECONDS (see recover_stale_jobs).
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .ingest import run_ingestion
+from .models import IngestionJob
+from .registry import get_adapter
+
+PROGRESS_INTERVAL = 0.5  # seconds between progress writes
+STALE_ERROR = "Worker stopped while the job was running"
+
+_lock = threading.Lock()
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, "INGEST_WORKERS", 2),
+                    thread_name_prefix="ingest",
+                )
+                # Pick up jobs queued (or left running) before a restart.
+                recover_stale_jobs()
+                for job_id in IngestionJob.objects.filter(status='queued').values_list('id', flat=True):
+                    _executor.submit(_run_in_worker, job_id)
+    return _executor
+
+
+def recover_stale_jobs():
+    """
+    Requeue "running" jobs with no progress write (updated_at) for
+    INGEST_JOB_STALE_SECONDS: the process running them has gone away. Ingest
+    is an upsert, so running a job again is safe; a job that already went
+    stale once is failed instead, so a job that kills its worker cannot loop.
+    Returns the number of jobs recovered.
+    """
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=getattr(settings, "INGEST_JOB_STALE_SECONDS", 900))
+    recovered = 0
+    for job in IngestionJob.objects.filter(status='running', updated_at__lt=cutoff):
+        retried = any(err.get("error") == STALE_ERROR for err in job.errors)
+        changes = {
+            'status': 'failed' if retried else 'queued',
+            'stage': 'finished' if retried else 'queued',
+            'errors': job.errors + [{"stage": job.stage, "error": STALE_ERROR}],
+            'updated_at': now,
+        }
+        if retried:
+            changes['finished_at'] = now
+        # Matching updated_at skips a job whose worker wrote progress meanwhile.
+        if IngestionJob.objects.filter(id=job.id, status='running', updated_at=job.updated_at).update(**changes):
+            recovered += 1
+            print(f"⚠️ Ingestion job {job.id} was stale; {changes['status']}")
+    return recovered
+
+
+def enqueue(files):
+    """Create a queued job for saved upload files and schedule it after commit."""
+    job = IngestionJob.objects.create(files=files, stage='queued')
+    transaction.on_commit(lambda: _get_executor().submit(_run_in_worker, job.id))
+    print(f"📬 Queued ingestion job {job.id}")
+    return job
+
+
+def _run_in_worker(job_id):
+    try:
+        run_job(job_id)
+    finally:
+        connections.close_all()
+
+
+def run_job(job_id):
+    """
+    Claim a queued job and run it. Only one worker can claim a job, so it is
+    safe to call this from several threads or processes.
+    """
+    claimed = IngestionJob.objects.filter(id=job_id, status='queued').update(
+        status='running', stage='starting', started_at=timezone.now()
+    )
+    if not claimed:
+        return
+    job = IngestionJob.objects.get(id=job_id)
+
+    stage_rows = {}
+    last_write = [0.0]
+
+    def progress(stage, rows):
+        stage_rows[stage] = rows
+        now = time.monotonic()
+        if now - last_write[0] < PROGRESS_INTERVAL and stage == job.stage:
+            return
+        last_write[0] = now
+        job.stage = stage
+        job.rows_processed = sum(stage_rows.values())
+        job.save(update_fields=['stage', 'rows_processed', 'updated_at'])
+
+    try:
+        result = run_ingestion(job.files, get_adapter(), progress=progress)
+    except Exception as e:
+        print(f"❌ Ingestion job {job_id} failed: {e}")
+        job.status = 'failed'
+        job.errors = job.errors + [{"stage": job.stage, "error": str(e)}]
+    else:
+        job.status = 'done'
+        job.result = result
+        job.errors = [
+            dict(err, stage=key.replace("_ingest", ""))
+            for key, summary in result.items() if key.endswith("_ingest")
+            for err in summary.get("errors", [])
+        ]
+        if not result:
+            job.errors.append({"stage": "starting", "error": "No files provided"})
+            job.status = 'failed'
+    job.stage = 'finished'
+    job.rows_processed = sum(stage_rows.values())
+    job.finished_at = timezone.now()
+    job.save()
+    print(f"✅ Ingestion job {job_id} {job.status}: {job.rows_processed} rows")
+    return job
+
+
+def job_status(job):
+    """JSON body for the job status endpoint."""
+    end = job.finished_at or timezone.now()
+    elapsed = (end - job.started_at).total_seconds() if job.started_at else 0.0
+    return {
+        "id": str(job.id),
+        "status": job.status,
+        "stage": job.stage,
+        "rows_processed": job.rows_processed,
+        "rows_per_sec": round(job.rows_processed / elapsed, 2) if elapsed > 0 else 0.0,
+        "elapsed_seconds": round(elapsed, 3),
+        "errors": job.errors,
+        "result": job.result,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
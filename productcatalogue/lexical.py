@@ -0,0 +1,209 @@
+"""
+In-memory BM25 inverted index over the active vector store's documents and
+Product.name.
+
+Product names are indexed a second time on top of the stored text, so an
+exact name match ("Rise Again") outranks documents that only mention the
+words in passing. The index is built on first use from the store's documents
+(VectorStore.iter_documents, so Chroma deployments are covered too) and kept
+current by the store functions (utils._upsert_batch), one document at a
+time, so a lookup never touches the embedding provider.
+
+retrieve_top_k fuses these rankings with the vector ranking using
+reciprocal-rank fusion (see fuse_rrf). Like the answer cache the index is per
+process: it remembers the ingest generation (generation.py) it was built at
+and is rebuilt once another process has ingested since.
+"""
+import math
+import re
+import threading
+from collections import Counter
+
+from django.conf import settings
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or "").casefold())
+
+
+class BM25Index:
+    """
+    Query terms found in more than `max_df` of the documents are skipped when
+    the query also has rarer terms: they add next to nothing to the score but
+    their posting lists span the whole catalogue. Scoring runs on a copy of
+    the postings taken under the lock, so upserts are not held up by it.
+    """
+
+    def __init__(self, k1=1.2, b=0.75, generation=0, max_df=0.5):
+        self.k1 = k1
+        self.b = b
+        self.max_df = max_df
+        self.generation = generation  # ingest generation the documents reflect
+        self.docs = {}      # id -> {source, source_obj_id, text, length, terms}
+        self.postings = {}  # term -> {id: (term frequency, document length)}
+        self.total_length = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.docs)
+
+    def upsert(self, items):
+        """Add or replace documents; items are {id, source, source_obj_id, text[, name]} dicts."""
+        with self._lock:
+            for it in items:
+                self._remove(it['id'])
+                terms = Counter(tokenize(it['text']))
+                terms.update(tokenize(it.get('name', '')))
+                length = sum(terms.values())
+                self.docs[it['id']] = {
+                    'source': it['source'],
+                    'source_obj_id': it['source_obj_id'],
+                    'text': it['text'],
+                    'length': length,
+                    'terms': list(terms),
+                }
+                self.total_length += length
+                for term, tf in terms.items():
+                    self.postings.setdefault(term, {})[it['id']] = (tf, length)
+
+    def remove(self, ids):
+        with self._lock:
+            for doc_id in ids:
+                self._remove(doc_id)
+
+    def _remove(self, doc_id):
+        doc = self.docs.pop(doc_id, None)
+        if doc is None:
+            return
+        self.total_length -= doc['length']
+        for term in doc['terms']:
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self.postings[term]
+
+    def search(self, query_text, k=50):
+        """Return up to k {id, source, source_obj_id, text, score} dicts by BM25 score."""
+        terms = set(tokenize(query_text))
+        with self._lock:
+            n = len(self.docs)
+            if not n or not terms:
+                return []
+            avg_len = self.total_length / n
+            postings = [p for p in (self.postings.get(t) for t in terms) if p]
+            rare = [p for p in postings if len(p) <= self.max_df * n]
+            postings = [list(p.items()) for p in (rare or postings)]
+
+        scores = Counter()
+        for posting in postings:
+            idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+            for doc_id, (tf, length) in posting:
+                norm = self.k1 * (1 - self.b + self.b * length / avg_len)
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        top = scores.most_common(k)
+
+        with self._lock:
+            docs = [(doc_id, score, self.docs.get(doc_id)) for doc_id, score in top]
+        return [
+            {
+                'id': doc_id,
+                'source': doc['source'],
+                'source_obj_id': doc['source_obj_id'],
+                'text': doc['text'],
+                'score': score,
+            }
+            for doc_id, score, doc in docs
+            if doc is not None  # removed while we were scoring
+        ]
+
+
+def fuse_rrf(rankings, k=8, rrf_k=60):
+    """
+    Reciprocal-rank fusion: every ranking adds 1 / (rrf_k + rank) to an id.
+    Returns the top k result dicts (first seen wins) with `score` replaced by
+    the fused score and the per-ranking scores kept as `vector_score` /
+    `lexical_score` when `rankings` is {"vector": [...], "lexical": [...]}.
+    """
+    fused, rows = Counter(), {}
+    for name, ranking in rankings.items():
+        for rank, row in enumerate(ranking, start=1):
+            fused[row['id']] += 1.0 / (rrf_k + rank)
+            merged = rows.setdefault(row['id'], dict(row))
+            merged[f"{name}_score"] = row['score']
+    out = []
+    for doc_id, score in fused.most_common(k):
+        row = rows[doc_id]
+        row['score'] = score
+        out.append(row)
+    return out
+
+
+_lock = threading.Lock()
+_index = None
+
+
+def _build_from_store():
+    from .generation import current_generation
+    from .models import Product
+    from .vectorstores import get_vector_store
+
+    # Read the generation first: a batch committed while the documents are
+    # read leaves the index one generation behind and it is rebuilt again.
+    index = BM25Index(generation=current_generation()[0], max_df=getattr(settings, "LEXICAL_MAX_DF", 0.5))
+    names = dict(Product.objects.values_list('id', 'name'))
+    index.upsert(
+        {
+            'id': doc_id,
+            'source': source,
+            'source_obj_id': source_obj_id,
+            'text': text,
+            'name': names.get(source_obj_id, '') if source == 'product' else '',
+        }
+        for doc_id, source, source_obj_id, text in get_vector_store().iter_documents()
+    )
+    return index
+
+
+def get_lexical_index():
+    """
+    Return the process-wide BM25 index, building it on first use and again
+    whenever data_generation() has moved past the generation it was built at.
+    """
+    from .generation import data_generation
+
+    global _index
+    generation = data_generation()
+    idx = _index
+    if idx is not None and idx.generation >= generation:
+        return idx
+    with _lock:
+        if _index is None or _index.generation < generation:
+            _index = _build_from_store()
+            print(f"✅ Built lexical index: {len(_index)} documents (generation {_index.generation})")
+        return _index
+
+
+def upsert_into_lexical_index(items, generation=None):
+    """
+    Apply freshly stored rows; a no-op until the index has been built.
+    `generation` is the value bump_generation() returned for the batch: when
+    the index was current just before it, the index moves to it instead of
+    being rebuilt on the next lookup.
+    """
+    with _lock:
+        idx = _index
+        if idx is None:
+            return
+        if items:
+            idx.upsert(items)
+        if generation is not None and idx.generation == generation - 1:
+            idx.generation = generation
+
+
+def invalidate_lexical_index():
+    global _index
+    with _lock:
+        _index = None
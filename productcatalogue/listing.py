@@ -0,0 +1,121 @@
+"""
+Helpers for the read-only data endpoints (/api/products/, /api/faqs/ and
+/api/get-data/).
+
+    fields=a,b,c      project each row onto these model fields (id is always included)
+    cursor / limit    keyset pagination on the primary key: the response carries
+                      next_cursor, an opaque token for the page after it
+    export=ndjson     stream every row as one JSON object per line, reading the
+                      queryset in DATA_EXPORT_CHUNK_SIZE chunks
+
+Conditional GET is handled by data_condition: the ETag and Last-Modified come
+from the ingest generation counter (generation.py), so clients get a 304
+until the next ingest, admin edit or delete changes a row (see signals.py).
+"""
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.views.decorators.http import condition
+
+from .generation import current_generation
+
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+
+
+class ListingError(ValueError):
+    """Bad fields / cursor / limit parameter, reported to the client as a 400."""
+
+
+def _generation(request):
+    if not hasattr(request, "_data_generation"):
+        request._data_generation = current_generation()
+    return request._data_generation
+
+
+def _etag(request, *args, **kwargs):
+    return f"data-{_generation(request)[0]}"
+
+
+def _last_modified(request, *args, **kwargs):
+    return _generation(request)[1]
+
+
+data_condition = condition(etag_func=_etag, last_modified_func=_last_modified)
+
+
+def parse_fields(model_cls, value, default=None):
+    """Turn "name,price" into a list of concrete field names, always starting with "id"."""
+    allowed = [f.attname for f in model_cls._meta.concrete_fields]
+    if not value:
+        return list(default or allowed)
+    fields = [f.strip() for f in value.split(",") if f.strip()]
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        raise ListingError(f"Unknown fields: {', '.join(unknown)}")
+    return ["id"] + [f for f in dict.fromkeys(fields) if f != "id"]
+
+
+def encode_cursor(last_id):
+    return base64.urlsafe_b64encode(json.dumps({"after": last_id}).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode()))["after"]
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise ListingError("Invalid cursor")
+
+
+def parse_limit(value):
+    default = getattr(settings, "DATA_PAGE_SIZE", 100)
+    maximum = getattr(settings, "DATA_PAGE_MAX", 1000)
+    if value in (None, ""):
+        return default
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ListingError("limit must be an integer")
+    if limit < 1:
+        raise ListingError("limit must be positive")
+    return min(limit, maximum)
+
+
+def paginate(queryset, fields, cursor=None, limit=100):
+    """One page of `fields` dicts in primary-key order plus the cursor for the next page."""
+    queryset = queryset.order_by("pk")
+    after = decode_cursor(cursor)
+    if after is not None:
+        queryset = queryset.filter(pk__gt=after)
+    rows = list(queryset.values(*fields)[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        "results": rows,
+        "next_cursor": encode_cursor(rows[-1]["id"]) if has_more else None,
+    }
+
+
+def iter_ndjson(sources):
+    """
+    Yield one JSON line per row for each (type, queryset, fields) in
+    `sources`; `type` is added to every row when not None.
+    """
+    chunk_size = getattr(settings, "DATA_EXPORT_CHUNK_SIZE", 2000)
+    for kind, queryset, fields in sources:
+        for row in queryset.order_by("pk").values(*fields).iterator(chunk_size=chunk_size):
+            if kind is not None:
+                row = {"type": kind, **row}
+            yield json.dumps(row, cls=DjangoJSONEncoder) + "\n"
+
+
+def ndjson_response(sources, filename):
+    response = StreamingHttpResponse(iter_ndjson(sources), content_type=NDJSON_CONTENT_TYPE)
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
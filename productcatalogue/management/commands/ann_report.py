@@ -0,0 +1,87 @@
+import json
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from productcatalogue.ann import IVFIndex, recall_report
+from productcatalogue.index import VectorIndex, get_index
+from productcatalogue.quantize import ScalarQuantizer, quantized_recall_report
+
+
+class Command(BaseCommand):
+    help = (
+        "Report IVF recall@k and latency against the exact scan, to pick IVF_NLIST / IVF_NPROBE. "
+        "With --int8, report int8 quantization memory savings and recall per rescoring depth instead."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--synthetic", type=int, default=0,
+                            help="Use N clustered synthetic vectors instead of the stored index.")
+        parser.add_argument("--dim", type=int, default=384, help="Dimension for synthetic vectors.")
+        parser.add_argument("--queries", type=int, default=200)
+        parser.add_argument("--k", type=int, default=8)
+        parser.add_argument("--nlist", type=int, default=0, help="IVF cells (0 = ~sqrt(n)).")
+        parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+        parser.add_argument("--int8", action="store_true", help="Benchmark int8 codes with exact rescoring.")
+        parser.add_argument("--rescore", type=int, nargs="+", default=[8, 16, 32, 64, 128],
+                            help="Rescoring depths to try with --int8.")
+        parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+
+    def handle(self, *args, **opts):
+        rng = np.random.default_rng(0)
+        if opts["synthetic"]:
+            n, dim = opts["synthetic"], opts["dim"]
+            centers = rng.normal(size=(max(1, n // 100), dim))
+            vectors = centers[rng.integers(0, len(centers), n)] + rng.normal(size=(n, dim))
+            index = VectorIndex(
+                [f"s_{i}" for i in range(n)], ["synthetic"] * n, [str(i) for i in range(n)], [""] * n,
+                VectorIndex.normalize(vectors),
+            )
+        else:
+            # Benchmark a copy over the same rows: the resident index is a
+            # published snapshot and must keep its own ann/quant.
+            live = get_index()
+            index = VectorIndex(live.ids, live.sources, live.source_obj_ids, live.texts, live.matrix, live.version)
+        if len(index) < 2:
+            self.stderr.write("Not enough vectors to build an IVF index.")
+            return
+
+        picks = rng.choice(len(index), min(opts["queries"], len(index)), replace=False)
+        noise = 0.05 * rng.normal(size=(len(picks), index.dim))
+        queries = VectorIndex.normalize(np.asarray(index.matrix[picks]) + noise)
+        if opts["int8"]:
+            self._int8_report(index, queries, opts)
+            return
+
+        index.ann = IVFIndex.train(index.matrix, nlist=opts["nlist"])
+
+        report = recall_report(index, queries, k=opts["k"], nprobes=opts["nprobe"])
+        if opts["json"]:
+            self.stdout.write(json.dumps({"vectors": len(index), "nlist": index.ann.nlist, "report": report}, indent=2))
+            return
+
+        self.stdout.write(f"{len(index)} vectors, dim={index.dim}, nlist={index.ann.nlist}, k={opts['k']}")
+        self.stdout.write(f"{'nprobe':>8} {'recall@k':>10} {'ivf ms':>10} {'exact ms':>10}")
+        for row in report:
+            self.stdout.write(
+                f"{row['nprobe']:>8} {row['recall_at_k']:>10.3f} {row['avg_ms']:>10.3f} {row['exact_avg_ms']:>10.3f}"
+            )
+
+    def _int8_report(self, index, queries, opts):
+        index.ann = None
+        index.quant = ScalarQuantizer.train(index.matrix)
+        memory = index.memory_report()
+        report = quantized_recall_report(index, queries, k=opts["k"], rescores=opts["rescore"])
+        if opts["json"]:
+            self.stdout.write(json.dumps({"memory": memory, "report": report}, indent=2))
+            return
+
+        self.stdout.write(
+            f"{memory['vectors']} vectors, dim={memory['dim']}: {memory['float32_mb']} MB float32 -> "
+            f"{memory['int8_mb']} MB int8 ({memory['savings_pct']}% smaller), k={opts['k']}"
+        )
+        self.stdout.write(f"{'rescore':>8} {'recall@k':>10} {'int8 ms':>10} {'exact ms':>10}")
+        for row in report:
+            self.stdout.write(
+                f"{row['rescore']:>8} {row['recall_at_k']:>10.3f} {row['avg_ms']:>10.3f} {row['exact_avg_ms']:>10.3f}"
+            )
@@ -0,0 +1,135 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from contextlib import ExitStack, contextmanager, redirect_stdout
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from productcatalogue import registry
+from productcatalogue.bench import run_size
+from productcatalogue.index import invalidate_index
+from productcatalogue.models import EmbeddingVector, FAQChunk, Product
+from productcatalogue.vectorstores import get_vector_store
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True, cwd=settings.BASE_DIR
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+@contextmanager
+def scratch_database(directory):
+    """
+    Point the default connection at a freshly migrated SQLite file in
+    `directory`, so the bench never reads, locks or writes the real catalogue.
+    Only safe before anything else in the process has used the database.
+    """
+    conn = connections[DEFAULT_DB_ALIAS]
+    original = conn.settings_dict.copy()
+    conn.close()
+    conn.settings_dict.update(ENGINE='django.db.backends.sqlite3', NAME=os.path.join(directory, 'bench.sqlite3'))
+    try:
+        call_command('migrate', verbosity=0, interactive=False)
+        yield
+    finally:
+        conn.close()
+        conn.settings_dict.clear()
+        conn.settings_dict.update(original)
+
+
+def _catalogue_counts():
+    return {model._meta.model_name: model.objects.count() for model in (Product, FAQChunk, EmbeddingVector)}
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark ingest throughput, index build time, retrieve_top_k latency and memory on synthetic "
+        "catalogues in a temporary SQLite database; results are written as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000],
+                            help="Catalogue sizes in vectors (products plus FAQ chunks).")
+        parser.add_argument("--dim", type=int, default=384)
+        parser.add_argument("--faq-ratio", type=float, default=0.1, help="Share of each catalogue that is FAQ chunks.")
+        parser.add_argument("--queries", type=int, default=200)
+        parser.add_argument("--k", type=int, default=8)
+        parser.add_argument("--batch-size", type=int, default=None, help="Rows per store call (INGEST_BATCH_SIZE).")
+        parser.add_argument("--output", default="", help="Write the JSON report to this file instead of stdout.")
+        parser.add_argument("--in-place", action="store_true",
+                            help="Use the configured database instead of a temporary one. Refused unless the "
+                                 "catalogue tables are empty; every size is rolled back.")
+
+    def handle(self, *args, **opts):
+        store = get_vector_store()
+        if store.name == "chroma":
+            raise CommandError("bench writes through the store functions and rolls back; use VECTOR_STORE=numpy or sql.")
+
+        report = {
+            "commit": _git_commit(),
+            "created_at": timezone.now().isoformat(),
+            "config": {
+                "vector_store": store.name,
+                "index_storage": getattr(settings, "VECTOR_INDEX_STORAGE", "memory"),
+                "ann": getattr(settings, "VECTOR_INDEX_ANN", "exact"),
+                "quantization": getattr(settings, "VECTOR_INDEX_QUANTIZATION", "none"),
+                "hybrid": getattr(settings, "HYBRID_SEARCH_ENABLED", True),
+                "rerank": getattr(settings, "RERANK_ENABLED", True),
+            },
+            "results": [],
+        }
+        batch_size = opts["batch_size"] or getattr(settings, "INGEST_BATCH_SIZE", 1000)
+        # Rows go to a scratch database and snapshots (VECTOR_INDEX_STORAGE="mmap")
+        # to a scratch directory, so neither the catalogue nor the published index
+        # of the running app is touched; progress prints go to stderr so stdout
+        # is only the JSON report.
+        with ExitStack() as stack:
+            scratch_dir = stack.enter_context(tempfile.TemporaryDirectory())
+            stack.enter_context(override_settings(VECTOR_SNAPSHOT_DIR=scratch_dir))
+            stack.enter_context(redirect_stdout(sys.stderr))
+            if not opts["in_place"]:
+                stack.enter_context(scratch_database(scratch_dir))
+            counts = _catalogue_counts()
+            if any(counts.values()):
+                found = ", ".join(f"{n} {name} rows" for name, n in counts.items() if n)
+                raise CommandError(f"bench --in-place needs an empty catalogue; found {found}.")
+            registry.reset()
+            report["config"]["database"] = "configured" if opts["in_place"] else "scratch sqlite"
+            for size in opts["sizes"]:
+                self.stderr.write(f"Benchmarking {size} vectors (dim={opts['dim']})...")
+                try:
+                    with transaction.atomic():
+                        report["results"].append(run_size(
+                            size, dim=opts["dim"], faq_ratio=opts["faq_ratio"], queries=opts["queries"],
+                            k=opts["k"], batch_size=batch_size,
+                        ))
+                        transaction.set_rollback(True)
+                finally:
+                    invalidate_index()
+                    registry.reset()
+
+        body = json.dumps(report, indent=2)
+        if opts["output"]:
+            with open(opts["output"], "w", encoding="utf-8") as fh:
+                fh.write(body + "\n")
+            self.stderr.write(f"Wrote {opts['output']}")
+        else:
+            self.stdout.write(body)
+        for row in report["results"]:
+            self.stderr.write(
+                f"{row['vectors']:>9} vectors: ingest {row['ingest']['products']['rows_per_sec']} rows/s, "
+                f"index build {row['index_build']['vector_ms']} ms, "
+                f"p50/p95/p99 {row['retrieve'].get('p50_ms')}/{row['retrieve'].get('p95_ms')}/"
+                f"{row['retrieve'].get('p99_ms')} ms"
+            )
@@ -0,0 +1,75 @@
+import json
+
+import numpy as np
+from django.db import migrations, models
+
+
+def _chunks(queryset, size=1000):
+    """
+    Yield the rows of `queryset` in chunks of `size`. The primary keys are read
+    up front so no cursor is still open over rows that the caller updates.
+    """
+    pks = list(queryset.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(pks), size):
+        yield list(queryset.model.objects.filter(pk__in=pks[start:start + size]))
+
+
+def pack_json_vectors(apps, schema_editor):
+    """Convert legacy JSON vectors into packed little-endian float32 blobs."""
+    EmbeddingVector = apps.get_model('productcatalogue', 'EmbeddingVector')
+    qs = EmbeddingVector.objects.filter(vector_blob__isnull=True).exclude(vector='')
+    for chunk in _chunks(qs):
+        pending = []
+        for ev in chunk:
+            try:
+                arr = np.asarray(json.loads(ev.vector), dtype='<f4').reshape(-1)
+            except (ValueError, TypeError):
+                continue
+            ev.vector_blob = arr.tobytes()
+            ev.dim = int(arr.shape[0])
+            ev.vector = ''
+            pending.append(ev)
+        if pending:
+            EmbeddingVector.objects.bulk_update(pending, ['vector_blob', 'dim', 'vector'])
+
+
+def unpack_to_json(apps, schema_editor):
+    EmbeddingVector = apps.get_model('productcatalogue', 'EmbeddingVector')
+    for chunk in _chunks(EmbeddingVector.objects.filter(vector_blob__isnull=False)):
+        for ev in chunk:
+            arr = np.frombuffer(bytes(ev.vector_blob), dtype='<f4')
+            ev.vector = json.dumps([float(x) for x in arr])
+            ev.vector_blob = None
+        if chunk:
+            EmbeddingVector.objects.bulk_update(chunk, ['vector_blob', 'vector'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productcatalogue', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='embeddingvector',
+            name='vector',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='embeddingvector',
+            name='vector_blob',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='embeddingvector',
+            name='dim',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='embeddingvector',
+            name='embedding_model',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.RunPython(pack_json_vectors, unpack_to_json),
+    ]
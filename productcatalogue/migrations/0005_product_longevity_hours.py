@@ -0,0 +1,56 @@
+# Generated by Django 5.2.7 on 2026-10-17 00:42
+
+import re
+
+from django.db import migrations, models
+
+# Frozen copy of productcatalogue.filters.parse_longevity as of this
+# migration, so later changes to the app code cannot change what it does.
+LONGEVITY_RE = re.compile(
+    r"(\d+(?:\.\d+)?)\s*(?:(?:-|–|to)\s*(\d+(?:\.\d+)?))?\s*(h|hr|hrs|hour|hours|d|day|days)?",
+    re.IGNORECASE,
+)
+
+
+def parse_longevity(text):
+    match = LONGEVITY_RE.search(text or "")
+    if not match:
+        return None, None
+    low = float(match.group(1))
+    high = float(match.group(2)) if match.group(2) else low
+    if (match.group(3) or "").lower().startswith("d"):
+        low, high = low * 24, high * 24
+    return min(low, high), max(low, high)
+
+
+def parse_existing_longevity(apps, schema_editor):
+    """Fill the hour columns for products ingested before they existed."""
+    Product = apps.get_model('productcatalogue', 'Product')
+    rows = list(Product.objects.exclude(longevity='').values_list('pk', 'longevity'))
+    for start in range(0, len(rows), 1000):
+        pending = []
+        for pk, longevity in rows[start:start + 1000]:
+            low, high = parse_longevity(longevity)
+            pending.append(Product(pk=pk, longevity_min_hours=low, longevity_max_hours=high))
+        Product.objects.bulk_update(pending, ['longevity_min_hours', 'longevity_max_hours'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productcatalogue', '0004_embeddingcache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='longevity_max_hours',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='longevity_min_hours',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.RunPython(parse_existing_longevity, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-17 00:50
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productcatalogue', '0005_product_longevity_hours'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueryLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('question', models.TextField()),
+                ('mode', models.CharField(blank=True, max_length=20)),
+                ('answer', models.TextField(blank=True)),
+                ('citations', models.JSONField(blank=True, default=list)),
+                ('latency_ms', models.FloatField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-17 01:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productcatalogue', '0007_datageneration'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='embeddingcache',
+            index=models.Index(fields=['model', 'created_at'], name='embedding_cache_model_created'),
+        ),
+    ]
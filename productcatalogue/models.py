@@ -10,6 +10,9 @@ class Product(models.Model):
     accords = models.CharField(max_length=255, blank=True)
     price = models.FloatField(null=True, blank=True)
     longevity = models.CharField(max_length=100, blank=True)
+    # hours parsed from `longevity` at ingest ("8-10h" -> 8, 10); see filters.parse_longevity
+    longevity_min_hours = models.FloatField(null=True, blank=True)
+    longevity_max_hours = models.FloatField(null=True, blank=True)
     season = models.CharField(max_length=100, blank=True)
     image_url = models.URLField(blank=True)
     popularity = models.FloatField(default=0.0)
@@ -29,20 +32,107 @@ class FAQChunk(models.Model):
 class EmbeddingVector(models.Model):
     """
     Store embeddings for both product text chunks and faq chunks.
-    vector stored as bytes (numpy) or JSON string of floats — here we'll store as text JSON.
+    vector_blob holds packed little-endian float32 (see utils.pack_vector) with its
+    dimension and embedding model alongside. `vector` is the legacy JSON list of
+    floats and is only read for rows written before the binary column existed.
     """
     SOURCE_CHOICES = (('product','product'), ('faq','faq'))
     id = models.CharField(max_length=120, primary_key=True)
     source = models.CharField(max_length=20, choices=SOURCE_CHOICES)
     source_obj_id = models.CharField(max_length=100)  # product.id or faq.id
     text = models.TextField()
-    vector = models.TextField() 
+    vector = models.TextField(blank=True, default="")  # legacy JSON floats
+    vector_blob = models.BinaryField(null=True, blank=True)
+    dim = models.PositiveIntegerField(default=0)
+    embedding_model = models.CharField(max_length=100, blank=True)
     created_at = models.DateTimeField(default=timezone.now)
 
     def __str__(self):
         return f"{self.id} ({self.source})"
     
     
+class EmbeddingCache(models.Model):
+    """
+    Embedding of an exact text, keyed by (embedding model, sha256 of the text),
+    so re-uploads only send new or changed texts to the provider.
+    vector_blob uses the same packed float32 format as EmbeddingVector.
+    """
+    model = models.CharField(max_length=100)
+    text_hash = models.CharField(max_length=64)
+    vector_blob = models.BinaryField()
+    dim = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['model', 'text_hash'], name='embedding_cache_model_text_hash'),
+        ]
+        indexes = [
+            # writebehind._prune_query_embeddings finds the oldest rows of one model.
+            models.Index(fields=['model', 'created_at'], name='embedding_cache_model_created'),
+        ]
+
+    def __str__(self):
+        return f"{self.model}:{self.text_hash[:12]}"
+
+
+class DataGeneration(models.Model):
+    """
+    Single-row counter bumped whenever an ingest changes Product or FAQChunk
+    rows (see generation.py). The data endpoints derive their ETag and
+    Last-Modified headers from it.
+    """
+    value = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"generation {self.value}"
+
+
+class IngestionJob(models.Model):
+    """
+    Upload processed in the background (see jobs.py). `files` maps the upload
+    key to {"name", "path"} of the file saved under MEDIA_ROOT; `result` is the
+    same body the synchronous upload endpoint returns.
+    """
+    STATUS_CHOICES = (
+        ('queued', 'queued'),
+        ('running', 'running'),
+        ('done', 'done'),
+        ('failed', 'failed'),
+    )
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    stage = models.CharField(max_length=50, blank=True)
+    files = models.JSONField(default=dict)
+    rows_processed = models.PositiveIntegerField(default=0)
+    result = models.JSONField(default=dict, blank=True)
+    errors = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.id} ({self.status})"
+
+
+class QueryLog(models.Model):
+    """
+    One answered chat question, recorded only when QUERY_LOG_ENABLED is on.
+    Rows are written in batches by the write-behind queue (see writebehind.py).
+    """
+    question = models.TextField()
+    mode = models.CharField(max_length=20, blank=True)
+    answer = models.TextField(blank=True)
+    citations = models.JSONField(default=list, blank=True)
+    latency_ms = models.FloatField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.question[:50]}"
+
+
 class ChatHistory(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     question = models.TextField()
@@ -0,0 +1,105 @@
+"""
+PDF text extraction and chunking for FAQ uploads.
+
+iter_pdf_pages() extracts page ranges in a process pool (PyMuPDF releases
+little of the GIL, so threads would not help) and yields pages in order as
+ranges finish. chunk_pages() turns that page stream into chunks of at most
+max_chars, packing small pages together and splitting long ones, and records
+the pages every chunk came from.
+
+Module-level imports are stdlib only, so spawned workers just import fitz.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def _extract_range(job):
+    """Worker: return [(page_number, text)] for pages [start, stop) of the PDF."""
+    import fitz  # PyMuPDF
+
+    path, start, stop = job
+    with fitz.open(path) as pdf:
+        return [(n + 1, (pdf[n].get_text("text") or "").strip()) for n in range(start, stop)]
+
+
+def page_count(path):
+    import fitz  # PyMuPDF
+
+    with fitz.open(path) as pdf:
+        return pdf.page_count
+
+
+def iter_pdf_pages(path, workers=1, pages_per_task=32, total=None):
+    """
+    Yield (page_number, text) for every page, in order. With workers > 1 the
+    page ranges are extracted by a spawn-based process pool, which is safe to
+    start from request and job threads.
+    """
+    total = page_count(path) if total is None else total
+    jobs = [(path, start, min(start + pages_per_task, total)) for start in range(0, total, pages_per_task)]
+    if workers <= 1 or len(jobs) <= 1:
+        for job in jobs:
+            yield from _extract_range(job)
+        return
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs)), mp_context=context) as pool:
+        for pages in pool.map(_extract_range, jobs):
+            yield from pages
+
+
+def _split_long(text, max_chars):
+    """Split text longer than max_chars at whitespace (hard cut if there is none)."""
+    while len(text) > max_chars:
+        cut = text.rfind(" ", 0, max_chars)
+        if cut <= max_chars // 2:
+            cut = max_chars
+        yield text[:cut].strip()
+        text = text[cut:].strip()
+    if text:
+        yield text
+
+
+def chunk_pages(pages, max_chars=1200):
+    """
+    Stream {"text", "page_start", "page_end"} chunks of at most max_chars
+    from (page_number, text) pairs. Paragraphs come from chunk_plain_text;
+    paragraphs that are still too long are split at word boundaries.
+    """
+    from .utils import chunk_plain_text
+
+    text, first, last = "", None, None
+    for page_no, page_text in pages:
+        if not page_text:
+            continue
+        for block in chunk_plain_text(page_text, max_chars):
+            for piece in _split_long(block, max_chars):
+                if text and len(text) + len(piece) + 2 > max_chars:
+                    yield {"text": text, "page_start": first, "page_end": last}
+                    text, first = "", None
+                text = f"{text}\n\n{piece}" if text else piece
+                first = page_no if first is None else first
+                last = page_no
+    if text:
+        yield {"text": text, "page_start": first, "page_end": last}
+
+
+def peak_rss_mb():
+    """
+    Memory high-water marks in MB, not per-ingest figures: `main` is this
+    process's peak since it started; `workers_lifetime` is the largest peak
+    of any child process reaped so far (getrusage(RUSAGE_CHILDREN) keeps the
+    maximum over every child, including earlier ingests' pools).
+    """
+    if resource is None:
+        return None
+    scale = 1024 * 1024 if os.uname().sysname == "Darwin" else 1024  # bytes on macOS, KB on Linux
+    return {
+        "main": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1),
+        "workers_lifetime": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale, 1),
+    }
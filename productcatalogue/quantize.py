@@ -0,0 +1,108 @@
+"""
+Scalar int8 quantization for the resident vector index.
+
+ScalarQuantizer keeps one signed byte per dimension for every row of the
+(L2-normalised) index matrix, using a per-dimension range learned from the
+matrix:  x[d] ~= low[d] + (code[d] + 128) * step[d].  A query is scored
+against the codes (a quarter of the float32 bytes), and only the best
+QUANT_RESCORE_CANDIDATES rows are rescored with the full-precision matrix
+(see VectorIndex.search). With VECTOR_INDEX_STORAGE="mmap" those float rows
+are read from the shared snapshot, so only the codes need to stay resident.
+
+numpy has no int8 matrix-vector kernel, so codes are widened to float32 one
+QUANT_BLOCK of rows at a time; the full float matrix is never materialised.
+"""
+import time
+
+import numpy as np
+
+QUANT_BLOCK = 1024  # rows widened per step; small enough to stay in L2 cache
+
+
+class ScalarQuantizer:
+    """
+    Per-dimension int8 codes for every row of an index matrix. Never mutated
+    in place; with_inserts() returns a new instance, like IVFIndex.
+    """
+
+    def __init__(self, low, step, codes, trained_size):
+        self.low = np.asarray(low, dtype=np.float32)
+        self.step = np.asarray(step, dtype=np.float32)
+        self.codes = codes
+        self.trained_size = trained_size
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.low.nbytes + self.step.nbytes
+
+    @classmethod
+    def train(cls, matrix):
+        """Learn each dimension's range from `matrix` and encode every row."""
+        low = np.full(matrix.shape[1], np.inf, dtype=np.float32)
+        high = np.full(matrix.shape[1], -np.inf, dtype=np.float32)
+        for start in range(0, matrix.shape[0], QUANT_BLOCK):
+            block = np.asarray(matrix[start:start + QUANT_BLOCK], dtype=np.float32)
+            low = np.minimum(low, block.min(axis=0))
+            high = np.maximum(high, block.max(axis=0))
+        step = (high - low) / 255.0
+        step[step == 0] = 1.0
+        quantizer = cls(low, step, np.empty(matrix.shape, dtype=np.int8), trained_size=matrix.shape[0])
+        for start in range(0, matrix.shape[0], QUANT_BLOCK):
+            quantizer.codes[start:start + QUANT_BLOCK] = quantizer.encode(matrix[start:start + QUANT_BLOCK])
+        return quantizer
+
+    def encode(self, rows):
+        """int8 codes for float rows; values outside the trained range are clipped."""
+        scaled = np.rint((np.asarray(rows, dtype=np.float32) - self.low) / self.step) - 128
+        return np.clip(scaled, -128, 127).astype(np.int8)
+
+    def decode(self, codes):
+        return self.low + (codes.astype(np.float32) + 128) * self.step
+
+    def with_inserts(self, matrix, positions):
+        """Return codes covering `matrix`, re-encoding `positions` (appended or replaced rows)."""
+        codes = np.empty(matrix.shape, dtype=np.int8)
+        codes[:len(self.codes)] = self.codes
+        positions = np.asarray(positions, dtype=np.int64)
+        if positions.size:
+            codes[positions] = self.encode(matrix[positions])
+        return ScalarQuantizer(self.low, self.step, codes, self.trained_size)
+
+    def scores(self, query, rows=None):
+        """Approximate dot products of a unit-length query with every row (or `rows`)."""
+        scaled = query * self.step
+        bias = float(query @ (self.low + 128 * self.step))
+        codes = self.codes if rows is None else self.codes[rows]
+        out = np.empty(codes.shape[0], dtype=np.float32)
+        for start in range(0, codes.shape[0], QUANT_BLOCK):
+            out[start:start + QUANT_BLOCK] = codes[start:start + QUANT_BLOCK].astype(np.float32) @ scaled
+        return out + bias
+
+
+def quantized_recall_report(index, queries, k=8, rescores=(8, 16, 32, 64, 128)):
+    """
+    Compare int8 search (index.quant must be set) against the exact scan for
+    each rescoring depth. Returns a list of
+    {rescore, recall_at_k, avg_ms, exact_avg_ms} dicts.
+    """
+    exact_ids, exact_ms = [], 0.0
+    for q in queries:
+        t0 = time.perf_counter()
+        exact_ids.append({r['id'] for r in index.search(q, k=k, threshold=-1.0, exact=True)})
+        exact_ms += (time.perf_counter() - t0) * 1000
+
+    report = []
+    for rescore in rescores:
+        hits, elapsed = 0, 0.0
+        for q, truth in zip(queries, exact_ids):
+            t0 = time.perf_counter()
+            found = index.search(q, k=k, threshold=-1.0, rescore=rescore)
+            elapsed += (time.perf_counter() - t0) * 1000
+            hits += len(truth & {r['id'] for r in found})
+        report.append({
+            'rescore': rescore,
+            'recall_at_k': hits / max(1, sum(len(t) for t in exact_ids)),
+            'avg_ms': elapsed / max(1, len(queries)),
+            'exact_avg_ms': exact_ms / max(1, len(queries)),
+        })
+    return report
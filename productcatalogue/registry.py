@@ -0,0 +1,125 @@
+"""
+Process-wide registry of the adapter, its HTTP client and the vector store.
+
+Everything is created lazily on first use and then shared by every request
+thread, so a chat request only pays for the provider round-trips: no new
+OpenAI client, TLS handshake or Chroma handle per request.
+"""
+import threading
+import time
+
+from django.conf import settings
+
+from .adapters import MockAdapter, OpenAIAdapter
+from .answer_cache import get_answer_cache, reset_answer_cache
+from .embedding_cache import get_query_cache, reset_query_cache
+from .generation import forget_generation
+from .vectorstores import get_vector_store
+from .writebehind import reset_write_behind, write_behind_stats
+
+_lock = threading.Lock()
+_adapters = {}
+_http_client = None
+
+
+def get_http_client():
+    """Shared keep-alive HTTP client (connection pool) for provider calls."""
+    global _http_client
+    if _http_client is None:
+        with _lock:
+            if _http_client is None:
+                import httpx
+                try:
+                    from openai import DefaultHttpxClient as client_cls
+                except ImportError:
+                    client_cls = httpx.Client
+                _http_client = client_cls(
+                    limits=httpx.Limits(
+                        max_connections=getattr(settings, "HTTP_MAX_CONNECTIONS", 20),
+                        max_keepalive_connections=getattr(settings, "HTTP_MAX_KEEPALIVE", 10),
+                        keepalive_expiry=getattr(settings, "HTTP_KEEPALIVE_EXPIRY", 60.0),
+                    ),
+                    timeout=getattr(settings, "OPENAI_TIMEOUT", 60.0),
+                )
+    return _http_client
+
+
+def get_adapter():
+    """
+    Return the shared adapter for the current OPENAI_API_KEY / OPENAI_BASE_URL
+    (MockAdapter when no key is configured).
+    """
+    api_key = getattr(settings, "OPENAI_API_KEY", "") or ""
+    base_url = getattr(settings, "OPENAI_BASE_URL", "")
+    key = (api_key, base_url)
+    adapter = _adapters.get(key)
+    if adapter is not None:
+        return adapter
+    http_client = get_http_client() if api_key else None
+    with _lock:
+        if key not in _adapters:
+            if api_key:
+                print("✅ Using OpenAI Adapter")
+                _adapters[key] = OpenAIAdapter(api_key, http_client=http_client)
+            else:
+                print("⚠️ Using Mock Adapter (no API key found)")
+                _adapters[key] = MockAdapter()
+        return _adapters[key]
+
+
+def health():
+    """Cheap readiness report: adapter in use, vector store and its size."""
+    report = {"status": "ok"}
+    try:
+        adapter = get_adapter()
+        report["adapter"] = type(adapter).__name__
+        report["embedding_model"] = adapter.embedding_model
+    except Exception as e:
+        report["status"] = "degraded"
+        report["adapter_error"] = str(e)
+    try:
+        store = get_vector_store()
+        report["vector_store"] = store.name
+        report["vectors"] = store.count()
+    except Exception as e:
+        report["status"] = "degraded"
+        report["vector_store_error"] = str(e)
+    cache = get_answer_cache()
+    if cache is not None:
+        report["answer_cache"] = cache.stats()
+    query_cache = get_query_cache()
+    if query_cache is not None:
+        report["query_embedding_cache"] = query_cache.stats()
+    write_behind = write_behind_stats()
+    if write_behind is not None:
+        report["write_behind"] = write_behind
+    return report
+
+
+def warm_up():
+    """
+    Create the adapter and HTTP pool and load the vector index ahead of the
+    first request. Returns health() plus the time it took.
+    """
+    started = time.perf_counter()
+    report = health()
+    report["warm_up_seconds"] = round(time.perf_counter() - started, 4)
+    print(f"🔥 Warm-up finished in {report['warm_up_seconds']}s: {report}")
+    return report
+
+
+def reset():
+    """
+    Drop cached adapters, answers and query vectors, flush the write-behind
+    queue and close the HTTP pool (tests, settings changes).
+    """
+    global _http_client
+    reset_answer_cache()
+    reset_query_cache()
+    reset_write_behind()
+    forget_generation()
+    with _lock:
+        _adapters.clear()
+        if _http_client is not None:
+            _http_client.close()
+            _http_client = None
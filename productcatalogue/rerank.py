@@ -0,0 +1,86 @@
+"""
+Second-stage reranking for retrieve_top_k.
+
+The first stage (VectorIndex.search, optionally fused with BM25) selects
+RERANK_CANDIDATES rows with np.argpartition. rerank() then rescores that
+small candidate set in one batch as a weighted sum of
+
+    cosine       similarity to the query, gathered from the index matrix in
+                 one matrix-vector product (falls back to the stage-one
+                 vector score for stores without a resident matrix)
+    lexical      share of query tokens that appear in the row text
+    popularity   Product.popularity scaled by the catalogue maximum (0 for FAQ rows)
+
+with weights from RERANK_WEIGHTS, and returns the best k.
+"""
+import numpy as np
+from django.conf import settings
+
+from .lexical import tokenize
+
+DEFAULT_WEIGHTS = {"cosine": 0.7, "lexical": 0.2, "popularity": 0.1}
+
+
+def cosine_scores(candidates, query_vector, index=None):
+    """Cosine similarity of every candidate, batched through `index.matrix` when possible."""
+    fallback = np.array([c.get("vector_score", c.get("score", 0.0)) or 0.0 for c in candidates], dtype=np.float32)
+    if index is None or not len(index):
+        return fallback
+    qv = np.asarray(query_vector, dtype=np.float32).reshape(-1)
+    if qv.shape[0] != index.dim:
+        return fallback
+    norm = np.linalg.norm(qv)
+    if norm:
+        qv = qv / norm
+    positions = np.array([index.positions.get(c["id"], -1) for c in candidates], dtype=np.int64)
+    found = positions >= 0
+    scores = fallback.copy()
+    if found.any():
+        scores[found] = np.asarray(index.matrix[positions[found]]) @ qv
+    return scores
+
+
+def lexical_overlap(candidates, query_text):
+    """Fraction of distinct query tokens present in each candidate's text."""
+    terms = set(tokenize(query_text))
+    if not terms:
+        return np.zeros(len(candidates), dtype=np.float32)
+    return np.array(
+        [len(terms.intersection(tokenize(c["text"]))) / len(terms) for c in candidates], dtype=np.float32
+    )
+
+
+def popularity_scores(candidates, attributes):
+    """Scaled popularity for product candidates, 0 for everything else."""
+    scores = np.zeros(len(candidates), dtype=np.float32)
+    products = [i for i, c in enumerate(candidates) if c["source"] == "product"]
+    if products and attributes is not None:
+        scores[products] = attributes.popularity_of([candidates[i]["source_obj_id"] for i in products])
+    return scores
+
+
+def rerank(candidates, query_vector, query_text=None, k=8, weights=None, index=None, attributes=None):
+    """
+    Rescore `candidates` (retrieve_top_k result dicts) and return the top k,
+    best first. `score` becomes the weighted score; the components are kept
+    as `cosine`, `lexical` and `popularity`.
+    """
+    if not candidates:
+        return []
+    weights = dict(DEFAULT_WEIGHTS, **(weights or getattr(settings, "RERANK_WEIGHTS", {}) or {}))
+    components = {
+        "cosine": cosine_scores(candidates, query_vector, index),
+        "lexical": lexical_overlap(candidates, query_text or ""),
+        "popularity": popularity_scores(candidates, attributes),
+    }
+    total = sum(weights[name] * values for name, values in components.items())
+
+    top = np.argsort(-total, kind="stable")[:k]
+    out = []
+    for i in top:
+        row = dict(candidates[i])
+        for name, values in components.items():
+            row[name] = float(values[i])
+        row["score"] = float(total[i])
+        out.append(row)
+    return out
@@ -0,0 +1,26 @@
+"""
+Bump the ingest generation (generation.py) when catalogue rows change outside
+the store functions: admin edits and deletes, shell scripts, data fixes.
+utils._upsert_batch writes with bulk_create, which sends no signals, and bumps
+the generation itself, so an ingest still counts once per batch.
+
+Without this, the data endpoints would keep answering 304 for the old ETag and
+the per-process caches (vector, BM25 and attribute indexes, answer cache)
+would keep serving the old rows.
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .generation import bump_generation
+from .models import EmbeddingVector, FAQChunk, Product
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=FAQChunk)
+@receiver(post_save, sender=EmbeddingVector)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=FAQChunk)
+@receiver(post_delete, sender=EmbeddingVector)
+def catalogue_changed(sender, **kwargs):
+    # Admin views save inside a transaction, so there the bump commits with the row.
+    bump_generation()
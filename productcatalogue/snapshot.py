@@ -0,0 +1,160 @@
+"""
+On-disk vector index snapshots shared between worker processes.
+
+Layout inside VECTOR_SNAPSHOT_DIR:
+    GENERATION        current generation number (replaced atomically)
+    gen-000042/       one directory per published generation
+        matrix.npy    L2-normalised float32 matrix, opened with mmap_mode='r'
+        meta.json     ids / sources / source_obj_ids / texts
+        ivf_*.npy     optional IVF centroids and cell assignments (see ann.py)
+        int8_*.npy    optional int8 codes and their per-dimension ranges (see quantize.py)
+    .lock             advisory lock held by writers while publishing
+
+Readers map the matrix read-only, so every worker shares the OS page cache
+instead of holding a private copy. Writers publish a complete new generation
+directory first and only then bump GENERATION, so a reader never sees a
+half-written snapshot.
+"""
+import json
+import os
+import shutil
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+GENERATION_FILE = "GENERATION"
+LOCK_FILE = ".lock"
+KEEP_GENERATIONS = 2
+
+
+def _gen_dir(directory, generation):
+    return os.path.join(directory, f"gen-{generation:06d}")
+
+
+def current_generation(directory):
+    """Return the published generation number, or 0 if nothing is published."""
+    try:
+        with open(os.path.join(directory, GENERATION_FILE)) as fh:
+            return int(fh.read().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+@contextmanager
+def publish_lock(directory):
+    """Serialise writers across processes while they read-merge-publish."""
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, LOCK_FILE), "a") as fh:
+        if fcntl is not None:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def write_snapshot(index, directory):
+    """
+    Persist `index` as the next generation and publish it.
+    Callers should hold publish_lock(directory). Returns the new generation.
+    """
+    generation = current_generation(directory) + 1
+    final_dir = _gen_dir(directory, generation)
+    tmp_dir = final_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    matrix = np.ascontiguousarray(index.matrix, dtype=np.float32)
+    np.save(os.path.join(tmp_dir, "matrix.npy"), matrix)
+    if index.ann is not None:
+        np.save(os.path.join(tmp_dir, "ivf_centroids.npy"), index.ann.centroids)
+        np.save(os.path.join(tmp_dir, "ivf_assignments.npy"), index.ann.assignments)
+    if index.quant is not None:
+        np.save(os.path.join(tmp_dir, "int8_codes.npy"), np.ascontiguousarray(index.quant.codes))
+        np.save(os.path.join(tmp_dir, "int8_ranges.npy"), np.vstack([index.quant.low, index.quant.step]))
+    with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as fh:
+        json.dump({
+            "ids": index.ids,
+            "sources": index.sources,
+            "source_obj_ids": index.source_obj_ids,
+            "texts": index.texts,
+            "ivf_trained_size": index.ann.trained_size if index.ann is not None else 0,
+            "int8_trained_size": index.quant.trained_size if index.quant is not None else 0,
+        }, fh)
+
+    shutil.rmtree(final_dir, ignore_errors=True)
+    os.rename(tmp_dir, final_dir)
+
+    gen_tmp = os.path.join(directory, GENERATION_FILE + ".tmp")
+    with open(gen_tmp, "w") as fh:
+        fh.write(str(generation))
+    os.replace(gen_tmp, os.path.join(directory, GENERATION_FILE))
+
+    _prune(directory, generation)
+    print(f"✅ Published vector snapshot generation {generation} ({len(index)} vectors)")
+    return generation
+
+
+def load_snapshot(directory, generation):
+    """
+    Map a published generation read-only and wrap it in a VectorIndex.
+    A writer may publish and prune `generation` between our read of GENERATION
+    and the open, so a missing generation is retried at the one now published;
+    the returned index's version is the generation actually mapped.
+    """
+    while True:
+        try:
+            return _load_generation(directory, generation)
+        except FileNotFoundError:
+            published = current_generation(directory)
+            if published <= generation:
+                raise
+            generation = published
+
+
+def _load_generation(directory, generation):
+    from .ann import IVFIndex
+    from .index import VectorIndex
+    from .quantize import ScalarQuantizer
+
+    gen_dir = _gen_dir(directory, generation)
+    matrix = np.load(os.path.join(gen_dir, "matrix.npy"), mmap_mode="r")
+    with open(os.path.join(gen_dir, "meta.json"), encoding="utf-8") as fh:
+        meta = json.load(fh)
+    ann = None
+    if meta.get("ivf_trained_size"):
+        ann = IVFIndex(
+            np.load(os.path.join(gen_dir, "ivf_centroids.npy")),
+            np.load(os.path.join(gen_dir, "ivf_assignments.npy")),
+            meta["ivf_trained_size"],
+        )
+    quant = None
+    if meta.get("int8_trained_size"):
+        low, step = np.load(os.path.join(gen_dir, "int8_ranges.npy"))
+        quant = ScalarQuantizer(
+            low, step, np.load(os.path.join(gen_dir, "int8_codes.npy"), mmap_mode="r"), meta["int8_trained_size"],
+        )
+    return VectorIndex(
+        meta["ids"], meta["sources"], meta["source_obj_ids"], meta["texts"],
+        matrix, version=generation, ann=ann, quant=quant,
+    )
+
+
+def _prune(directory, generation):
+    """Remove generations older than the last KEEP_GENERATIONS."""
+    for name in os.listdir(directory):
+        if not name.startswith("gen-") or name.endswith(".tmp"):
+            continue
+        try:
+            gen = int(name[4:])
+        except ValueError:
+            continue
+        if gen <= generation - KEEP_GENERATIONS:
+            # Readers that still map an old matrix keep their open file handle.
+            shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
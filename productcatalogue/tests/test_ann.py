@@ -0,0 +1,61 @@
+import io
+
+import numpy as np
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from productcatalogue.ann import IVFIndex
+from productcatalogue.index import VectorIndex, get_index, invalidate_index
+from productcatalogue.models import FAQChunk, EmbeddingVector
+from productcatalogue.utils import store_faq_chunks_and_embeddings
+
+
+def _index(vectors):
+    n = len(vectors)
+    return VectorIndex([f"v{i}" for i in range(n)], ["faq"] * n, [str(i) for i in range(n)], [""] * n,
+                       VectorIndex.normalize(vectors))
+
+
+class IVFIndexTest(TestCase):
+    def test_full_probe_matches_exact_scan(self):
+        rng = np.random.default_rng(1)
+        idx = _index(rng.normal(size=(500, 16)))
+        idx.ann = IVFIndex.train(idx.matrix, nlist=10)
+        q = rng.normal(size=16)
+        exact = idx.search(q, k=5, threshold=-1.0, exact=True)
+        approx = idx.search(q, k=5, threshold=-1.0, nprobe=10)
+        assert [r['id'] for r in approx] == [r['id'] for r in exact]
+
+    def test_inserts_are_assigned_to_cells(self):
+        rng = np.random.default_rng(2)
+        idx = _index(rng.normal(size=(200, 8)))
+        idx.ann = IVFIndex.train(idx.matrix, nlist=4)
+        new_vec = rng.normal(size=8)
+        updated = idx.with_upserts([{'id':'new','source':'faq','source_obj_id':'new','text':'','vector':new_vec}], 1)
+        assert updated.ann is not None
+        assert sum(len(cell) for cell in updated.ann.lists) == 201
+        assert updated.search(new_vec, k=1, nprobe=1)[0]['id'] == 'new'
+
+    @override_settings(VECTOR_INDEX_ANN="ivf", ANN_MIN_VECTORS=50, IVF_NLIST=4)
+    def test_ann_enabled_by_setting_above_min_size(self):
+        invalidate_index()
+        rng = np.random.default_rng(3)
+        chunks = [{'id': str(i), 'heading': '', 'text': f"t{i}"} for i in range(60)]
+        store_faq_chunks_and_embeddings(chunks, rng.normal(size=(60, 8)))
+        assert get_index().ann.nlist == 4
+        FAQChunk.objects.all().delete()
+        EmbeddingVector.objects.all().delete()
+        invalidate_index()
+
+    def test_report_leaves_the_resident_index_alone(self):
+        invalidate_index()
+        rng = np.random.default_rng(4)
+        chunks = [{'id': str(i), 'heading': '', 'text': f"t{i}"} for i in range(40)]
+        store_faq_chunks_and_embeddings(chunks, rng.normal(size=(40, 8)))
+        live = get_index()
+        call_command("ann_report", "--queries", "5", "--nprobe", "1", stdout=io.StringIO())
+        call_command("ann_report", "--int8", "--queries", "5", "--rescore", "8", stdout=io.StringIO())
+        assert get_index() is live and live.ann is None and live.quant is None
+        FAQChunk.objects.all().delete()
+        EmbeddingVector.objects.all().delete()
+        invalidate_index()
@@ -0,0 +1,84 @@
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from productcatalogue import registry
+from productcatalogue.adapters import MockAdapter
+from productcatalogue.answer_cache import SemanticAnswerCache, get_answer_cache
+from productcatalogue.index import invalidate_index
+from productcatalogue.models import FAQChunk, EmbeddingVector
+from productcatalogue.utils import store_faq_chunks_and_embeddings
+
+QUESTION = "Is it waterproof?"
+
+
+class SemanticAnswerCacheTest(TestCase):
+    def setUp(self):
+        self.now = [0.0]
+        self.cache = SemanticAnswerCache(threshold=0.9, ttl=60, max_entries=2, clock=lambda: self.now[0])
+        self.cache.put([1.0, 0.0], ["p_1", "f_2"], "fast", {"answer": "A", "citations": ["p_1"]})
+
+    def test_hit_needs_similar_vector_and_same_context(self):
+        assert self.cache.get([0.99, 0.1], ["f_2", "p_1"], "fast")["answer"] == "A"
+        assert self.cache.get([0.5, 0.5], ["p_1", "f_2"], "fast") is None
+        assert self.cache.get([1.0, 0.0], ["p_1"], "fast") is None
+        assert self.cache.get([1.0, 0.0], ["p_1", "f_2"], "deep") is None
+        assert self.cache.stats()["hits"] == 1 and self.cache.stats()["misses"] == 3
+
+    def test_entries_from_older_generations_are_misses(self):
+        self.cache.put([0.0, 1.0], ["f_3"], "fast", {"answer": "B"}, generation=4)
+        assert self.cache.get([0.0, 1.0], ["f_3"], "fast", generation=4)["answer"] == "B"
+        assert self.cache.get([0.0, 1.0], ["f_3"], "fast", generation=5) is None  # another worker ingested
+        assert self.cache.get([1.0, 0.0], ["p_1", "f_2"], "fast", generation=5) is None
+        assert len(self.cache) == 0
+
+    def test_ttl_lru_and_invalidation(self):
+        self.now[0] = 61.0
+        assert self.cache.get([1.0, 0.0], ["p_1", "f_2"], "fast") is None
+        assert len(self.cache) == 0
+
+        for i in range(3):
+            self.cache.put([1.0, float(i)], [f"p_{i}"], "fast", {"answer": str(i)})
+        assert len(self.cache) == 2
+        assert self.cache.get([1.0, 0.0], ["p_0"], "fast") is None  # evicted first
+
+        assert self.cache.invalidate_ids(["p_2"]) == 1
+        assert self.cache.get([1.0, 2.0], ["p_2"], "fast") is None
+        assert self.cache.get([1.0, 1.0], ["p_1"], "fast")["answer"] == "1"
+
+
+@override_settings(OPENAI_API_KEY="")
+class ChatAnswerCacheTest(TestCase):
+    def setUp(self):
+        registry.reset()
+        invalidate_index()
+        self.adapter = MockAdapter()
+        self._store(QUESTION)
+
+    def _store(self, text):
+        store_faq_chunks_and_embeddings(
+            [{'id': '1', 'heading': 'Waterproof', 'text': text}], self.adapter.get_embeddings([QUESTION])
+        )
+
+    def _ask(self):
+        return self.client.post(
+            "/api/chat/", {"messages": [{"role": "user", "content": QUESTION}]}, content_type="application/json"
+        ).json()
+
+    def test_repeat_question_skips_completion_until_reingest(self):
+        original = MockAdapter.get_completion
+        with mock.patch.object(MockAdapter, "get_completion", autospec=True, side_effect=original) as spy:
+            first = self._ask()
+            assert self._ask() == first
+            assert spy.call_count == 1
+
+            self._store(QUESTION + " Yes, fully.")  # same vector, new content
+            assert self._ask() == first
+            assert spy.call_count == 2
+        assert get_answer_cache().stats()["hits"] == 1
+
+    def tearDown(self):
+        FAQChunk.objects.all().delete()
+        EmbeddingVector.objects.all().delete()
+        invalidate_index()
+        registry.reset()
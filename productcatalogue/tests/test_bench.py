@@ -0,0 +1,39 @@
+import io
+import json
+import tempfile
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from productcatalogue.bench import percentiles, synthetic_vector
+from productcatalogue.models import EmbeddingVector, Product
+
+
+class BenchTest(TestCase):
+    def test_synthetic_vectors_are_deterministic(self):
+        assert (synthetic_vector("Rise Again", 32) == synthetic_vector("Rise Again", 32)).all()
+        assert synthetic_vector("Rise Again", 32).shape == (32,)
+
+    def test_percentiles(self):
+        report = percentiles(range(1, 101))
+        assert (report['p50_ms'], report['p99_ms'], report['queries']) == (50.5, 99.01, 100)
+
+    def test_bench_command_writes_json_and_rolls_back(self):
+        with tempfile.NamedTemporaryFile(suffix=".json") as out:
+            # The test database is already a scratch database, so run in place.
+            call_command("bench", sizes=[60], dim=16, queries=10, in_place=True, output=out.name, stderr=io.StringIO())
+            report = json.load(out)
+        row = report["results"][0]
+        assert (row["vectors"], row["products"], row["faqs"]) == (60, 54, 6)
+        assert row["ingest"]["products"]["rows"] == 54
+        assert set(row["retrieve"]) >= {"p50_ms", "p95_ms", "p99_ms"} and row["retrieve"]["queries"] == 9
+        assert row["memory"]["float32_mb"] > 0 and "vector_ms" in row["index_build"]
+        assert report["config"]["database"] == "configured"
+        assert not Product.objects.exists() and not EmbeddingVector.objects.exists()
+
+    def test_in_place_refuses_a_non_empty_catalogue(self):
+        Product.objects.create(id='1', name='Rise Again')
+        with self.assertRaises(CommandError):
+            call_command("bench", sizes=[10], dim=8, queries=2, in_place=True, stderr=io.StringIO())
+        assert Product.objects.count() == 1
@@ -0,0 +1,42 @@
+from django.test import TestCase
+
+from productcatalogue.index import invalidate_index
+from productcatalogue.models import Product, FAQChunk, EmbeddingVector
+from productcatalogue.utils import store_product_and_embeddings, store_faq_chunks_and_embeddings
+
+
+def _product(pid, price):
+    return {'id': pid, 'name': f"P{pid}", 'notes': 'n', 'accords': 'a', 'price': price,
+            'longevity': '8h', 'season': 'all', 'imageUrl': '', 'popularity': 1.0}
+
+
+class BulkIngestTest(TestCase):
+    def setUp(self):
+        invalidate_index()
+
+    def test_counts_inserted_updated_unchanged(self):
+        prods = [_product(str(i), 10.0 + i) for i in range(5)]
+        vecs = [[float(i), 1.0] for i in range(5)]
+        report = store_product_and_embeddings(prods, vecs, batch_size=2)
+        assert (report['inserted'], report['updated'], report['unchanged']) == (5, 0, 0)
+        assert [b['rows'] for b in report['batches']] == [2, 2, 1]
+        assert Product.objects.count() == 5 and EmbeddingVector.objects.count() == 5
+
+        prods[0]['price'] = 99.0
+        vecs[1] = [7.0, 7.0]
+        report = store_product_and_embeddings(prods, vecs, batch_size=2)
+        assert (report['inserted'], report['updated'], report['unchanged']) == (0, 2, 3)
+        assert Product.objects.get(id='0').price == 99.0
+        assert '$99.00' in EmbeddingVector.objects.get(id='p_0').text
+
+    def test_faq_duplicate_ids_in_one_batch(self):
+        chunks = [{'id': '1', 'heading': 'h', 'text': 'old'}, {'id': '1', 'heading': 'h', 'text': 'new'}]
+        report = store_faq_chunks_and_embeddings(chunks, [[1.0], [2.0]])
+        assert report['inserted'] == 1
+        assert FAQChunk.objects.get(id='1').text == 'new'
+
+    def tearDown(self):
+        Product.objects.all().delete()
+        FAQChunk.objects.all().delete()
+        EmbeddingVector.objects.all().delete()
+        invalidate_index()
@@ -0,0 +1,60 @@
+import asyncio
+
+from django.test import AsyncClient, TestCase, override_settings
+
+from productcatalogue import registry
+from productcatalogue.adapters import MockAdapter
+from productcatalogue.batching import arun_batches
+from productcatalogue.index import get_index, invalidate_index
+from productcatalogue.lexical import get_lexical_index
+from productcatalogue.models import FAQChunk, EmbeddingVector
+from productcatalogue.utils import store_faq_chunks_and_embeddings
+
+QUESTION = "Is it waterproof?"
+
+
+@override_settings(OPENAI_API_KEY="")
+class AsyncChatViewTest(TestCase):
+    def setUp(self):
+        registry.reset()
+        invalidate_index()
+        adapter = MockAdapter()
+        store_faq_chunks_and_embeddings(
+            [{'id': '1', 'heading': 'Waterproof', 'text': QUESTION}], adapter.get_embeddings([QUESTION])
+        )
+        # Build the indexes here; the async view searches them from a worker thread.
+        get_index()
+        get_lexical_index()
+
+    async def test_async_view_matches_sync_response(self):
+        resp = await AsyncClient().post(
+            "/api/chat/async/", {"messages": [{"role": "user", "content": QUESTION}]}, content_type="application/json"
+        )
+        assert resp.status_code == 200
+        assert resp.json() == {"answer": "Mock answer: I used provided snippets to answer.", "citations": ["f_1"]}
+
+    async def test_async_view_rejects_missing_content(self):
+        resp = await AsyncClient().post("/api/chat/async/", {"messages": []}, content_type="application/json")
+        assert resp.status_code == 400
+
+    def tearDown(self):
+        FAQChunk.objects.all().delete()
+        EmbeddingVector.objects.all().delete()
+        invalidate_index()
+        registry.reset()
+
+
+class ArunBatchesTest(TestCase):
+    def test_order_preserved_and_concurrency_bounded(self):
+        in_flight, peak = [0], [0]
+
+        async def work(batch):
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+            await asyncio.sleep(0.01 * (3 - batch[0] % 3))
+            in_flight[0] -= 1
+            return [x * 2 for x in batch]
+
+        results = asyncio.run(arun_batches([[i] for i in range(6)], work, max_concurrency=2))
+        assert results == [[i * 2] for i in range(6)]
+        assert peak[0] == 2
@@ -0,0 +1,66 @@
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from productcatalogue import registry
+from productcatalogue.adapters import MockAdapter
+from productcatalogue.index import invalidate_index
+from productcatalogue.models import FAQChunk, EmbeddingVector
+from productcatalogue.utils import retrieve_top_k, retrieve_top_k_batch, store_faq_chunks_and_embeddings
+
+QUESTIONS = ["Is it waterproof?", "How long is shipping?", "Can I return it?"]
+
+
+@override_settings(OPENAI_API_KEY="")
+class ChatBatchTest(TestCase):
+    def setUp(self):
+        registry.reset()
+        invalidate_index()
+        self.adapter = MockAdapter()
+        store_faq_chunks_and_embeddings(
+            [{'id': str(i), 'heading': q, 'text': q} for i, q in enumerate(QUESTIONS)],
+            self.adapter.get_embeddings(QUESTIONS),
+        )
+
+    def test_batch_retrieval_matches_single_queries(self):
+        vectors = self.adapter.get_embeddings(QUESTIONS)
+        batch = retrieve_top_k_batch(vectors, k=2, query_texts=QUESTIONS)
+        for got, v, q in zip(batch, vectors, QUESTIONS):
+            single = retrieve_top_k(v, k=2, query_text=q)
+            assert [r['id'] for r in got] == [r['id'] for r in single]
+            # matrix-matrix and matrix-vector products may differ in the last float32 bits
+            assert all(abs(a['score'] - b['score']) < 1e-5 for a, b in zip(got, single))
+
+    def test_endpoint_answers_in_order_with_item_errors(self):
+        original = MockAdapter.get_embeddings
+        with mock.patch.object(MockAdapter, "get_embeddings", autospec=True, side_effect=original) as spy:
+            resp = self.client.post(
+                "/api/chat/batch/",
+                {"questions": [QUESTIONS[2], {"messages": []}, QUESTIONS[0]]},
+                content_type="application/json",
+            )
+        assert spy.call_count == 1
+        results = resp.json()["results"]
+        assert results[0]["citations"][0] == "f_2"
+        assert "error" in results[1]
+        assert results[2]["citations"][0] == "f_0"
+
+    def test_malformed_items_are_per_item_errors(self):
+        bad = [{"messages": {"content": "hi"}}, {"messages": [{"content": 5}]}, {"messages": ["hi"]}, 7, {}]
+        resp = self.client.post(
+            "/api/chat/batch/", {"questions": [QUESTIONS[0]] + bad + [QUESTIONS[1]]}, content_type="application/json"
+        )
+        assert resp.status_code == 200
+        results = resp.json()["results"]
+        assert results[0]["citations"][0] == "f_0" and results[-1]["citations"][0] == "f_1"
+        assert all("error" in r for r in results[1:-1])
+
+    def test_endpoint_validates_input(self):
+        resp = self.client.post("/api/chat/batch/", {"questions": []}, content_type="application/json")
+        assert resp.status_code == 400
+
+    def tearDown(self):
+        FAQChunk.objects.all().delete()
+        EmbeddingVector.objects.all().delete()
+        invalidate_index()
+        registry.reset()
@@ -0,0 +1,84 @@
+import json
+
+from django.test import TestCase, override_settings
+
+from productcatalogue import registry
+from productcatalogue.adapters import MockAdapter, StreamInterrupted
+from productcatalogue.answer_cache import get_answer_cache
+from productcatalogue.chat import stream_answer
+from productcatalogue.index import invalidate_index
+from productcatalogue.models import FAQChunk, EmbeddingVector
+from productcatalogue.utils import store_faq_chunks_and_embeddings
+
+QUESTION = "Is it waterproof?"
+
+
+def _events(response):
+    body = b"".join(response.streaming_content).decode()
+    events = []
+    for block in body.strip().split("\n\n"):
+        event, data = block.split("\n")
+        events.append((event[len("event: "):], json.loads(data[len("data: "):])))
+    return events
+
+
+@override_settings(OPENAI_API_KEY="")
+class ChatStreamTest(TestCase):
+    def setUp(self):
+        registry.reset()
+        invalidate_index()
+        adapter = MockAdapter()
+        # Store the question text itself so retrieval finds it with mock vectors.
+        store_faq_chunks_and_embeddings(
+            [{'id': '1', 'heading': 'Waterproof', 'text': QUESTION}], adapter.get_embeddings([QUESTION])
+        )
+
+    def test_stream_sends_citations_then_tokens(self):
+        resp = self.client.post(
+            "/api/chat/",
+            {"messages": [{"role": "user", "content": QUESTION}], "stream": True},
+            content_type="application/json",
+        )
+        assert resp["Content-Type"] == "text/event-stream"
+        events = _events(resp)
+        assert events[0] == ("citations", {"citations": ["f_1"]})
+        tokens = "".join(data["text"] for name, data in events if name == "token")
+        assert tokens == "Mock answer: I used provided snippets to answer."
+        name, done = events[-1]
+        assert name == "done" and done["ttfb_ms"] <= done["total_ms"]
+
+    def test_non_streaming_response_unchanged(self):
+        resp = self.client.post(
+            "/api/chat/", {"messages": [{"role": "user", "content": QUESTION}]}, content_type="application/json"
+        )
+        assert resp.json() == {"answer": "Mock answer: I used provided snippets to answer.", "citations": ["f_1"]}
+
+    def test_stream_citations_match_the_json_response(self):
+        context = [
+            {'id': 'f_1', 'source': 'faq', 'text': 'Shipping'},
+            {'id': 'p_1', 'source': 'product', 'text': 'Rise Again'},
+            {'id': 'p_2', 'source': 'product', 'text': 'Lost Words'},
+        ]
+        messages = [{"role": "user", "content": "Compare Rise Again and Lost Words"}]
+        adapter = MockAdapter()
+        events = "".join(stream_answer(adapter, messages, provided_context=context))
+        streamed = json.loads(events.split("\n\n")[0].split("\n")[1][len("data: "):])["citations"]
+        assert streamed == adapter.get_completion(messages, "fast", context)["citations"] == ['p_1', 'p_2']
+
+    def test_interrupted_stream_is_not_cached(self):
+        class BrokenStream(MockAdapter):
+            def stream_completion(self, messages, mode, context_snippets):
+                yield "Half an"
+                raise StreamInterrupted("connection reset")
+
+        body = "".join(stream_answer(BrokenStream(), [{"role": "user", "content": QUESTION}]))
+        events = [block.split("\n")[0][len("event: "):] for block in body.strip().split("\n\n")]
+        assert events == ["citations", "token", "error", "done"]
+        assert '"complete": false' in body
+        assert len(get_answer_cache()) == 0
+
+    def tearDown(self):
+        FAQChunk.objects.all().delete()
+        EmbeddingVector.objects.all().delete()
+        invalidate_index()
+        registry.reset()
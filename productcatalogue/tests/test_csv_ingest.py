@@ -0,0 +1,56 @@
+import io
+
+from django.test import TestCase
+
+from productcatalogue.adapters import MockAdapter
+from productcatalogue.index import invalidate_index
+from productcatalogue.ingest import batch_by_token_budget, ingest_products_csv
+from productcatalogue.models import Product, EmbeddingVector
+
+CSV = (
+    "id,name,notes,accords,price,longevity,season,imageUrl,popularity\n"
+    '1,Rise Again,"citrus, woody",citrus,45,8-10h,all,,1.0\n'
+    "2,Lost Words,fresh,woody,30,6-8h,summer,,0.8\n"
+    ",No Id,x,x,1,1h,all,,0\n"
+    "3,Café Noir,coffee,gourmand,,4h,winter,,0.5\n"
+    "4,Odd Row,x,x,12,2h,all,,n/a\n"
+)
+
+
+class FlakyAdapter(MockAdapter):
+    """Fails the batch that contains product 2."""
+
+    def get_embeddings(self, texts, fallback=True):
+        if any("Lost Words" in t for t in texts):
+            raise RuntimeError("provider rejected batch")
+        return super().get_embeddings(texts)
+
+
+class CsvIngestTest(TestCase):
+    def setUp(self):
+        invalidate_index()
+
+    def test_token_budget_batches(self):
+        batches = list(batch_by_token_budget(["a" * 40] * 5, str, max_tokens=25, max_items=10))
+        assert [len(b) for b in batches] == [2, 2, 1]
+        batches = list(batch_by_token_budget(["a"] * 5, str, max_tokens=1000, max_items=2))
+        assert [len(b) for b in batches] == [2, 2, 1]
+
+    def test_streams_rows_in_batches(self):
+        report = ingest_products_csv(io.BytesIO(CSV.encode("utf-8")), MockAdapter(), max_items=2)
+        assert report["rows"] == 4 and report["skipped"] == 1
+        assert report["batches"] == 2 and report["errors"] == []
+        assert Product.objects.get(id="3").name == "Café Noir"
+        assert Product.objects.get(id="4").popularity == 0.0  # unparseable, like a bad price
+        assert EmbeddingVector.objects.count() == 4
+
+    def test_provider_error_only_drops_its_batch(self):
+        report = ingest_products_csv(io.BytesIO(CSV.encode("utf-8")), FlakyAdapter(), max_items=1)
+        assert report["rows"] == 3
+        assert [(e["first_id"], e["rows"]) for e in report["errors"]] == [("2", 1)]
+        assert set(Product.objects.values_list("id", flat=True)) == {"1", "3", "4"}
+
+    def tearDown(self):
+        Product.objects.all().delete()
+        EmbeddingVector.objects.all().delete()
+        invalidate_index()
@@ -0,0 +1,79 @@
+import json
+
+from django.test import TestCase
+
+from productcatalogue.index import invalidate_index
+from productcatalogue.models import DataGeneration, EmbeddingVector, FAQChunk, Product
+from productcatalogue.utils import store_faq_chunks_and_embeddings, store_product_and_embeddings
+
+
+def _product(pid, price):
+    return {'id': pid, 'name': f"P{pid}", 'notes': 'n', 'accords': 'a', 'price': price,
+            'longevity': '8h', 'season': 'all', 'imageUrl': '', 'popularity': 1.0}
+
+
+class DataApiTest(TestCase):
+    def setUp(self):
+        invalidate_index()
+        store_product_and_embeddings([_product(str(i), 10.0 + i) for i in range(5)], [[float(i), 1.0] for i in range(5)])
+        store_faq_chunks_and_embeddings([{'id': '1', 'heading': 'Shipping', 'text': 'Two days'}], [[1.0, 0.0]])
+
+    def test_get_data_body_unchanged_and_conditional(self):
+        resp = self.client.get("/api/get-data/")
+        body = resp.json()
+        assert len(body["products"]) == 5 and body["faqs"] == [{'id': '1', 'heading': 'Shipping', 'text': 'Two days'}]
+        etag = resp["ETag"]
+        assert resp.has_header("Last-Modified")
+        assert self.client.get("/api/get-data/", HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+        store_product_and_embeddings([_product("0", 99.0)], [[0.0, 1.0]])
+        resp = self.client.get("/api/get-data/", HTTP_IF_NONE_MATCH=etag)
+        assert resp.status_code == 200 and resp["ETag"] != etag
+
+    def test_admin_style_edits_change_the_etag(self):
+        etag = self.client.get("/api/get-data/")["ETag"]
+        product = Product.objects.get(id="1")
+        product.price = 99.0
+        product.save()
+        resp = self.client.get("/api/get-data/", HTTP_IF_NONE_MATCH=etag)
+        assert resp.status_code == 200 and resp["ETag"] != etag
+
+        etag = resp["ETag"]
+        FAQChunk.objects.get(id="1").delete()
+        resp = self.client.get("/api/products/", HTTP_IF_NONE_MATCH=etag)
+        assert resp.status_code == 200 and resp["ETag"] != etag
+
+    def test_unchanged_reingest_keeps_generation(self):
+        value = DataGeneration.objects.get().value
+        store_product_and_embeddings([_product("0", 10.0)], [[0.0, 1.0]])
+        assert DataGeneration.objects.get().value == value
+
+    def test_cursor_pagination_with_fields(self):
+        seen, cursor = [], ""
+        while True:
+            page = self.client.get("/api/products/", {"limit": 2, "fields": "name,price", "cursor": cursor}).json()
+            seen.extend(page["results"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        assert [r["id"] for r in seen] == ["0", "1", "2", "3", "4"]
+        assert set(seen[0]) == {"id", "name", "price"}
+
+    def test_bad_parameters(self):
+        assert self.client.get("/api/products/", {"fields": "secret"}).status_code == 400
+        assert self.client.get("/api/faqs/", {"cursor": "!!"}).status_code == 400
+        assert self.client.get("/api/faqs/", {"limit": "0"}).status_code == 400
+
+    def test_ndjson_export(self):
+        resp = self.client.get("/api/get-data/", {"export": "ndjson"})
+        assert resp["Content-Type"] == "application/x-ndjson"
+        rows = [json.loads(line) for line in b"".join(resp.streaming_content).decode().splitlines()]
+        assert [r["type"] for r in rows] == ["product"] * 5 + ["faq"]
+        rows = b"".join(self.client.get("/api/faqs/", {"export": "ndjson"}).streaming_content).decode().splitlines()
+        assert json.loads(rows[0]) == {'id': '1', 'heading': 'Shipping', 'text': 'Two days'}
+
+    def tearDown(self):
+        Product.objects.all().delete()
+        FAQChunk.objects.all().delete()
+        EmbeddingVector.objects.all().delete()
+        invalidate_index()
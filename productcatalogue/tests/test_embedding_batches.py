@@ -0,0 +1,89 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.test import SimpleTestCase, override_settings
+
+from productcatalogue.adapters import OpenAIAdapter
+from productcatalogue.batching import RateLimiter
+
+
+class StubEmbeddingHandler(BaseHTTPRequestHandler):
+    """Minimal /v1/embeddings: vector = [int(text)]; fails the first `fail_first` calls with 503."""
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        server = self.server
+        with server.lock:
+            server.calls.append(body["input"])
+            fail = len(server.calls) <= server.fail_first
+        if fail:
+            self.send_response(503)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(b'{"error": {"message": "busy"}}')
+            return
+        payload = {
+            "object": "list",
+            "model": body["model"],
+            "data": [
+                {"object": "embedding", "index": i, "embedding": [float(text)]}
+                for i, text in enumerate(body["input"])
+            ],
+            "usage": {"prompt_tokens": 1, "total_tokens": 1},
+        }
+        data = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class EmbeddingBatchTest(SimpleTestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubEmbeddingHandler)
+        self.server.lock = threading.Lock()
+        self.server.calls = []
+        self.server.fail_first = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.override = override_settings(
+            OPENAI_BASE_URL=f"http://127.0.0.1:{self.server.server_port}/v1",
+            EMBEDDING_REQUEST_MAX_ITEMS=3,
+            EMBEDDING_CONCURRENCY=4,
+            EMBEDDING_RETRY_BACKOFF=0.01,
+        )
+        self.override.enable()
+
+    def test_batches_run_concurrently_in_order(self):
+        texts = [str(i) for i in range(10)]
+        vectors = OpenAIAdapter("test-key").get_embeddings(texts, fallback=False)
+        assert vectors == [[float(i)] for i in range(10)]
+        assert sorted(len(c) for c in self.server.calls) == [1, 3, 3, 3]
+
+    def test_transient_errors_are_retried(self):
+        self.server.fail_first = 2
+        vectors = OpenAIAdapter("test-key").get_embeddings(["1", "2"], fallback=False)
+        assert vectors == [[1.0], [2.0]]
+        assert len(self.server.calls) == 3
+
+    def test_rate_limiter_waits_for_budget(self):
+        now = [0.0]
+        waits = []
+
+        def sleep(seconds):
+            waits.append(seconds)
+            now[0] += seconds
+
+        limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=600, clock=lambda: now[0], sleep=sleep)
+        limiter.acquire(600)
+        limiter.acquire(300)
+        assert abs(sum(waits) - 30.0) < 1e-6
+
+    def tearDown(self):
+        self.override.disable()
+        self.server.shutdown()
+        self.server.server_close()
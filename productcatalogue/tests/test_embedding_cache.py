@@ -0,0 +1,150 @@
+import io
+import os
+import tempfile
+
+import numpy as np
+
+from django.test import TestCase, override_settings
+
+from productcatalogue.adapters import FALLBACK_EMBEDDING_MODEL, MockAdapter
+from productcatalogue.embedding_cache import (
+    embed_queries, embed_query, embed_with_cache, get_query_cache, reset_query_cache,
+)
+from productcatalogue.index import invalidate_index
+from productcatalogue.ingest import ingest_markdown, ingest_products_csv
+from productcatalogue.models import Product, EmbeddingVector, EmbeddingCache, FAQChunk
+from productcatalogue.writebehind import get_write_behind, reset_write_behind
+
+HEADER = "id,name,notes,accords,price,longevity,season,imageUrl,popularity\n"
+
+
+class CountingAdapter(MockAdapter):
+    def __init__(self, fail=False):
+        super().__init__()
+        self.calls = []
+        self.fail = fail
+
+    def get_embeddings(self, texts, fallback=True):
+        self.calls.append(list(texts))
+        if self.fail and not fallback:
+            raise RuntimeError("provider down")
+        return super().get_embeddings(texts)
+
+
+class EmbeddingCacheTest(TestCase):
+    def setUp(self):
+        invalidate_index()
+
+    def _csv(self, price):
+        return io.BytesIO((HEADER + f"1,A,n,a,{price},8h,all,,1\n2,B,n,a,20,8h,all,,1\n").encode())
+
+    def test_reupload_only_embeds_changed_rows(self):
+        adapter = CountingAdapter()
+        first = ingest_products_csv(self._csv(10), adapter)
+        assert first["cache"] == {"hits": 0, "misses": 2}
+
+        again = ingest_products_csv(self._csv(10), adapter)
+        assert again["cache"] == {"hits": 2, "misses": 0}
+        assert len(adapter.calls) == 1
+
+        changed = ingest_products_csv(self._csv(11), adapter)
+        assert changed["cache"] == {"hits": 1, "misses": 1}
+        assert len(adapter.calls[-1]) == 1 and "$11.00" in adapter.calls[-1][0]
+
+    def test_fallback_vectors_are_not_cached(self):
+        adapter = CountingAdapter(fail=True)
+        vectors, stats = embed_with_cache(adapter, ["a", "a"])
+        assert len(vectors) == 2 and stats == {"hits": 0, "misses": 2, "fallback": 2}
+        assert EmbeddingCache.objects.count() == 0
+        assert adapter.calls == [["a"]]  # one provider attempt; the fallback does not call it again
+        with override_settings(EMBEDDING_CACHE_ENABLED=False):
+            embed_with_cache(adapter, ["a", "b"])
+        assert adapter.calls == [["a"], ["a", "b"]]
+
+    def test_fallback_vectors_are_stored_under_the_fallback_model(self):
+        fd, path = tempfile.mkstemp(suffix=".md")
+        with os.fdopen(fd, "w") as fh:
+            fh.write("# Shipping\nWe ship worldwide.\n")
+        try:
+            ingest_markdown(path, CountingAdapter(fail=True))
+        finally:
+            os.remove(path)
+        assert set(EmbeddingVector.objects.values_list('embedding_model', flat=True)) == {FALLBACK_EMBEDDING_MODEL}
+        FAQChunk.objects.all().delete()
+
+    def test_failed_query_embedding_is_not_retried(self):
+        reset_query_cache()
+        adapter = CountingAdapter(fail=True)
+        assert len(embed_query(adapter, "Is it waterproof?")) == 16
+        assert len(adapter.calls) == 1  # the fallback vector comes without a second provider call
+
+        adapter = CountingAdapter(fail=True)
+        vectors = embed_queries(adapter, ["Can I return it?", "How long is shipping?"])
+        assert all(len(v) == 16 for v in vectors) and len(adapter.calls) == 1
+
+    def test_query_cache_normalises_and_namespaces_by_model(self):
+        reset_query_cache()
+        adapter = CountingAdapter()
+        first = embed_query(adapter, "Is it  waterproof?")
+        assert embed_query(adapter, "is it waterproof? ") == first
+        assert len(adapter.calls) == 1
+
+        other = CountingAdapter()
+        other.embedding_model = "other-model"
+        embed_query(other, "Is it waterproof?")
+        assert len(other.calls) == 1
+        assert get_query_cache().stats()["hits"] == 1
+
+    @override_settings(QUERY_EMBEDDING_CACHE_PERSIST=True, WRITE_BEHIND_BACKGROUND=False)
+    def test_persistent_query_tier_survives_restart(self):
+        reset_query_cache()
+        reset_write_behind()
+        vector = embed_query(CountingAdapter(), "How long does Rise Again last?")
+        assert not EmbeddingCache.objects.exists()  # written behind, not on the request thread
+        reset_write_behind()  # flushes, as at process exit
+        reset_query_cache()  # simulate a new process
+        adapter = CountingAdapter()
+        assert np.allclose(embed_query(adapter, "how long does rise again last?"), vector)  # float32 round trip
+        assert adapter.calls == []
+        assert list(EmbeddingCache.objects.values_list('model', flat=True)) == [f"query:{adapter.embedding_model}"]
+        embed_with_cache(adapter, ["how long does rise again last?"])  # ingest lookups never see query rows
+        assert adapter.calls == [["how long does rise again last?"]]
+
+    @override_settings(QUERY_EMBEDDING_CACHE_PERSIST=True, QUERY_EMBEDDING_CACHE_PERSIST_MAX=2,
+                       WRITE_BEHIND_BACKGROUND=False)
+    def test_persistent_query_tier_keeps_the_newest_rows(self):
+        reset_query_cache()
+        reset_write_behind()
+        adapter = CountingAdapter()
+        for question in ["first?", "second?", "third?"]:
+            embed_query(adapter, question)
+            reset_write_behind()
+        reset_query_cache()
+        adapter.calls = []
+        embed_query(adapter, "first?")
+        embed_query(adapter, "third?")
+        assert adapter.calls == [["first?"]]
+
+    @override_settings(QUERY_EMBEDDING_CACHE_PERSIST=True, QUERY_EMBEDDING_CACHE_PERSIST_MAX=2,
+                       QUERY_EMBEDDING_CACHE_PRUNE_SECONDS=60, WRITE_BEHIND_BACKGROUND=False)
+    def test_persistent_query_tier_is_pruned_on_a_timer(self):
+        reset_query_cache()
+        reset_write_behind()
+        adapter = CountingAdapter()
+        for question in ["first?", "second?", "third?"]:
+            embed_query(adapter, question)
+            get_write_behind().flush()
+        # Only the first batch pruned (nothing to drop yet); the rest waited for the timer.
+        assert EmbeddingCache.objects.filter(model__startswith="query:").count() == 3
+        with override_settings(QUERY_EMBEDDING_CACHE_PRUNE_SECONDS=0):
+            embed_query(adapter, "fourth?")
+            get_write_behind().flush()
+        assert EmbeddingCache.objects.filter(model__startswith="query:").count() == 2
+
+    def tearDown(self):
+        reset_write_behind()
+        reset_query_cache()
+        Product.objects.all().delete()
+        EmbeddingVector.objects.all().delete()
+        EmbeddingCache.objects.all().delete()
+        invalidate_index()
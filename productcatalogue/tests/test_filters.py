@@ -0,0 +1,103 @@
+from django.db import transaction
+from django.test import TestCase, override_settings
+
+from productcatalogue import registry
+from productcatalogue.adapters import MockAdapter
+from productcatalogue.filters import AttributeIndex, get_attribute_index, match_products, parse_filters, parse_longevity
+from productcatalogue.generation import bump_generation
+from productcatalogue.index import invalidate_index
+from productcatalogue.models import Product, FAQChunk, EmbeddingVector
+from productcatalogue.utils import retrieve_top_k, store_faq_chunks_and_embeddings, store_product_and_embeddings
+
+
+class ParseTest(TestCase):
+    def test_parse_longevity(self):
+        assert parse_longevity("8-10h") == (8.0, 10.0)
+        assert parse_longevity("12h") == (12.0, 12.0)
+        assert parse_longevity("6 to 8 hours") == (6.0, 8.0)
+        assert parse_longevity("2 days") == (48.0, 48.0)
+        assert parse_longevity("") == (None, None)
+
+    def test_parse_filters(self):
+        assert parse_filters({"price_max": "40", "season": "Summer, spring"}) == {
+            "price_max": 40.0, "season": ["summer", "spring"],
+        }
+        assert parse_filters({}) is None
+        with self.assertRaises(ValueError):
+            parse_filters({"colour": "red"})
+        with self.assertRaises(ValueError):
+            parse_filters({"price_min": "cheap"})
+        with self.assertRaises(ValueError):
+            parse_filters({"season": 5})
+        with self.assertRaises(ValueError):
+            parse_filters({"accords": ["woody", {"a": 1}]})
+
+
+class AttributeIndexTest(TestCase):
+    def test_match(self):
+        index = AttributeIndex.from_rows([
+            ("a", 30.0, 8.0, 10.0, "Summer", "citrus, woody", 1.0),
+            ("b", 45.0, 6.0, 8.0, "Winter", "woody", 0.5),
+            ("c", 25.0, None, None, "All", "fresh", 0.0),
+            ("d", None, 12.0, 12.0, "Summer", "citrus", 2.0),
+        ])
+        assert index.match({"price_max": 40.0}) == {"a", "c"}
+        assert index.match({"price_min": 26.0, "price_max": 45.0}) == {"a", "b"}
+        assert index.match({"season": ["summer"]}) == {"a", "c", "d"}
+        assert index.match({"accords": ["citrus", "woody"]}) == {"a"}
+        assert index.match({"longevity_min": 9.0}) == {"a", "d"}
+        assert index.match({"price_max": 40.0, "season": ["summer"], "longevity_min": 9.0}) == {"a"}
+
+
+@override_settings(OPENAI_API_KEY="")
+class FilteredRetrievalTest(TestCase):
+    def setUp(self):
+        registry.reset()
+        invalidate_index()
+        self.adapter = MockAdapter()
+        prods = [
+            {'id': '1', 'name': 'Sun', 'notes': '', 'accords': 'citrus', 'price': 35, 'longevity': '8-10h',
+             'season': 'Summer', 'imageUrl': '', 'popularity': 1.0},
+            {'id': '2', 'name': 'Snow', 'notes': '', 'accords': 'amber', 'price': 80, 'longevity': '6-8h',
+             'season': 'Winter', 'imageUrl': '', 'popularity': 1.0},
+        ]
+        self.query = self.adapter.get_embeddings(["q"])[0]
+        # Every row gets the query vector, so only the filters decide what comes back.
+        store_product_and_embeddings(prods, [self.query, self.query])
+        store_faq_chunks_and_embeddings([{'id': '1', 'heading': 'h', 'text': 'Returns policy'}], [self.query])
+
+    def test_filters_restrict_products_and_keep_faqs(self):
+        assert Product.objects.get(id='1').longevity_max_hours == 10.0
+        top = retrieve_top_k(self.query, k=5, filters={"price_max": 40.0, "season": ["summer"]})
+        assert sorted(t['id'] for t in top) == ['f_1', 'p_1']
+        top = retrieve_top_k(self.query, k=5, query_text="Snow", filters={"price_max": 40.0})
+        assert 'p_2' not in {t['id'] for t in top}
+
+    def test_rebuilt_after_another_process_ingests(self):
+        assert match_products({"price_max": 40.0}) == {'1'}
+        before = get_attribute_index()
+        # A price change written by another worker: nothing invalidates this process's index.
+        with transaction.atomic():
+            Product.objects.filter(id='2').update(price=30)
+            bump_generation()
+        assert match_products({"price_max": 40.0}) == {'1', '2'}
+        assert get_attribute_index().generation == before.generation + 1
+
+    def test_chat_rejects_bad_filters(self):
+        resp = self.client.post(
+            "/api/chat/", {"messages": [{"role": "user", "content": "hi"}], "filters": {"colour": "red"}},
+            content_type="application/json",
+        )
+        assert resp.status_code == 400
+        resp = self.client.post(
+            "/api/chat/", {"messages": [{"role": "user", "content": "hi"}], "filters": {"season": 5}},
+            content_type="application/json",
+        )
+        assert resp.status_code == 400
+
+    def tearDown(self):
+        Product.objects.all().delete()
+        FAQChunk.objects.all().delete()
+        EmbeddingVector.objects.all().delete()
+        invalidate_index()
+        registry.reset()
@@ -0,0 +1,96 @@
+import numpy as np
+from django.db import transaction
+from django.test import TestCase, override_settings
+
+from productcatalogue.generation import bump_generation
+from productcatalogue.index import VectorIndex, get_index, invalidate_index
+from productcatalogue.quantize import ScalarQuantizer
+from productcatalogue.models import Product, FAQChunk, EmbeddingVector
+from productcatalogue.utils import store_product_and_embeddings, store_faq_chunks_and_embeddings, retrieve_top_k
+
+
+class VectorIndexTest(TestCase):
+    def setUp(self):
+        invalidate_index()
+        prods = [
+            {'id':'1','name':'Rise Again','notes':'citrus','accords':'citrus','price':45,'longevity':'8-10h','season':'all','imageUrl':'','popularity':1.0},
+            {'id':'2','name':'Lost Words','notes':'woody','accords':'woody','price':30,'longevity':'6-8h','season':'all','imageUrl':'','popularity':0.8},
+        ]
+        store_product_and_embeddings(prods, [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]])
+
+    def test_index_is_resident_and_updated_in_place(self):
+        first = get_index()
+        assert get_index() is first
+        assert len(first) == 2
+
+        store_faq_chunks_and_embeddings([{'id':'9','heading':'h','text':'shipping'}], [[0.0, 0.0, 2.0]])
+        second = get_index()
+        assert second is not first
+        assert second.version > first.version
+        assert len(first) == 2 and len(second) == 3
+
+        top = retrieve_top_k([0.0, 0.0, 1.0], k=1)
+        assert top[0]['id'] == 'f_9'
+        assert abs(top[0]['cosine'] - 1.0) < 1e-6  # `score` is the reranked score
+
+    def test_upsert_replaces_existing_vector(self):
+        get_index()
+        prods = [{'id':'1','name':'Rise Again','notes':'citrus','accords':'citrus','price':45,'longevity':'8-10h','season':'all','imageUrl':'','popularity':1.0}]
+        store_product_and_embeddings(prods, [[0.0, 1.0, 0.0]])
+        assert len(get_index()) == 2
+        top = retrieve_top_k([0.0, 1.0, 0.0], k=2)
+        assert {t['id'] for t in top} == {'p_1', 'p_2'}
+
+    def test_rebuilds_after_another_process_ingests(self):
+        first = get_index()
+        store_product_and_embeddings(
+            [{'id':'3','name':'Dusk','notes':'amber','accords':'amber','price':50,'longevity':'8-10h','season':'all','imageUrl':'','popularity':0.5}],
+            [[0.0, 0.0, 1.0]],
+        )
+        assert get_index().generation == first.generation + 1  # merged in-process, no rebuild
+        current = get_index()
+        assert len(current) == 3
+
+        # Rows written by another worker (bulk, like _upsert_batch) only show up as a newer generation.
+        EmbeddingVector.objects.bulk_create([EmbeddingVector(
+            id='f_7', source='faq', source_obj_id='7', text='gift wrapping', vector='[1.0, 1.0, 0.0]', dim=3,
+            embedding_model='mock',
+        )])
+        assert get_index() is current
+        with transaction.atomic():
+            bump_generation()
+        rebuilt = get_index()
+        assert rebuilt is not current and len(rebuilt) == 4
+        assert rebuilt.generation == current.generation + 1
+        assert get_index() is rebuilt
+
+    def test_mismatched_dimensions(self):
+        idx = VectorIndex.from_items([
+            {'id':'a','source':'faq','source_obj_id':'a','text':'a','vector':np.ones(3)},
+            {'id':'b','source':'faq','source_obj_id':'b','text':'b','vector':np.ones(3)},
+            {'id':'c','source':'faq','source_obj_id':'c','text':'c','vector':np.ones(5)},
+        ])
+        assert idx.ids == ['a', 'b']
+        assert idx.search(np.ones(5)) == []
+
+    def test_search_batch_matches_search(self):
+        rng = np.random.default_rng(7)
+        idx = VectorIndex.from_items([
+            {'id': str(i), 'source': 'faq', 'source_obj_id': str(i), 'text': '', 'vector': v}
+            for i, v in enumerate(rng.normal(size=(50, 8)))
+        ])
+        queries = rng.normal(size=(5, 8))
+        # A budget smaller than one query's scores still scores one query per block.
+        with override_settings(SEARCH_BATCH_MEMORY_MB=0):
+            batch = idx.search_batch(queries, k=3, threshold=-1.0)
+        assert [[r['id'] for r in got] for got in batch] == [[r['id'] for r in idx.search(q, k=3, threshold=-1.0)] for q in queries]
+
+        idx.quant = ScalarQuantizer.train(idx.matrix)
+        batch = idx.search_batch(queries, k=3, threshold=-1.0)
+        assert batch == [idx.search(q, k=3, threshold=-1.0) for q in queries]  # same int8 path as single queries
+
+    def tearDown(self):
+        Product.objects.all().delete()
+        FAQChunk.objects.all().delete()
+        EmbeddingVector.objects.all().delete()
+        invalidate_index()
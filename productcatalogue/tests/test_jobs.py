@@ -0,0 +1,75 @@
+import tempfile
+from datetime import timedelta
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from productcatalogue.index import invalidate_index
+from productcatalogue.jobs import STALE_ERROR, recover_stale_jobs, run_job
+from productcatalogue.models import Product, FAQChunk, EmbeddingVector, IngestionJob
+
+CSV = b"id,name,notes,accords,price,longevity,season,imageUrl,popularity\n1,Rise Again,citrus,citrus,45,8-10h,all,,1.0\n"
+FAQ = b"## Shipping\nWe ship worldwide.\n\n## Returns\n30 days.\n"
+
+
+class IngestionJobTest(TestCase):
+    def setUp(self):
+        invalidate_index()
+        self.media = tempfile.TemporaryDirectory()
+        self.override = override_settings(MEDIA_ROOT=self.media.name, OPENAI_API_KEY="")
+        self.override.enable()
+
+    def _files(self):
+        return {
+            "products.csv": SimpleUploadedFile("products.csv", CSV),
+            "faq.md": SimpleUploadedFile("faq.md", FAQ),
+        }
+
+    def test_sync_upload(self):
+        resp = self.client.post("/api/upload/", self._files())
+        assert resp.status_code == 200
+        assert resp.json()["products"] == 1 and resp.json()["faq_chunks"] == 2
+
+    def test_async_upload_returns_job_and_reports_progress(self):
+        resp = self.client.post("/api/upload/?async=true", self._files())
+        assert resp.status_code == 202
+        job_id = resp.json()["job_id"]
+        assert IngestionJob.objects.get(id=job_id).status == "queued"
+
+        run_job(job_id)
+        body = self.client.get(f"/api/jobs/{job_id}/").json()
+        assert body["status"] == "done"
+        assert body["rows_processed"] == 3
+        assert body["result"]["products"] == 1
+        assert body["errors"] == []
+        assert Product.objects.count() == 1 and FAQChunk.objects.count() == 2
+
+        # A finished job cannot be claimed twice.
+        assert run_job(job_id) is None
+
+    def test_stale_running_jobs_are_requeued_once(self):
+        old = timezone.now() - timedelta(hours=1)
+        job = IngestionJob.objects.create(files={}, status='running', stage='products')
+        live = IngestionJob.objects.create(files={}, status='running', stage='products')
+        IngestionJob.objects.filter(id=job.id).update(updated_at=old)
+
+        assert recover_stale_jobs() == 1
+        job.refresh_from_db()
+        assert (job.status, job.stage) == ('queued', 'queued')
+        assert job.errors == [{"stage": "products", "error": STALE_ERROR}]
+        assert IngestionJob.objects.get(id=live.id).status == 'running'
+
+        # Stale a second time: failed rather than requeued again.
+        IngestionJob.objects.filter(id=job.id).update(status='running', updated_at=old)
+        assert recover_stale_jobs() == 1
+        job.refresh_from_db()
+        assert job.status == 'failed' and job.finished_at is not None
+
+    def tearDown(self):
+        Product.objects.all().delete()
+        FAQChunk.objects.all().delete()
+        EmbeddingVector.objects.all().delete()
+        invalidate_index()
+        self.override.disable()
+        self.media.cleanup()
@@ -0,0 +1,87 @@
+from django.db import transaction
+from django.test import TestCase
+
+from productcatalogue.adapters import MockAdapter
+from productcatalogue.generation import bump_generation
+from productcatalogue.index import invalidate_index
+from productcatalogue.lexical import BM25Index, fuse_rrf, get_lexical_index
+from productcatalogue.models import Product, EmbeddingVector
+from productcatalogue.utils import retrieve_top_k, store_product_and_embeddings
+
+
+def _doc(doc_id, text, name=''):
+    return {'id': doc_id, 'source': 'product', 'source_obj_id': doc_id, 'text': text, 'name': name}
+
+
+class BM25IndexTest(TestCase):
+    def test_name_match_ranks_first_and_upsert_replaces(self):
+        index = BM25Index()
+        index.upsert([
+            _doc('a', 'Product name: Rise Again. Description: citrus.', 'Rise Again'),
+            _doc('b', 'Product name: Dawn. Description: rise early, again and again.', 'Dawn'),
+        ])
+        assert [r['id'] for r in index.search('rise again')] == ['a', 'b']
+
+        index.upsert([_doc('a', 'Product name: Sunset. Description: amber.', 'Sunset')])
+        assert [r['id'] for r in index.search('rise again')] == ['b']
+        assert index.search('sunset')[0]['id'] == 'a'
+
+    def test_common_terms_are_skipped_next_to_rarer_ones(self):
+        index = BM25Index()
+        index.upsert([_doc(str(i), f'Product name: Item {i}. Description: woody.') for i in range(10)])
+        index.upsert([_doc('rare', 'Product name: Sea Salt. Description: marine.')])
+        assert [r['id'] for r in index.search('product sea salt')] == ['rare']
+        assert len(index.search('product description', k=50)) == 11  # nothing rarer to score
+
+    def test_rrf_rewards_agreement(self):
+        fused = fuse_rrf({
+            'vector': [{'id': 'x', 'score': 0.9}, {'id': 'y', 'score': 0.8}],
+            'lexical': [{'id': 'y', 'score': 7.0}, {'id': 'z', 'score': 3.0}],
+        }, k=3)
+        assert [r['id'] for r in fused] == ['y', 'x', 'z']
+        assert fused[0]['vector_score'] == 0.8 and fused[0]['lexical_score'] == 7.0
+
+
+class HybridRetrievalTest(TestCase):
+    def setUp(self):
+        invalidate_index()
+        self.adapter = MockAdapter()
+        prods = [
+            {'id': str(i), 'name': name, 'notes': 'woody', 'accords': 'woody', 'price': 30,
+             'longevity': '8h', 'season': 'all', 'imageUrl': '', 'popularity': 1.0}
+            for i, name in enumerate(['Rise Again', 'Lost Words', 'Amber Night', 'Sea Salt'])
+        ]
+        store_product_and_embeddings(prods, self.adapter.get_embeddings([p['name'] for p in prods]))
+
+    def test_product_names_found_by_hybrid_search(self):
+        q = "Compare Rise Again and Lost Words"
+        top = retrieve_top_k(self.adapter.get_embeddings([q])[0], k=2, query_text=q)
+        assert {t['id'] for t in top} == {'p_0', 'p_1'}
+
+    def test_new_rows_are_indexed_incrementally(self):
+        idx = get_lexical_index()
+        store_product_and_embeddings(
+            [{'id': '9', 'name': 'Velvet Oud', 'notes': '', 'accords': '', 'price': 1,
+              'longevity': '', 'season': '', 'imageUrl': '', 'popularity': 0}],
+            self.adapter.get_embeddings(['Velvet Oud']),
+        )
+        assert get_lexical_index() is idx
+        assert idx.search('velvet oud', k=1)[0]['id'] == 'p_9'
+
+    def test_rebuilt_after_another_process_ingests(self):
+        before = get_lexical_index()
+        # Rows written by another worker: nothing calls upsert_into_lexical_index here.
+        EmbeddingVector.objects.bulk_create([EmbeddingVector(
+            id='f_7', source='faq', source_obj_id='7', text='gift wrapping', vector='', dim=3, embedding_model='mock'
+        )])
+        with transaction.atomic():
+            bump_generation()
+        idx = get_lexical_index()
+        assert idx is not before and idx.generation == before.generation + 1
+        assert idx.search('gift wrapping', k=1)[0]['id'] == 'f_7'
+        assert get_lexical_index() is idx
+
+    def tearDown(self):
+        Product.objects.all().delete()
+        EmbeddingVector.objects.all().delete()
+        invalidate_index()
@@ -0,0 +1,67 @@
+import os
+import tempfile
+
+from django.test import TestCase, override_settings
+
+from productcatalogue.adapters import MockAdapter
+from productcatalogue.index import invalidate_index
+from productcatalogue.ingest import ingest_pdf, pdf_chunk_ids
+from productcatalogue.models import FAQChunk, EmbeddingVector
+from productcatalogue.pdf import chunk_pages
+
+
+def _make_pdf(pages):
+    import fitz  # PyMuPDF
+
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    os.close(fd)
+    with fitz.open() as doc:
+        for text in pages:
+            doc.new_page().insert_textbox(fitz.Rect(50, 50, 550, 800), text, fontsize=8)
+        doc.save(path)
+    return path
+
+
+class ChunkPagesTest(TestCase):
+    def test_chunks_are_bounded_and_keep_page_provenance(self):
+        pages = [(1, "short one"), (2, "short two"), (3, ""), (4, "word " * 100)]
+        chunks = list(chunk_pages(pages, max_chars=120))
+        assert all(len(c["text"]) <= 120 for c in chunks)
+        assert (chunks[0]["page_start"], chunks[0]["page_end"]) == (1, 2)
+        assert chunks[0]["text"] == "short one\n\nshort two"
+        assert all(c["page_start"] == 4 for c in chunks[1:])
+
+    def test_chunk_ids_depend_on_file_and_page(self):
+        chunks = [{"page_start": 1}, {"page_start": 1}, {"page_start": 3}]
+        ids = [i for i, _ in pdf_chunk_ids(chunks, "faq.pdf")]
+        assert [i.split("_", 3)[3] for i in ids] == ["p1_1", "p1_2", "p3_1"]
+        assert [i for i, _ in pdf_chunk_ids(chunks[2:], "faq.pdf")] == ids[2:]  # earlier pages do not shift ids
+        assert not set(ids) & {i for i, _ in pdf_chunk_ids(chunks, "returns.pdf")}
+
+
+class PdfIngestTest(TestCase):
+    def setUp(self):
+        invalidate_index()
+        self.path = _make_pdf([f"Answer {n}: " + "lorem ipsum " * 40 for n in range(1, 7)])
+
+    @override_settings(PDF_PARALLEL_MIN_PAGES=1, PDF_PAGES_PER_TASK=2)
+    def test_parallel_extraction_matches_serial(self):
+        parallel = ingest_pdf(self.path, MockAdapter(), workers=2, max_chars=300)
+        texts = list(FAQChunk.objects.order_by("id").values_list("heading", "text"))
+        assert parallel["pages"] == 6 and parallel["pages_per_sec"] > 0
+        assert parallel["rows"] == len(texts) > 6  # pages were split, not one chunk per page
+        assert all(len(t) <= 300 for _, t in texts)
+
+        serial = ingest_pdf(self.path, MockAdapter(), workers=1, max_chars=300)
+        assert serial["rows"] == parallel["rows"] and serial["unchanged"] == serial["rows"]
+        assert FAQChunk.objects.get(id__endswith="_p1_1").heading == "Page 1"
+
+        other = ingest_pdf(self.path, MockAdapter(), workers=1, max_chars=300, source_name="returns.pdf")
+        assert other["inserted"] == other["rows"]  # a second PDF never overwrites the first
+        assert FAQChunk.objects.count() == 2 * serial["rows"]
+
+    def tearDown(self):
+        os.remove(self.path)
+        FAQChunk.objects.all().delete()
+        EmbeddingVector.objects.all().delete()
+        invalidate_index()
@@ -0,0 +1,77 @@
+import os
+import tempfile
+
+import numpy as np
+from django.test import TestCase, override_settings
+
+from productcatalogue.adapters import MockAdapter
+
+from productcatalogue.index import VectorIndex, get_index, invalidate_index
+from productcatalogue.ingest import run_ingestion
+from productcatalogue.models import FAQChunk, EmbeddingVector
+from productcatalogue.quantize import ScalarQuantizer
+from productcatalogue.utils import store_faq_chunks_and_embeddings
+
+
+def _index(vectors):
+    n = len(vectors)
+    return VectorIndex([f"v{i}" for i in range(n)], ["faq"] * n, [str(i) for i in range(n)], [""] * n,
+                       VectorIndex.normalize(vectors))
+
+
+class ScalarQuantizerTest(TestCase):
+    def test_codes_approximate_scores(self):
+        rng = np.random.default_rng(1)
+        matrix = VectorIndex.normalize(rng.normal(size=(300, 32)))
+        quant = ScalarQuantizer.train(matrix)
+        assert quant.codes.dtype == np.int8
+        assert np.abs(quant.decode(quant.codes) - matrix).max() <= quant.step.max() / 2 + 1e-6
+        q = matrix[0]
+        assert np.abs(quant.scores(q) - matrix @ q).max() < 0.05
+
+    def test_rescored_search_returns_exact_scores(self):
+        rng = np.random.default_rng(2)
+        idx = _index(rng.normal(size=(500, 16)))
+        idx.quant = ScalarQuantizer.train(idx.matrix)
+        q = rng.normal(size=16)
+        exact = idx.search(q, k=5, threshold=-1.0, exact=True)
+        approx = idx.search(q, k=5, threshold=-1.0, rescore=50)
+        assert [r['id'] for r in approx] == [r['id'] for r in exact]
+        assert np.allclose([r['score'] for r in approx], [r['score'] for r in exact])
+        assert idx.memory_report()['savings_pct'] > 70
+
+    def test_inserts_are_encoded(self):
+        rng = np.random.default_rng(3)
+        idx = _index(rng.normal(size=(100, 8)))
+        idx.quant = ScalarQuantizer.train(idx.matrix)
+        new_vec = rng.normal(size=8)
+        updated = idx.with_upserts([{'id': 'new', 'source': 'faq', 'source_obj_id': 'new', 'text': '', 'vector': new_vec}], 1)
+        assert updated.quant.codes.shape == (101, 8)
+        assert updated.search(new_vec, k=1, rescore=10)[0]['id'] == 'new'
+
+    @override_settings(VECTOR_INDEX_QUANTIZATION="int8", QUANT_MIN_VECTORS=50)
+    def test_quantization_enabled_by_setting_above_min_size(self):
+        invalidate_index()
+        rng = np.random.default_rng(4)
+        chunks = [{'id': str(i), 'heading': '', 'text': f"t{i}"} for i in range(60)]
+        store_faq_chunks_and_embeddings(chunks, rng.normal(size=(60, 8)))
+        assert get_index().quant.codes.shape == (60, 8)
+        FAQChunk.objects.all().delete()
+        EmbeddingVector.objects.all().delete()
+        invalidate_index()
+
+    @override_settings(VECTOR_INDEX_QUANTIZATION="int8")
+    def test_ingest_reports_index_memory_only_for_the_numpy_store(self):
+        fd, path = tempfile.mkstemp(suffix=".md")
+        with os.fdopen(fd, "w") as fh:
+            fh.write("# Shipping\nWe ship worldwide.\n")
+        uploads = {"faq.md": {"name": "faq.md", "path": path}}
+        try:
+            with override_settings(VECTOR_STORE="sql"):
+                assert "vector_index" not in run_ingestion(uploads, MockAdapter())
+            assert "float32_mb" in run_ingestion(uploads, MockAdapter())["vector_index"]
+        finally:
+            os.remove(path)
+            FAQChunk.objects.all().delete()
+            EmbeddingVector.objects.all().delete()
+            invalidate_index()
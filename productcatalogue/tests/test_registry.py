@@ -0,0 +1,37 @@
+from django.test import TestCase, override_settings
+
+from productcatalogue import registry
+from productcatalogue.adapters import MockAdapter, OpenAIAdapter
+from productcatalogue.index import invalidate_index
+
+
+class RegistryTest(TestCase):
+    def setUp(self):
+        registry.reset()
+        invalidate_index()
+
+    @override_settings(OPENAI_API_KEY="")
+    def test_adapter_is_shared(self):
+        adapter = registry.get_adapter()
+        assert isinstance(adapter, MockAdapter)
+        assert registry.get_adapter() is adapter
+
+    @override_settings(OPENAI_API_KEY="k1", OPENAI_BASE_URL="http://127.0.0.1:9/v1")
+    def test_openai_adapters_share_http_pool(self):
+        first = registry.get_adapter()
+        assert isinstance(first, OpenAIAdapter)
+        with self.settings(OPENAI_API_KEY="k2"):
+            second = registry.get_adapter()
+        assert second is not first
+        assert first.client._client is second.client._client is registry.get_http_client()
+
+    @override_settings(OPENAI_API_KEY="")
+    def test_health_endpoint(self):
+        body = self.client.get("/api/health/").json()
+        assert body["status"] == "ok"
+        assert body["adapter"] == "MockAdapter" and body["vector_store"] == "numpy"
+        assert body["vectors"] == 0
+
+    def tearDown(self):
+        registry.reset()
+        invalidate_index()
@@ -1,8 +1,11 @@
+import numpy as np
 import pytest
 from productcatalogue.adapters import MockAdapter
 from productcatalogue.utils import chunk_faq_markdown, store_product_and_embeddings, store_faq_chunks_and_embeddings, retrieve_top_k
 from productcatalogue.models import Product, FAQChunk, EmbeddingVector
-from django.test import TestCase
+from productcatalogue.index import invalidate_index
+from productcatalogue.index import VectorIndex
+from django.test import TestCase, override_settings
 
 class RerankerTest(TestCase):
     def setUp(self):
@@ -30,7 +33,35 @@ class RerankerTest(TestCase):
         ids = [t['id'] for t in top]
         assert any(i.startswith('p_') for i in ids)
 
+    def test_weights_steer_the_rerank(self):
+        q = "Lost Words"
+        qvec = self.adapter.get_embeddings([q])[0]
+        with override_settings(RERANK_WEIGHTS={'cosine': 0.0, 'lexical': 1.0, 'popularity': 0.0}):
+            assert retrieve_top_k(qvec, k=1, threshold=-1.0, query_text=q)[0]['id'] == 'p_07'
+        with override_settings(RERANK_WEIGHTS={'cosine': 0.0, 'lexical': 0.0, 'popularity': 1.0}):
+            top = retrieve_top_k(qvec, k=3, threshold=-1.0, query_text=q)
+            assert top[0]['id'] == 'p_12' and top[0]['popularity'] == 1.0
+            assert top[-1]['id'] == 'f_02'
+
+    def test_stage_timings(self):
+        timings = {}
+        q = "Rise Again"
+        retrieve_top_k(self.adapter.get_embeddings([q])[0], k=2, query_text=q, timings=timings)
+        assert {'candidates_ms', 'lexical_ms', 'fusion_ms', 'rerank_ms', 'total_ms'} <= set(timings)
+
+    def test_partial_selection_matches_full_sort(self):
+        rng = np.random.default_rng(0)
+        items = [
+            {'id': str(i), 'source': 'faq', 'source_obj_id': str(i), 'text': '', 'vector': rng.normal(size=8)}
+            for i in range(500)
+        ]
+        index = VectorIndex.from_items(items)
+        q = rng.normal(size=8)
+        expected = np.argsort(-(index.matrix @ (q / np.linalg.norm(q))))[:10]
+        assert [r['id'] for r in index.search(q, k=10, threshold=-1.0)] == [str(i) for i in expected]
+
     def tearDown(self):
         Product.objects.all().delete()
         FAQChunk.objects.all().delete()
         EmbeddingVector.objects.all().delete()
+        invalidate_index()
@@ -0,0 +1,72 @@
+import tempfile
+
+import numpy as np
+from django.test import TestCase, override_settings
+
+from productcatalogue import index, snapshot
+from productcatalogue.models import FAQChunk, EmbeddingVector
+from productcatalogue.utils import store_faq_chunks_and_embeddings, retrieve_top_k
+
+
+class SnapshotTest(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.override = override_settings(VECTOR_INDEX_STORAGE="mmap", VECTOR_SNAPSHOT_DIR=self.tmp.name)
+        self.override.enable()
+        index._index = None
+        store_faq_chunks_and_embeddings([{'id':'1','heading':'h','text':'a'}], [[1.0, 0.0]])
+
+    def test_index_is_memory_mapped(self):
+        idx = index.get_index()
+        assert isinstance(idx.matrix, np.memmap)
+        assert idx.version == snapshot.current_generation(self.tmp.name) == 1
+
+    def test_writer_publishes_new_generation(self):
+        index.get_index()
+        store_faq_chunks_and_embeddings([{'id':'2','heading':'h','text':'b'}], [[0.0, 1.0]])
+        assert snapshot.current_generation(self.tmp.name) == 2
+
+        # Simulate another worker that only sees the published files.
+        index._index = None
+        assert [t['id'] for t in retrieve_top_k([0.0, 1.0], k=1)] == ['f_2']
+        assert len(index.get_index()) == 2
+
+    def test_unchanged_reingest_does_not_publish(self):
+        index.get_index()
+        generation = snapshot.current_generation(self.tmp.name)
+        store_faq_chunks_and_embeddings([{'id':'1','heading':'h','text':'a'}], [[1.0, 0.0]])
+        assert snapshot.current_generation(self.tmp.name) == generation
+
+    def test_batched_store_publishes_once(self):
+        index.get_index()
+        generation = snapshot.current_generation(self.tmp.name)
+        chunks = [{'id': str(i), 'heading': 'h', 'text': f't{i}'} for i in range(2, 8)]
+        store_faq_chunks_and_embeddings(chunks, [[0.0, 1.0]] * len(chunks), batch_size=2)
+        assert snapshot.current_generation(self.tmp.name) == generation + 1
+        index._index = None
+        assert len(index.get_index()) == 7
+
+    def test_load_retries_a_pruned_generation(self):
+        index.get_index()
+        stale = snapshot.current_generation(self.tmp.name)
+        for i in range(2, 2 + snapshot.KEEP_GENERATIONS):
+            store_faq_chunks_and_embeddings([{'id': str(i), 'heading': 'h', 'text': 'b'}], [[0.0, 1.0]])
+        loaded = snapshot.load_snapshot(self.tmp.name, stale)
+        assert loaded.version == snapshot.current_generation(self.tmp.name) > stale
+        assert len(loaded) == 1 + snapshot.KEEP_GENERATIONS
+
+    @override_settings(VECTOR_INDEX_QUANTIZATION="int8", QUANT_MIN_VECTORS=1)
+    def test_int8_codes_are_published_with_the_snapshot(self):
+        index.invalidate_index()
+        codes = index.get_index().quant.codes
+        index._index = None
+        loaded = snapshot.load_snapshot(self.tmp.name, snapshot.current_generation(self.tmp.name))
+        assert isinstance(loaded.quant.codes, np.memmap)
+        assert np.array_equal(loaded.quant.codes, codes)
+
+    def tearDown(self):
+        FAQChunk.objects.all().delete()
+        EmbeddingVector.objects.all().delete()
+        index._index = None
+        self.override.disable()
+        self.tmp.cleanup()
@@ -0,0 +1,40 @@
+import importlib
+import json
+
+import numpy as np
+from django.apps import apps
+from django.test import TestCase
+
+from productcatalogue.index import invalidate_index
+from productcatalogue.models import FAQChunk, EmbeddingVector
+from productcatalogue.utils import pack_vector, unpack_vector, load_all_vectors, store_faq_chunks_and_embeddings
+
+backfill = importlib.import_module('productcatalogue.migrations.0002_embeddingvector_vector_blob')
+
+
+class VectorStorageTest(TestCase):
+    def test_pack_roundtrip(self):
+        blob = pack_vector([0.5, -1.25, 3.0])
+        assert len(blob) == 12
+        assert unpack_vector(blob).tolist() == [0.5, -1.25, 3.0]
+
+    def test_store_writes_binary_column(self):
+        store_faq_chunks_and_embeddings([{'id':'1','heading':'h','text':'t'}], [[1.0, 2.0]], model='mock')
+        ev = EmbeddingVector.objects.get(id='f_1')
+        assert ev.vector == ''
+        assert ev.dim == 2 and ev.embedding_model == 'mock'
+        assert unpack_vector(bytes(ev.vector_blob)).tolist() == [1.0, 2.0]
+
+    def test_legacy_json_rows_are_read_and_backfilled(self):
+        EmbeddingVector.objects.create(id='f_old', source='faq', source_obj_id='old', text='t', vector=json.dumps([0.1, 0.2]))
+        assert np.allclose(load_all_vectors()[0]['vector'], [0.1, 0.2])
+
+        backfill.pack_json_vectors(apps, None)
+        ev = EmbeddingVector.objects.get(id='f_old')
+        assert ev.vector == '' and ev.dim == 2
+        assert np.allclose(unpack_vector(bytes(ev.vector_blob)), [0.1, 0.2])
+
+    def tearDown(self):
+        FAQChunk.objects.all().delete()
+        EmbeddingVector.objects.all().delete()
+        invalidate_index()
@@ -0,0 +1,95 @@
+import unittest
+import uuid
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from productcatalogue.index import invalidate_index
+from productcatalogue.lexical import get_lexical_index
+from productcatalogue.models import FAQChunk, EmbeddingVector
+from productcatalogue.utils import store_faq_chunks_and_embeddings, retrieve_top_k
+from productcatalogue.vectorstores import ChromaBatchWriter, ChromaVectorStore, get_vector_store
+
+try:
+    import chromadb
+except ImportError:
+    chromadb = None
+
+CHUNKS = [{'id':'1','heading':'h','text':'shipping'}, {'id':'2','heading':'h','text':'returns'}]
+VECTORS = [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]]
+
+
+class VectorStoreTest(TestCase):
+    def setUp(self):
+        invalidate_index()
+
+    @override_settings(VECTOR_STORE="sql")
+    def test_sql_store(self):
+        assert get_vector_store().name == "sql"
+        store_faq_chunks_and_embeddings(CHUNKS, VECTORS)
+        assert EmbeddingVector.objects.count() == 2
+        assert retrieve_top_k([0.0, 1.0, 0.0], k=1)[0]['id'] == 'f_2'
+
+    def test_numpy_store_is_default(self):
+        assert get_vector_store().name == "numpy"
+        store_faq_chunks_and_embeddings(CHUNKS, VECTORS)
+        assert get_vector_store().count() == 2
+
+    @unittest.skipIf(chromadb is None, "chromadb not installed")
+    def test_chroma_store(self):
+        collection = chromadb.EphemeralClient().create_collection(
+            f"test_{uuid.uuid4().hex}", metadata={"hnsw:space": "cosine"}
+        )
+        store = ChromaVectorStore(collection)
+        items = [
+            {'id': f"f_{c['id']}", 'source': 'faq', 'source_obj_id': c['id'], 'text': c['text'], 'vector': v}
+            for c, v in zip(CHUNKS, VECTORS)
+        ]
+        store.upsert(items, model="mock")
+        store.upsert(items[:1], model="mock")
+        assert store.count() == 2
+        top = store.query([0.0, 1.0, 0.0], k=1)
+        assert top[0]['id'] == 'f_2' and top[0]['source'] == 'faq'
+        assert abs(top[0]['score'] - 1.0) < 1e-5
+        assert sorted(store.iter_documents(page_size=1)) == [('f_1', 'faq', '1', 'shipping'), ('f_2', 'faq', '2', 'returns')]
+
+    def test_chroma_batch_writer_reports_failed_batches(self):
+        class FlakyCollection:
+            def __init__(self):
+                self.calls = []
+
+            def upsert(self, ids, embeddings, documents, metadatas):
+                self.calls.append(list(ids))
+                if len(self.calls) == 2:
+                    raise RuntimeError("disk full")
+
+        collection = FlakyCollection()
+        with ChromaBatchWriter(collection, batch_size=2) as writer:
+            for n in range(5):
+                writer.add(f"f_{n}", [float(n)], "text", {'source': 'faq'})
+        report = writer.report()
+        assert collection.calls == [["f_0", "f_1"], ["f_2", "f_3"], ["f_4"]]
+        assert report['written'] == 3 and report['batches'] == 3
+        assert report['failures'] == [{'batch': 1, 'first_id': 'f_2', 'rows': 2, 'error': 'disk full'}]
+        assert report['failed_ids'] == ['f_2', 'f_3']
+
+    @override_settings(CHROMA_WRITE_BATCH_SIZE=1)
+    def test_failed_chroma_rows_stay_out_of_the_lexical_index(self):
+        class RejectingCollection:
+            def get(self, ids, include):
+                return {'ids': [], 'documents': [], 'embeddings': []}
+
+            def upsert(self, ids, embeddings, documents, metadatas):
+                if 'f_2' in ids:
+                    raise RuntimeError("disk full")
+
+        get_lexical_index()
+        with mock.patch("productcatalogue.utils.get_vector_store", return_value=ChromaVectorStore(RejectingCollection())):
+            report = store_faq_chunks_and_embeddings(CHUNKS, VECTORS)
+        assert [f['first_id'] for f in report['write_failures']] == ['f_2']
+        assert [r['id'] for r in get_lexical_index().search('shipping returns')] == ['f_1']
+
+    def tearDown(self):
+        FAQChunk.objects.all().delete()
+        EmbeddingVector.objects.all().delete()
+        invalidate_index()
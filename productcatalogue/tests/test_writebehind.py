@@ -0,0 +1,98 @@
+import threading
+import time
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from productcatalogue import registry
+from productcatalogue.adapters import MockAdapter
+from productcatalogue.chat import answer_batch
+from productcatalogue.index import invalidate_index
+from productcatalogue.models import EmbeddingVector, FAQChunk, QueryLog
+from productcatalogue.utils import store_faq_chunks_and_embeddings
+from productcatalogue.writebehind import WriteBehindQueue, get_write_behind
+
+QUESTION = "Is it waterproof?"
+
+
+class WriteBehindQueueTest(TestCase):
+    def test_full_queue_drops_after_put_timeout(self):
+        written = []
+        q = WriteBehindQueue({'log': written.extend}, maxsize=2, put_timeout=0.01, background=False)
+        assert [q.submit('log', n) for n in range(3)] == [True, True, False]
+        assert q.flush() == 2
+        assert written == [0, 1]
+        assert q.stats() == {'queued': 0, 'submitted': 2, 'written': 2, 'dropped': 1, 'failed': 0}
+
+    def test_background_worker_writes_batches_and_counts_failures(self):
+        batches, done = [], threading.Event()
+
+        def handler(records):
+            batches.append(list(records))
+            done.set()
+
+        def broken(records):
+            raise RuntimeError("db down")
+
+        q = WriteBehindQueue({'log': handler, 'broken': broken}, batch_size=10)
+        with mock.patch("productcatalogue.writebehind.close_old_connections") as close_old:
+            q.submit('broken', 'x')
+            q.submit('log', 'a')
+            assert done.wait(5)
+            q.close()
+        assert sum(batches, []) == ['a']
+        assert q.stats()['failed'] == 1
+        assert close_old.called  # stale connections are dropped before each batch
+
+    def test_counters_are_exact_under_concurrent_submits(self):
+        q = WriteBehindQueue({'log': lambda records: None}, maxsize=0, background=False)
+        threads = [threading.Thread(target=lambda: [q.submit('log', n) for n in range(500)]) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert q.stats()['submitted'] == 4000 and q.flush() == 4000
+
+
+@override_settings(OPENAI_API_KEY="", QUERY_LOG_ENABLED=True, WRITE_BEHIND_BACKGROUND=False)
+class QueryLogTest(TestCase):
+    def setUp(self):
+        registry.reset()
+        invalidate_index()
+        store_faq_chunks_and_embeddings(
+            [{'id': '1', 'heading': 'Waterproof', 'text': QUESTION}], MockAdapter().get_embeddings([QUESTION])
+        )
+
+    def test_chat_is_logged_only_when_the_queue_flushes(self):
+        resp = self.client.post(
+            "/api/chat/", {"messages": [{"role": "user", "content": QUESTION}]}, content_type="application/json"
+        )
+        assert resp.status_code == 200
+        assert QueryLog.objects.count() == 0
+        get_write_behind().flush()
+        log = QueryLog.objects.get()
+        assert log.question == QUESTION and log.citations == ["f_1"]
+        assert log.answer == resp.json()["answer"] and log.latency_ms >= 0
+
+    def test_batch_items_are_timed_separately(self):
+        original = MockAdapter.get_completion
+
+        def slow_first(adapter, messages, **kwargs):
+            if messages[-1]["content"] == "slow one?":
+                time.sleep(0.3)
+            return original(adapter, messages, **kwargs)
+
+        with mock.patch.object(MockAdapter, "get_completion", autospec=True, side_effect=slow_first):
+            answer_batch(MockAdapter(), [[{"role": "user", "content": q}] for q in ("slow one?", QUESTION)],
+                         max_workers=1)
+        get_write_behind().flush()
+        latency = dict(QueryLog.objects.values_list("question", "latency_ms"))
+        assert latency["slow one?"] >= 300
+        assert latency[QUESTION] < 300  # not charged for the item it queued behind
+
+    def tearDown(self):
+        registry.reset()
+        QueryLog.objects.all().delete()
+        FAQChunk.objects.all().delete()
+        EmbeddingVector.objects.all().delete()
+        invalidate_index()
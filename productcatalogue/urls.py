@@ -1,12 +1,18 @@
 from django.urls import path
 from django.views.decorators.csrf import csrf_exempt  
-from .views import UploadIngestView, EmbeddingsView, ChatView, home, upload_page ,GetDataView
+from .views import UploadIngestView, EmbeddingsView, ChatView, ChatBatchView, home, upload_page ,GetDataView, ProductListView, FAQListView, JobStatusView, HealthView, chat_async
 
 urlpatterns = [
     path('', home, name='home'),
     path('upload-data/', upload_page, name='upload_page'),
     path('api/get-data/', GetDataView.as_view(), name='get-data'),
+    path('products/', ProductListView.as_view(), name='products'),
+    path('faqs/', FAQListView.as_view(), name='faqs'),
     path('upload/', csrf_exempt(UploadIngestView.as_view()), name='upload'),
+    path('jobs/<uuid:job_id>/', JobStatusView.as_view(), name='job-status'),
+    path('health/', HealthView.as_view(), name='health'),
     path('embeddings/', csrf_exempt(EmbeddingsView.as_view()), name='embeddings'),
     path('chat/', csrf_exempt(ChatView.as_view()), name='chat'),
+    path('chat/async/', chat_async, name='chat-async'),
+    path('chat/batch/', csrf_exempt(ChatBatchView.as_view()), name='chat-batch'),
 ]
\ No newline at end of file
@@ -1,9 +1,20 @@
 import json
+import time
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+from django.conf import settings
 from django.db import transaction
 from typing import List, Dict
 
+from .answer_cache import invalidate_answers
+from .filters import get_attribute_index, invalidate_attribute_index, match_products, parse_longevity
+from .generation import bump_generation
+from .index import deferred_publish, get_index
+from .lexical import fuse_rrf, get_lexical_index, upsert_into_lexical_index
+from .rerank import rerank
+from .vectorstores import get_vector_store
+
+VECTOR_DTYPE = np.dtype('<f4')
+
 def chunk_faq_markdown(md_text: str, approx_k=1200):
     """
     Split markdown into ~approx_k char chunks by paragraphs/headers.
@@ -69,126 +80,331 @@ def _coerce_vector_to_list(vec):
         except Exception:
             return []
 
-def store_product_and_embeddings(products: List[Dict], vectors: List[List[float]]):
+def _coerce_vector_to_array(vec):
     """
-    Store product info + embedding vectors in the database.
-    Uses the SAME detailed text format as used during embedding generation
-    to ensure consistency between embedding and retrieved context.
+    Ensure embedding vector is a flat little-endian float32 numpy array.
+    Accepts list, tuple, numpy array. Returns an empty array on bad input.
+    """
+    try:
+        return np.asarray(vec, dtype=VECTOR_DTYPE).reshape(-1)
+    except Exception:
+        return np.asarray(_coerce_vector_to_list(vec), dtype=VECTOR_DTYPE)
+
+def pack_vector(vec) -> bytes:
+    """Pack a vector as raw little-endian float32 bytes for EmbeddingVector.vector_blob."""
+    return _coerce_vector_to_array(vec).tobytes()
+
+def unpack_vector(blob) -> np.ndarray:
+    """Zero-copy view of a packed vector (read-only, shares the blob's buffer)."""
+    return np.frombuffer(blob, dtype=VECTOR_DTYPE)
+
+PRODUCT_FIELDS = [
+    'name', 'notes', 'accords', 'price', 'longevity', 'longevity_min_hours', 'longevity_max_hours',
+    'season', 'image_url', 'popularity',
+]
+FAQ_FIELDS = ['heading', 'text']
+
+def _batched(seq, size):
+    for i in range(0, len(seq), size):
+        yield seq[i:i + size]
+
+def _product_stored_text(p):
+    price_display = f"${p.price:.2f}" if p.price is not None and p.price > 0 else "Price not available"
+    return (
+        f"Product name: {p.name}. "
+        f"Description: {p.notes}. "
+        f"Price: {price_display}. "
+        f"Features/Accords: {p.accords}. "
+        f"Longevity: {p.longevity}. "
+        f"Recommended season: {p.season}."
+    )
+
+def _upsert_batch(model_cls, fields, rows, store, model):
     """
-    from .models import Product, EmbeddingVector
+    Write one batch of (model instance, vector item) pairs.
+    Rows whose model fields, stored text and vector all match what is already
+    stored are skipped; the rest go through one bulk_create(update_conflicts=True)
+    plus one vector store write. Returns (inserted, updated, unchanged,
+    write_failures), the last being the store's per-batch failures, if any;
+    rows in a failed store batch are left out of the index refresh and the
+    lexical index.
+    """
+    rows = list({obj.pk: (obj, item) for obj, item in rows}.values())  # last one wins
+    existing = model_cls.objects.in_bulk([obj.pk for obj, _ in rows])
+    stored = store.fetch_existing([item['id'] for _, item in rows])
+
+    inserted = updated = unchanged = 0
+    write_objs, write_items, changed = [], [], []
+    for obj, item in rows:
+        old = existing.get(obj.pk)
+        obj_changed = old is None or any(getattr(obj, f) != getattr(old, f) for f in fields)
+        vec_changed = stored.get(item['id']) != (item['text'], item['vector'].tobytes())
+        if old is None:
+            inserted += 1
+        elif obj_changed or vec_changed:
+            updated += 1
+            changed.append(item['id'])
+        else:
+            unchanged += 1
+        if obj_changed:
+            write_objs.append(obj)
+        if vec_changed:
+            write_items.append(item)
+
+    generation = None
     with transaction.atomic():
-        for prod, vec in zip(products, vectors):
-            p, _ = Product.objects.update_or_create(
-                id=prod['id'],
-                defaults={
-                    'name': prod.get('name',''),
-                    'notes': prod.get('notes',''),
-                    'accords': prod.get('accords',''),
-                    'price': prod.get('price') or None,
-                    'longevity': prod.get('longevity',''),
-                    'season': prod.get('season',''),
-                    'image_url': prod.get('imageUrl',''),
-                    'popularity': prod.get('popularity') or 0.0,
-                }
+        if write_objs:
+            model_cls.objects.bulk_create(
+                write_objs, update_conflicts=True, unique_fields=['id'], update_fields=fields
             )
+            generation = bump_generation()
+        write_report = store.write(write_items, model=model) or {}
+    # Rows of a failed store batch keep their old vectors, so caches built
+    # from the store must not see the new text either.
+    failed = set(write_report.get('failed_ids', ()))
+    if failed:
+        write_items = [item for item in write_items if item['id'] not in failed]
+    if write_items or generation is not None:
+        store.refresh(write_items, generation)
+    if write_objs:
+        invalidate_attribute_index()
+    names = {item['id']: obj.name for obj, item in rows if item['source'] == 'product'}
+    upsert_into_lexical_index([dict(item, name=names.get(item['id'], '')) for item in write_items], generation)
+    invalidate_answers(changed)
+    return inserted, updated, unchanged, write_report.get('failures', [])
 
-            price_display = f"${p.price:.2f}" if p.price is not None and p.price > 0 else "Price not available"
-            stored_text = (
-                f"Product name: {p.name}. "
-                f"Description: {p.notes}. "
-                f"Price: {price_display}. "
-                f"Features/Accords: {p.accords}. "
-                f"Longevity: {p.longevity}. "
-                f"Recommended season: {p.season}."
-            )
+def _bulk_store(model_cls, fields, rows, model, batch_size, label):
+    """Run _upsert_batch over `rows` in batches and collect an ingest report."""
+    store = get_vector_store()
+    batch_size = batch_size or getattr(settings, "INGEST_BATCH_SIZE", 1000)
+    report = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'batches': [], 'write_failures': [], 'seconds': 0.0}
+    started = time.perf_counter()
+    with deferred_publish():
+        for batch in _batched(rows, batch_size):
+            t0 = time.perf_counter()
+            inserted, updated, unchanged, failures = _upsert_batch(model_cls, fields, batch, store, model)
+            report['inserted'] += inserted
+            report['updated'] += updated
+            report['unchanged'] += unchanged
+            report['write_failures'].extend(failures)
+            report['batches'].append({'rows': len(batch), 'seconds': round(time.perf_counter() - t0, 4)})
+    report['seconds'] = round(time.perf_counter() - started, 4)
+    print(
+        f"✅ Stored {label}: {report['inserted']} inserted, {report['updated']} updated, "
+        f"{report['unchanged']} unchanged in {len(report['batches'])} batches ({report['seconds']}s)"
+    )
+    return report
 
-            clean_vec = _coerce_vector_to_list(vec)
-            ev_id = f"p_{p.id}"
-            EmbeddingVector.objects.update_or_create(
-                id=ev_id,
-                defaults={
-                    'source': 'product',
-                    'source_obj_id': p.id,
-                    'text': stored_text,
-                    'vector': json.dumps(clean_vec)
-                }
-            )
+def store_product_and_embeddings(products: List[Dict], vectors: List[List[float]], model: str = "", batch_size=None):
+    """
+    Store product info + embedding vectors in the database.
+    Uses the SAME detailed text format as used during embedding generation
+    to ensure consistency between embedding and retrieved context.
+    Vectors go to the configured vector store (see vectorstores.py).
+    Rows are bulk-upserted in batches of INGEST_BATCH_SIZE; returns a report
+    with inserted/updated/unchanged counts and per-batch timings.
+    """
+    from .models import Product
+    rows = []
+    for prod, vec in zip(products, vectors):
+        longevity_min, longevity_max = parse_longevity(prod.get('longevity',''))
+        p = Product(
+            id=str(prod['id']),
+            name=prod.get('name',''),
+            notes=prod.get('notes',''),
+            accords=prod.get('accords',''),
+            price=prod.get('price') or None,
+            longevity=prod.get('longevity',''),
+            longevity_min_hours=longevity_min,
+            longevity_max_hours=longevity_max,
+            season=prod.get('season',''),
+            image_url=prod.get('imageUrl',''),
+            popularity=prod.get('popularity') or 0.0,
+        )
+        rows.append((p, {
+            'id': f"p_{p.id}",
+            'source': 'product',
+            'source_obj_id': p.id,
+            'text': _product_stored_text(p),
+            'vector': _coerce_vector_to_array(vec),
+        }))
+    return _bulk_store(Product, PRODUCT_FIELDS, rows, model, batch_size, "products")
 
-def store_faq_chunks_and_embeddings(chunks: List[Dict], vectors: List[List[float]]):
+def store_faq_chunks_and_embeddings(chunks: List[Dict], vectors: List[List[float]], model: str = "", batch_size=None):
     """
     Store FAQ chunks + embedding vectors in the database.
+    Vectors go to the configured vector store (see vectorstores.py).
+    Returns the same report as store_product_and_embeddings.
     """
-    from .models import FAQChunk, EmbeddingVector
-    with transaction.atomic():
-        for chunk, vec in zip(chunks, vectors):
-            fid = chunk.get('id')
-            FAQChunk.objects.update_or_create(
-                id=fid,
-                defaults={
-                    'heading': chunk.get('heading',''),
-                    'text': chunk.get('text','')
-                }
-            )
-            clean_vec = _coerce_vector_to_list(vec)
-            EmbeddingVector.objects.update_or_create(
-                id=f"f_{fid}",
-                defaults={
-                    'source': 'faq',
-                    'source_obj_id': fid,
-                    'text': chunk.get('text',''),
-                    'vector': json.dumps(clean_vec)
-                }
-            )
+    from .models import FAQChunk
+    rows = []
+    for chunk, vec in zip(chunks, vectors):
+        fid = str(chunk.get('id'))
+        f = FAQChunk(id=fid, heading=chunk.get('heading',''), text=chunk.get('text',''))
+        rows.append((f, {
+            'id': f"f_{fid}",
+            'source': 'faq',
+            'source_obj_id': fid,
+            'text': f.text,
+            'vector': _coerce_vector_to_array(vec),
+        }))
+    return _bulk_store(FAQChunk, FAQ_FIELDS, rows, model, batch_size, "FAQ chunks")
 
 def load_all_vectors():
     """
     Returns list of dicts: {id, source, source_obj_id, text, vector(np.array)}
+    Packed vectors are read with np.frombuffer; the JSON column is only parsed
+    for legacy rows that have no vector_blob yet.
     """
     from .models import EmbeddingVector
     items = []
-    for ev in EmbeddingVector.objects.all():
-        try:
-            vec_list = json.loads(ev.vector)
-            vec = np.array(vec_list, dtype=float)
-        except Exception:
+    rows = EmbeddingVector.objects.values_list(
+        'id', 'source', 'source_obj_id', 'text', 'vector_blob', 'vector'
+    )
+    for ev_id, source, source_obj_id, text, blob, legacy in rows.iterator(chunk_size=2000):
+        if blob:
+            vec = unpack_vector(blob)
+        else:
             try:
-                vec = np.array(ev.vector, dtype=float)
+                vec = np.array(json.loads(legacy), dtype=VECTOR_DTYPE)
             except Exception:
                 continue
         items.append({
-            'id': ev.id,
-            'source': ev.source,
-            'source_obj_id': ev.source_obj_id,
-            'text': ev.text,
+            'id': ev_id,
+            'source': source,
+            'source_obj_id': source_obj_id,
+            'text': text,
             'vector': vec
         })
     return items
 
-def retrieve_top_k(query_vector, k=8, threshold=0.35):
+def retrieve_top_k(query_vector, k=8, threshold=0.35, query_text=None, filters=None, timings=None):
     """
     Returns top_k embeddings above similarity threshold.
+    Queries the configured vector store; with the default "numpy" store this
+    scores against the resident index (see index.py), which is built once per
+    process and kept up to date by the store functions above.
+
+    `filters` (see filters.parse_filters) restricts product rows to products
+    matching every attribute filter before any scoring; FAQ rows pass through.
+
+    With `query_text` (and HYBRID_SEARCH_ENABLED) the vector candidates are
+    fused with a BM25 ranking of the same text (see lexical.py) by
+    reciprocal-rank fusion. Lexical matches are not subject to the threshold.
+
+    With RERANK_ENABLED the RERANK_CANDIDATES best candidates are rescored by
+    rerank.rerank() and `score` is the reranked score; otherwise it is the
+    cosine (or fused) score. Pass a dict as `timings` to get the time spent in
+    each stage in milliseconds.
     """
-    items = load_all_vectors()
-    if not items:
-        return []
+    timings = {} if timings is None else timings
+    stages = _StageTimer(timings)
+    store = get_vector_store()
+    product_ids = match_products(filters) if filters else None
+    if filters:
+        stages.lap('filter_ms')
+
+    depth = _candidate_depth(k, _use_hybrid(query_text))
+    results = store.query(query_vector, k=depth, threshold=threshold, product_ids=product_ids)
+    stages.lap('candidates_ms')
+    results = _second_stage(store, results, query_vector, query_text, k, depth, product_ids, stages)
+    stages.finish()
+    return results
 
-    mats = np.vstack([it['vector'] for it in items])
-    qv = np.array(query_vector).reshape(1, -1)
-    cos = cosine_similarity(qv, mats).flatten()
 
-    filtered_idx = [i for i, s in enumerate(cos) if s >= threshold]
-    if not filtered_idx:
+def retrieve_top_k_batch(query_vectors, k=8, threshold=0.35, query_texts=None, filters=None, timings=None):
+    """
+    retrieve_top_k for many queries at once. The candidate stage scores the
+    whole query matrix against the index with one matrix product per block
+    of queries (VectorStore.query_batch); fusion and reranking then run per
+    query on the small candidate sets. Returns one result list per query, in
+    order; `timings` accumulates stage totals over all queries.
+    """
+    timings = {} if timings is None else timings
+    stages = _StageTimer(timings)
+    query_vectors = list(query_vectors)
+    query_texts = list(query_texts) if query_texts is not None else [None] * len(query_vectors)
+    if not query_vectors:
         return []
+    store = get_vector_store()
+    product_ids = match_products(filters) if filters else None
+    if filters:
+        stages.lap('filter_ms')
 
-    sorted_idx = sorted(filtered_idx, key=lambda i: -cos[i])[:k]
-    results = []
-    for idx in sorted_idx:
-        it = items[idx]
-        results.append({
-            'id': it['id'],
-            'source': it['source'],
-            'source_obj_id': it['source_obj_id'],
-            'text': it['text'],
-            'score': float(cos[idx])
-        })
+    depth = _candidate_depth(k, any(_use_hybrid(t) for t in query_texts))
+    candidates = store.query_batch(query_vectors, k=depth, threshold=threshold, product_ids=product_ids)
+    stages.lap('candidates_ms')
+    results = [
+        _second_stage(store, results, qv, text, k, depth, product_ids, stages)
+        for results, qv, text in zip(candidates, query_vectors, query_texts)
+    ]
+    stages.finish()
     return results
+
+
+class _StageTimer:
+    """Adds the milliseconds since the previous lap to timings[name]."""
+
+    def __init__(self, timings):
+        self.timings = timings
+        self.started = self.stage = time.perf_counter()
+
+    def lap(self, name):
+        now = time.perf_counter()
+        self.timings[name] = round(self.timings.get(name, 0.0) + (now - self.stage) * 1000, 3)
+        self.stage = now
+
+    def finish(self):
+        self.timings['total_ms'] = round((time.perf_counter() - self.started) * 1000, 3)
+
+
+def _use_hybrid(query_text):
+    return bool(query_text) and getattr(settings, "HYBRID_SEARCH_ENABLED", True)
+
+
+def _candidate_depth(k, hybrid):
+    if getattr(settings, "RERANK_ENABLED", True):
+        return max(k, getattr(settings, "RERANK_CANDIDATES", 50))
+    if hybrid:
+        return max(k, getattr(settings, "HYBRID_CANDIDATES", 50))
+    return k
+
+
+def _second_stage(store, results, query_vector, query_text, k, depth, product_ids, stages):
+    """BM25 fusion and reranking of one query's vector candidates."""
+    use_rerank = getattr(settings, "RERANK_ENABLED", True)
+    if _use_hybrid(query_text):
+        lexical = get_lexical_index().search(query_text, k=depth)
+        if product_ids is not None:
+            lexical = [r for r in lexical if r['source'] != 'product' or r['source_obj_id'] in product_ids]
+        stages.lap('lexical_ms')
+        results = fuse_rrf(
+            {"vector": results, "lexical": lexical},
+            k=depth if use_rerank else k,
+            rrf_k=getattr(settings, "RRF_K", 60),
+        )
+        stages.lap('fusion_ms')
+
+    if use_rerank:
+        results = rerank(
+            results, query_vector, query_text, k=k,
+            index=get_index() if store.name == "numpy" else None,
+            attributes=get_attribute_index(),
+        )
+        stages.lap('rerank_ms')
+        return results
+    return results[:k]
+
+
+async def aretrieve_top_k(query_vector, k=8, threshold=0.35, query_text=None, filters=None, timings=None):
+    """
+    Async retrieve_top_k for the ASGI chat view. The scan (and a first-use
+    index build) runs in a worker thread so it never blocks the event loop.
+    It reads the database, so it runs thread-sensitive like every other ORM
+    call: one-off executor threads would each open a connection that
+    request_finished never closes.
+    """
+    from asgiref.sync import sync_to_async
+    return await sync_to_async(retrieve_top_k)(
+        query_vector, k=k, threshold=threshold, query_text=query_text, filters=filters, timings=timings
+    )
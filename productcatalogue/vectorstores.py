@@ -0,0 +1,326 @@
+"""
+Vector store backends. Exactly one is active per deployment (VECTOR_STORE):
+
+    "sql"    EmbeddingVector table, scanned from the database on every query
+    "numpy"  EmbeddingVector table + resident in-process index (index.py)
+    "chroma" Chroma collection on disk, queried through its HNSW index
+
+Store functions in utils.py write through write()/refresh() and retrieve_top_k
+reads through query(), so nothing else needs to know which backend is active.
+"""
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+
+from .index import VectorIndex, get_index, upsert_into_index
+
+
+class VectorStore:
+    """
+    Interface every backend implements. `items` are dicts with
+    id, source, source_obj_id, text and vector keys.
+    """
+
+    name = ""
+
+    def write(self, items, model=""):
+        """
+        Persist items; may run inside the caller's database transaction.
+        Stores that write in several independent batches return a write
+        report with per-batch `failures` (see ChromaBatchWriter); None means
+        everything was written or an exception was raised.
+        """
+        raise NotImplementedError
+
+    def refresh(self, items, generation=None):
+        """
+        Called after the caller's transaction has finished writing `items`;
+        `generation` is the ingest generation that transaction bumped to, if any.
+        """
+
+    def fetch_existing(self, ids):
+        """
+        Return {id: (text, float32 vector bytes)} for the ids already stored,
+        so callers can skip rewriting unchanged rows. {} means "unknown".
+        """
+        return {}
+
+    def iter_documents(self):
+        """Yield (id, source, source_obj_id, text) for every stored row (builds the BM25 index)."""
+        from .models import EmbeddingVector
+        rows = EmbeddingVector.objects.values_list('id', 'source', 'source_obj_id', 'text')
+        return rows.iterator(chunk_size=2000)
+
+    def upsert(self, items, model=""):
+        with transaction.atomic():
+            self.write(items, model=model)
+        self.refresh(items)
+
+    def query(self, query_vector, k=8, threshold=0.35, product_ids=None):
+        """
+        Returns top_k {id, source, source_obj_id, text, score} above threshold.
+        `product_ids` (a set, see filters.py) limits product rows to those
+        products; FAQ rows are always eligible.
+        """
+        raise NotImplementedError
+
+    def query_batch(self, query_vectors, k=8, threshold=0.35, product_ids=None):
+        """query() for a list of vectors; stores with a resident matrix override this."""
+        return [self.query(qv, k=k, threshold=threshold, product_ids=product_ids) for qv in query_vectors]
+
+    def count(self):
+        raise NotImplementedError
+
+
+def _search(index, query_vector, k, threshold, product_ids):
+    rows = index.rows_for_products(product_ids) if product_ids is not None else None
+    return index.search(query_vector, k=k, threshold=threshold, rows=rows)
+
+
+def _search_batch(index, query_vectors, k, threshold, product_ids):
+    rows = index.rows_for_products(product_ids) if product_ids is not None else None
+    return index.search_batch(query_vectors, k=k, threshold=threshold, rows=rows)
+
+
+class SQLVectorStore(VectorStore):
+    """EmbeddingVector rows; no state is kept between queries."""
+
+    name = "sql"
+
+    UPDATE_FIELDS = ['source', 'source_obj_id', 'text', 'vector', 'vector_blob', 'dim', 'embedding_model']
+
+    def write(self, items, model=""):
+        from .models import EmbeddingVector
+        if not items:
+            return
+        rows = []
+        for it in items:
+            vec = np.asarray(it['vector'], dtype='<f4').reshape(-1)
+            rows.append(EmbeddingVector(
+                id=it['id'],
+                source=it['source'],
+                source_obj_id=it['source_obj_id'],
+                text=it['text'],
+                vector='',
+                vector_blob=vec.tobytes(),
+                dim=vec.shape[0],
+                embedding_model=model,
+            ))
+        EmbeddingVector.objects.bulk_create(
+            rows, update_conflicts=True, unique_fields=['id'], update_fields=self.UPDATE_FIELDS
+        )
+
+    def fetch_existing(self, ids):
+        from .models import EmbeddingVector
+        rows = EmbeddingVector.objects.filter(id__in=ids).values_list('id', 'text', 'vector_blob')
+        return {vid: (text, bytes(blob)) for vid, text, blob in rows if blob}
+
+    def query(self, query_vector, k=8, threshold=0.35, product_ids=None):
+        from .utils import load_all_vectors
+        return _search(VectorIndex.from_items(load_all_vectors()), query_vector, k, threshold, product_ids)
+
+    def query_batch(self, query_vectors, k=8, threshold=0.35, product_ids=None):
+        from .utils import load_all_vectors
+        return _search_batch(VectorIndex.from_items(load_all_vectors()), query_vectors, k, threshold, product_ids)
+
+    def count(self):
+        from .models import EmbeddingVector
+        return EmbeddingVector.objects.count()
+
+
+class NumpyVectorStore(SQLVectorStore):
+    """EmbeddingVector rows plus the resident (or memory-mapped) index."""
+
+    name = "numpy"
+
+    def refresh(self, items, generation=None):
+        upsert_into_index(items, generation)
+
+    def query(self, query_vector, k=8, threshold=0.35, product_ids=None):
+        return _search(get_index(), query_vector, k, threshold, product_ids)
+
+    def query_batch(self, query_vectors, k=8, threshold=0.35, product_ids=None):
+        return _search_batch(get_index(), query_vectors, k, threshold, product_ids)
+
+    def count(self):
+        return len(get_index())
+
+
+class ChromaBatchWriter:
+    """
+    Buffers ids/embeddings/documents/metadatas and flushes them to a Chroma
+    collection with upsert() every `batch_size` rows, so each flush is one
+    Chroma transaction and re-uploaded ids replace instead of failing. An id
+    added twice before a flush keeps its last value. A failed flush is
+    recorded in report()["failures"], its ids in report()["failed_ids"], and
+    the writer carries on.
+    """
+
+    def __init__(self, collection, batch_size=256):
+        self.collection = collection
+        self.batch_size = max(1, batch_size)
+        self.written = 0
+        self.batches = 0
+        self.failures = []
+        self.failed_ids = []
+        self.seconds = 0.0
+        self._buffer = {}  # id -> (embedding, document, metadata), insertion ordered
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+
+    def add(self, id, embedding, document, metadata):
+        self._buffer.pop(id, None)
+        self._buffer[id] = (embedding, document, metadata)
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        ids = list(self._buffer)
+        embeddings, documents, metadatas = zip(*self._buffer.values())
+        self._buffer = {}
+        started = time.perf_counter()
+        try:
+            self.collection.upsert(
+                ids=ids, embeddings=list(embeddings), documents=list(documents), metadatas=list(metadatas)
+            )
+            self.written += len(ids)
+        except Exception as e:
+            self.failures.append({'batch': self.batches, 'first_id': ids[0], 'rows': len(ids), 'error': str(e)})
+            self.failed_ids.extend(ids)
+        self.batches += 1
+        self.seconds += time.perf_counter() - started
+
+    def report(self):
+        return {
+            'written': self.written,
+            'batches': self.batches,
+            'failures': self.failures,
+            'failed_ids': self.failed_ids,
+            'seconds': round(self.seconds, 4),
+            'rows_per_sec': round(self.written / self.seconds, 1) if self.seconds else 0.0,
+        }
+
+
+class ChromaVectorStore(VectorStore):
+    """Chroma collection using cosine distance; score = 1 - distance."""
+
+    name = "chroma"
+
+    def __init__(self, collection=None):
+        self._collection = collection
+
+    @property
+    def collection(self):
+        if self._collection is None:
+            from .db import get_collection
+            self._collection = get_collection()
+        return self._collection
+
+    def write(self, items, model=""):
+        """Upsert through a ChromaBatchWriter (CHROMA_WRITE_BATCH_SIZE rows per call); returns its report."""
+        if not items:
+            return None
+        with ChromaBatchWriter(self.collection, getattr(settings, "CHROMA_WRITE_BATCH_SIZE", 256)) as writer:
+            for it in items:
+                writer.add(
+                    it['id'],
+                    np.asarray(it['vector'], dtype=float).reshape(-1).tolist(),
+                    it['text'],
+                    {'source': it['source'], 'source_obj_id': str(it['source_obj_id']), 'model': model},
+                )
+        report = writer.report()
+        print(
+            f"✅ Chroma upsert: {report['written']} rows in {report['batches']} batches "
+            f"({report['rows_per_sec']} rows/s, {len(report['failures'])} failed batches)"
+        )
+        return report
+
+    def fetch_existing(self, ids):
+        if not ids:
+            return {}
+        res = self.collection.get(ids=list(ids), include=['documents', 'embeddings'])
+        return {
+            vid: (doc, np.asarray(emb, dtype='<f4').tobytes())
+            for vid, doc, emb in zip(res['ids'], res['documents'], res['embeddings'])
+        }
+
+    def iter_documents(self, page_size=2000):
+        offset = 0
+        while True:
+            res = self.collection.get(include=['documents', 'metadatas'], limit=page_size, offset=offset)
+            if not res['ids']:
+                return
+            for vid, doc, meta in zip(res['ids'], res['documents'], res['metadatas']):
+                meta = meta or {}
+                yield vid, meta.get('source', ''), meta.get('source_obj_id', ''), doc or ''
+            offset += len(res['ids'])
+
+    def query(self, query_vector, k=8, threshold=0.35, product_ids=None):
+        where = None
+        if product_ids is not None:
+            where = {'$or': [
+                {'source': {'$ne': 'product'}},
+                {'source_obj_id': {'$in': sorted(product_ids) or ['']}},
+            ]}
+        try:
+            res = self.collection.query(
+                query_embeddings=[np.asarray(query_vector, dtype=float).reshape(-1).tolist()],
+                n_results=k,
+                where=where,
+                include=['documents', 'metadatas', 'distances'],
+            )
+        except Exception as e:
+            print(f"⚠️ Chroma query failed: {e}")
+            return []
+
+        results = []
+        for vid, doc, meta, dist in zip(res['ids'][0], res['documents'][0], res['metadatas'][0], res['distances'][0]):
+            score = 1.0 - float(dist)
+            if score < threshold:
+                continue
+            meta = meta or {}
+            results.append({
+                'id': vid,
+                'source': meta.get('source', ''),
+                'source_obj_id': meta.get('source_obj_id', ''),
+                'text': doc,
+                'score': score,
+            })
+        return results
+
+    def count(self):
+        return self.collection.count()
+
+
+VECTOR_STORES = {
+    'sql': SQLVectorStore,
+    'numpy': NumpyVectorStore,
+    'chroma': ChromaVectorStore,
+}
+
+_lock = threading.Lock()
+_stores = {}
+
+
+def get_vector_store():
+    """Return the process-wide store selected by settings.VECTOR_STORE."""
+    name = getattr(settings, "VECTOR_STORE", "numpy")
+    store = _stores.get(name)
+    if store is not None:
+        return store
+    if name not in VECTOR_STORES:
+        raise ImproperlyConfigured(f"Unknown VECTOR_STORE {name!r}; expected one of {sorted(VECTOR_STORES)}")
+    with _lock:
+        if name not in _stores:
+            _stores[name] = VECTOR_STORES[name]()
+        return _stores[name]
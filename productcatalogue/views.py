@@ -1,10 +1,7 @@
 # productcatalogue/views.py
+import json
 import os
-import io
-import csv
-import fitz  # PyMuPDF
-import PyPDF2  # kept if needed
-from chromadb import PersistentClient
+import time
 
 from rest_framework.views import APIView
 from rest_framework.response import Response
@@ -15,18 +12,17 @@ from rest_framework.parsers import MultiPartParser, FormParser
 
 from django.core.files.storage import FileSystemStorage
 from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_POST
 from django.shortcuts import render
 
-from .adapters import MockAdapter, OpenAIAdapter
-from .db import collection
-from .utils import (
-    chunk_faq_markdown,
-    chunk_plain_text,
-    store_product_and_embeddings,
-    store_faq_chunks_and_embeddings,
-    retrieve_top_k,
-)
-from .models import Product, FAQChunk
+from .chat import ChatError, aanswer, answer, answer_batch, astream_answer, stream_answer
+from .filters import parse_filters
+from .registry import get_adapter, health
+from .ingest import run_ingestion
+from .listing import ListingError, data_condition, ndjson_response, paginate, parse_fields, parse_limit
+from .jobs import enqueue, job_status
+from .models import Product, FAQChunk, IngestionJob
 
 
 def home(request):
@@ -37,24 +33,68 @@ def upload_page(request):
     return render(request, "upload.html")
 
 
+FAQ_LIST_FIELDS = ["id", "heading", "text"]
+
+
 @method_decorator(csrf_exempt, name="dispatch")
+@method_decorator(data_condition, name="get")
 class GetDataView(APIView):
+    """
+    GET -> {"products": [...], "faqs": [...]}, everything in one body.
+    With ?export=ndjson every product and FAQ row is streamed as one JSON
+    line tagged with "type". Prefer /api/products/ and /api/faqs/ for pages.
+    """
+
     permission_classes = [permissions.AllowAny]
 
     def get(self, request):
+        if request.query_params.get("export") == "ndjson":
+            return ndjson_response(
+                [
+                    ("product", Product.objects.all(), parse_fields(Product, None)),
+                    ("faq", FAQChunk.objects.all(), FAQ_LIST_FIELDS),
+                ],
+                "catalogue.ndjson",
+            )
         prods = list(Product.objects.all().values())
         faqs = list(FAQChunk.objects.all().values("id", "heading", "text"))
         return Response({"products": prods, "faqs": faqs})
 
 
-def get_adapter():
-    api_key = getattr(settings, "OPENAI_API_KEY", "")
-    if api_key:
-        print("✅ Using OpenAI Adapter")
-        return OpenAIAdapter(api_key)
-    else:
-        print("⚠️ Using Mock Adapter (no API key found)")
-        return MockAdapter()
+@method_decorator(data_condition, name="get")
+class DataListView(APIView):
+    """
+    GET ?limit=100&cursor=...&fields=id,name -> {"results": [...], "next_cursor"}.
+    ?export=ndjson streams every row (with the same fields) instead.
+    Responses carry an ETag / Last-Modified that only changes on ingest.
+    """
+
+    permission_classes = [permissions.AllowAny]
+    model = None
+    default_fields = None
+    export_name = ""
+
+    def get(self, request):
+        params = request.query_params
+        try:
+            fields = parse_fields(self.model, params.get("fields"), self.default_fields)
+            if params.get("export") == "ndjson":
+                return ndjson_response([(None, self.model.objects.all(), fields)], self.export_name)
+            page = paginate(self.model.objects.all(), fields, params.get("cursor"), parse_limit(params.get("limit")))
+        except ListingError as e:
+            return Response({"error": str(e)}, status=400)
+        return Response(page)
+
+
+class ProductListView(DataListView):
+    model = Product
+    export_name = "products.ndjson"
+
+
+class FAQListView(DataListView):
+    model = FAQChunk
+    default_fields = FAQ_LIST_FIELDS
+    export_name = "faqs.ndjson"
 
 
 @method_decorator(csrf_exempt, name="dispatch")
@@ -63,174 +103,40 @@ class UploadIngestView(APIView):
     POST files:
       - products.csv
       - faq.md or faq.pdf
+
+    Send async=true (form field or query param) to queue an ingestion job and
+    get its id back immediately; poll /api/jobs/<id>/ for progress.
     """
 
     parser_classes = (MultiPartParser, FormParser)
     permission_classes = [permissions.AllowAny]
 
     def post(self, request):
-        adapter = get_adapter()
-        results = {}
-
         try:
             # ------------------------
             # Step 0: Save uploaded files to MEDIA folder
             # ------------------------
             fs = FileSystemStorage(location=settings.MEDIA_ROOT)
-            saved_files = {}  # maps original upload key -> saved absolute path
+            uploads = {}  # maps original upload key -> {"name", "path"}
             for key, file in request.FILES.items():
                 # Save file to MEDIA_ROOT
                 saved_name = fs.save(file.name, file)
                 file_path = os.path.join(settings.MEDIA_ROOT, saved_name)
-                saved_files[key] = file_path
+                uploads[key] = {"name": file.name, "path": file_path}
                 print(f"📥 File saved to: {file_path}")
 
-            # ------------------------
-            # Handle PRODUCTS upload
-            # ------------------------
-            products_file = request.FILES.get("products.csv") or request.FILES.get("products")
-            if products_file:
-                print(f"📦 Detected product upload: {products_file.name}")
-                # If saved to disk, read from in-memory file for CSV decoding (works either way)
-                text = products_file.read().decode("utf-8")
-                reader = csv.DictReader(io.StringIO(text))
-                prods = []
-                texts = []
-                for row in reader:
-                    raw_price = row.get("price", 0)
-                    try:
-                        price = float(raw_price) if raw_price not in (None, "", "null", "NULL") else 0.0
-                    except (ValueError, TypeError):
-                        price = 0.0
-
-                    prod = {
-                        "id": row.get("id") or row.get("ID") or row.get("Id"),
-                        "name": row.get("name", ""),
-                        "notes": row.get("notes", ""),
-                        "accords": row.get("accords", ""),
-                        "price": price,
-                        "longevity": row.get("longevity", ""),
-                        "season": row.get("season", ""),
-                        "imageUrl": row.get("imageUrl", ""),
-                        "popularity": float(row.get("popularity", 0) or 0),
-                    }
-                    prods.append(prod)
-                    embed_text = (
-                        f"Product name: {prod['name']}. "
-                        f"Description: {prod['notes']}. "
-                        f"Price: ${price:.2f}. "
-                        f"Features/Accords: {prod['accords']}. "
-                        f"Longevity: {prod['longevity']}. "
-                        f"Recommended season: {prod['season']}."
-                    )
-                    texts.append((prod["id"], embed_text))
-
-                embed_texts = [t[1] for t in texts]
-                vectors = adapter.get_embeddings(embed_texts)
-                store_product_and_embeddings(prods, vectors)
-                results["products"] = len(prods)
-                print(f"✅ Stored {len(prods)} products successfully.")
+            if not uploads:
+                return Response({"detail": "No files provided"}, status=status.HTTP_400_BAD_REQUEST)
 
-            # ------------------------
-            # Handle FAQ upload (.md or .pdf)
-            # ------------------------
-            faq_file = None
-            faq_upload_key = None
-            for key, f in request.FILES.items():
-                if f.name.lower().endswith(".pdf") or key.lower().endswith(".pdf"):
-                    faq_file = f
-                    faq_upload_key = key
-                    print(f"📂 Detected PDF upload with key='{key}', filename='{f.name}'")
-                    break
-                elif f.name.lower().endswith(".md") or key.lower() in ["faq", "faq.md"]:
-                    faq_file = f
-                    faq_upload_key = key
-                    print(f"📄 Detected Markdown upload with key='{key}', filename='{f.name}'")
-                    break
-
-            # Ensure Chroma persistent client and collection
-            chroma_client = PersistentClient(path="chroma_db")
-            chroma_collection = chroma_client.get_or_create_collection("faq_collection")
-
-            if faq_file:
-                file_name = faq_file.name.lower()
-                # prefer using the saved file path (so we open file from disk)
-                file_path = saved_files.get(faq_upload_key)
-
-                # PDF branch
-                if file_name.endswith(".pdf"):
-                    print("🧾 Starting PDF processing (using fitz)...")
-
-                    # Open from saved file path when possible (more reliable)
-                    if file_path and os.path.exists(file_path):
-                        pdf = fitz.open(file_path)
-                    else:
-                        # fallback to file-like object
-                        pdf_bytes = faq_file.read()
-                        pdf = fitz.open(stream=pdf_bytes, filetype="pdf")
-
-                    chunks = []
-                    for page_num, page in enumerate(pdf):
-                        page_text = page.get_text("text") or ""
-                        text = page_text.strip()
-                        print(f"   → Extracted page {page_num + 1} with {len(text)} characters")
-                        if text:
-                            chunks.append({
-                                "id": f"faq_pdf_{page_num + 1}",
-                                "heading": f"Page {page_num + 1}",
-                                "text": text,
-                            })
-
-                    print(f"✅ Total extracted PDF characters: {sum(len(c['text']) for c in chunks)}")
-                    print(f"🧩 Created {len(chunks)} chunks from PDF")
-
-                    texts = [c["text"] for c in chunks]
-                    if texts:
-                        vectors = adapter.get_embeddings(texts)
-                        # vectors could be fallback vectors if API failed; still save
-                        for i, chunk in enumerate(chunks):
-                            try:
-                                chroma_collection.add(
-                                    documents=[chunk["text"]],
-                                    embeddings=[vectors[i]],
-                                    metadatas=[{"source": "pdf"}],
-                                    ids=[chunk["id"]]
-                                )
-                            except Exception as e:
-                                print(f"⚠️ Error saving chunk {chunk['id']} to ChromaDB: {e}")
-                        # persist into your DB tables as well
-                        store_faq_chunks_and_embeddings(chunks, vectors)
-                        results["faq_chunks"] = len(chunks)
-                        print(f"✅ Stored {len(chunks)} PDF chunks successfully.")
-                    else:
-                        print("⚠️ No text extracted from PDF.")
-
-                    # close pdf if applicable
-                    try:
-                        pdf.close()
-                    except Exception:
-                        pass
-
-                # Markdown branch
-                else:
-                    print("📘 Processing Markdown FAQ file...")
-                    md_text = faq_file.read().decode("utf-8")
-                    chunks = chunk_faq_markdown(md_text)
-                    print(f"🧩 Created {len(chunks)} chunks from Markdown")
-                    chunk_objs = []
-                    texts = []
-                    for i, (heading, chunk_text) in enumerate(chunks):
-                        cid = f"faq_{i + 1}"
-                        chunk_objs.append({"id": cid, "heading": heading, "text": chunk_text})
-                        texts.append(chunk_text)
-
-                    vectors = adapter.get_embeddings(texts)
-                    store_faq_chunks_and_embeddings(chunk_objs, vectors)
-                    results["faq_chunks"] = len(chunk_objs)
-                    print(f"✅ Stored {len(chunk_objs)} FAQ chunks successfully.")
-
-            else:
-                print("⚠️ No FAQ file (.md or .pdf) found in upload request.")
+            run_async = request.data.get("async") or request.query_params.get("async")
+            if str(run_async).lower() in ("1", "true", "yes"):
+                job = enqueue(uploads)
+                return Response(
+                    {"job_id": str(job.id), "status": job.status, "status_url": f"/api/jobs/{job.id}/"},
+                    status=status.HTTP_202_ACCEPTED,
+                )
+
+            results = run_ingestion(uploads, get_adapter())
 
             # ------------------------
             # Final response (always return something)
@@ -246,6 +152,25 @@ class UploadIngestView(APIView):
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class HealthView(APIView):
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        report = health()
+        code = status.HTTP_200_OK if report["status"] == "ok" else status.HTTP_503_SERVICE_UNAVAILABLE
+        return Response(report, status=code)
+
+
+class JobStatusView(APIView):
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, job_id):
+        job = IngestionJob.objects.filter(id=job_id).first()
+        if job is None:
+            return Response({"error": "job not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(job_status(job))
+
+
 @method_decorator(csrf_exempt, name="dispatch")
 class EmbeddingsView(APIView):
     permission_classes = [permissions.AllowAny]
@@ -261,48 +186,122 @@ class EmbeddingsView(APIView):
 
 @method_decorator(csrf_exempt, name="dispatch")
 class ChatView(APIView):
+    """
+    POST {"messages": [...], "mode": "fast"} -> {"answer", "citations"}.
+    Optional "filters" (see filters.py), e.g. {"price_max": 40, "season": "summer"},
+    restrict which products retrieval may return.
+    With "stream": true the response is text/event-stream: a `citations`
+    event, `token` events with the completion text, then `done` with timings.
+    """
+
     permission_classes = [permissions.AllowAny]
 
     def post(self, request):
+        started = time.perf_counter()
         data = request.data
         messages = data.get("messages", [])
         provided_context = data.get("context_snippets", [])
         mode = data.get("mode", "fast")
+        try:
+            filters = parse_filters(data.get("filters"))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
 
         adapter = get_adapter()
 
-        if provided_context:
-            resp = adapter.get_completion(
-                messages=messages, mode=mode, context_snippets=provided_context
+        if data.get("stream"):
+            if not provided_context and (not messages or "content" not in messages[-1]):
+                return Response({"error": "messages must include content"}, status=400)
+            response = StreamingHttpResponse(
+                stream_answer(adapter, messages, mode, provided_context, started=started, filters=filters),
+                content_type="text/event-stream",
             )
-            return Response(resp)
+            response["Cache-Control"] = "no-cache"
+            response["X-Accel-Buffering"] = "no"
+            return response
 
-        if not messages or "content" not in messages[-1]:
-            return Response({"error": "messages must include content"}, status=400)
+        try:
+            resp = answer(adapter, messages, mode, provided_context, filters=filters)
+        except ChatError as e:
+            return Response({"error": str(e)}, status=e.status)
+        return Response(resp)
 
-        query_text = messages[-1]["content"]
-        vectors = adapter.get_embeddings([query_text])
-        if not vectors:
-            return Response({"error": "Failed to compute query embedding"}, status=500)
-        query_vec = vectors[0]
 
-        top = retrieve_top_k(query_vec, k=8)
+class ChatBatchView(APIView):
+    """
+    POST {"questions": ["...", {"messages": [...]}, ...], "mode": "fast", "filters": {...}}
+    -> {"results": [{"answer", "citations"} | {"error"}, ...], "count", "seconds"}.
+    Results are in question order; one bad item does not fail the batch.
+    """
 
-        if not top:
-            return Response(
-                {"answer": "Sorry, I couldn't find any relevant information.", "citations": []}
-            )
+    permission_classes = [permissions.AllowAny]
 
-        top3 = top[:3]
-        context_snippets = [
-            {"id": t["id"], "source": t["source"], "text": t["text"]} for t in top3
+    def post(self, request):
+        started = time.perf_counter()
+        data = request.data
+        questions = data.get("questions")
+        if not isinstance(questions, list) or not questions:
+            return Response({"error": "questions must be a non-empty list"}, status=400)
+        limit = getattr(settings, "CHAT_BATCH_MAX_ITEMS", 500)
+        if len(questions) > limit:
+            return Response({"error": f"At most {limit} questions per batch"}, status=400)
+        try:
+            filters = parse_filters(data.get("filters"))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+
+        # Anything that is not a question string or {"messages": [...]} is passed
+        # through as-is and becomes a per-item error in answer_batch.
+        conversations = [
+            [{"role": "user", "content": q}] if isinstance(q, str)
+            else q.get("messages") if isinstance(q, dict) else q
+            for q in questions
         ]
+        results = answer_batch(get_adapter(), conversations, mode=data.get("mode", "fast"), filters=filters)
+        return Response({
+            "results": results,
+            "count": len(results),
+            "seconds": round(time.perf_counter() - started, 4),
+        })
 
-        resp = adapter.get_completion(
-            messages=messages, mode=mode, context_snippets=context_snippets
-        )
-
-        if "citations" not in resp:
-            resp["citations"] = [c["id"] for c in context_snippets]
 
-        return Response(resp)
+@csrf_exempt
+@require_POST
+async def chat_async(request):
+    """
+    Native async version of ChatView, same request and response format.
+    Under ASGI (e.g. `uvicorn copilot.asgi:application`) the embedding and
+    completion calls are awaited on the event loop instead of holding a
+    worker thread each, and the index scan runs in a thread pool.
+    """
+    started = time.perf_counter()
+    try:
+        data = json.loads(request.body or b"{}")
+    except ValueError:
+        return JsonResponse({"error": "Invalid JSON body"}, status=400)
+    messages = data.get("messages", [])
+    provided_context = data.get("context_snippets", [])
+    mode = data.get("mode", "fast")
+    try:
+        filters = parse_filters(data.get("filters"))
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    adapter = get_adapter()
+
+    if data.get("stream"):
+        if not provided_context and (not messages or "content" not in messages[-1]):
+            return JsonResponse({"error": "messages must include content"}, status=400)
+        response = StreamingHttpResponse(
+            astream_answer(adapter, messages, mode, provided_context, started=started, filters=filters),
+            content_type="text/event-stream",
+        )
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+    try:
+        resp = await aanswer(adapter, messages, mode, provided_context, filters=filters)
+    except ChatError as e:
+        return JsonResponse({"error": str(e)}, status=e.status)
+    return JsonResponse(resp)
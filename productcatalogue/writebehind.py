@@ -0,0 +1,253 @@
+"""
+Write-behind queue for database writes that must not add latency to chat.
+
+The chat path only submit()s small records: QueryLog rows when
+QUERY_LOG_ENABLED is on, and query embeddings for the persistent tier of the
+query cache (QUERY_EMBEDDING_CACHE_PERSIST). One daemon thread drains the
+queue in batches of up to WRITE_BEHIND_BATCH_SIZE and writes every record
+kind with a single bulk_create. Persisted query embeddings are capped at
+QUERY_EMBEDDING_CACHE_PERSIST_MAX rows per model; the oldest are pruned at
+most every QUERY_EMBEDDING_CACHE_PRUNE_SECONDS, so the table can briefly run
+over the cap by what was written in between.
+
+The queue is bounded (WRITE_BEHIND_QUEUE_SIZE). When it is full, submit()
+waits at most WRITE_BEHIND_PUT_TIMEOUT seconds for room (async callers do not
+wait at all) and then drops the record, so a slow database slows logging
+down, never chat. Whatever is still queued is written by flush(), which runs
+at interpreter exit.
+"""
+import atexit
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+from django.db.models import Q
+
+POLL_INTERVAL = 0.5  # seconds the worker waits for records before checking for shutdown
+
+_pruned_at = {}  # query model key -> time.monotonic() of its last prune
+
+
+def _write_query_logs(records):
+    from .models import QueryLog
+    QueryLog.objects.bulk_create([QueryLog(**r) for r in records])
+
+
+def _write_query_embeddings(records):
+    from .models import EmbeddingCache
+    from .utils import pack_vector
+    EmbeddingCache.objects.bulk_create(
+        [
+            EmbeddingCache(model=r['model'], text_hash=r['text_hash'], vector_blob=pack_vector(r['vector']), dim=len(r['vector']))
+            for r in records
+        ],
+        ignore_conflicts=True,
+    )
+    limit = getattr(settings, "QUERY_EMBEDDING_CACHE_PERSIST_MAX", 100000)
+    if not limit:
+        return
+    interval = getattr(settings, "QUERY_EMBEDDING_CACHE_PRUNE_SECONDS", 60)
+    now = time.monotonic()
+    for model in {r['model'] for r in records}:
+        last = _pruned_at.get(model)
+        if last is None or now - last >= interval:
+            _pruned_at[model] = now
+            _prune_query_embeddings(model, limit)
+
+
+def _prune_query_embeddings(model, limit):
+    """Keep the newest `limit` rows of one query model key."""
+    from .models import EmbeddingCache
+    rows = EmbeddingCache.objects.filter(model=model)
+    cutoff = rows.order_by('-created_at', '-id').values_list('created_at', 'id')[limit:limit + 1].first()
+    if cutoff is not None:
+        created_at, row_id = cutoff
+        rows.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lte=row_id)).delete()
+
+
+HANDLERS = {
+    'query_log': _write_query_logs,
+    'query_embedding': _write_query_embeddings,
+}
+
+
+class WriteBehindQueue:
+    """
+    Bounded queue of (kind, record) pairs written in batches by `handlers[kind](records)`.
+    With background=False no thread is started and records are only written
+    by flush() (tests, management commands).
+    """
+
+    def __init__(self, handlers, maxsize=10000, batch_size=200, put_timeout=0.05, background=True):
+        self.handlers = handlers
+        self.batch_size = max(1, batch_size)
+        self.put_timeout = put_timeout
+        self.background = background
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self._queue = queue.Queue(maxsize)
+        self._counter_lock = threading.Lock()  # submit() runs on many request threads
+        self._write_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def submit(self, kind, record, block=True):
+        """Queue a record; returns False when it was dropped because the queue stayed full."""
+        if kind not in self.handlers:
+            raise KeyError(f"No write-behind handler for {kind!r}")
+        try:
+            if block and self.put_timeout > 0:
+                self._queue.put((kind, record), timeout=self.put_timeout)
+            else:
+                self._queue.put_nowait((kind, record))
+        except queue.Full:
+            self._count('dropped', 1)
+            return False
+        self._count('submitted', 1)
+        self._ensure_worker()
+        return True
+
+    def _count(self, name, n):
+        with self._counter_lock:
+            setattr(self, name, getattr(self, name) + n)
+
+    def _ensure_worker(self):
+        if not self.background or self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None and not self._stopping.is_set():
+                self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+                self._thread.start()
+
+    def _take(self, wait):
+        items = []
+        try:
+            items.append(self._queue.get(timeout=wait) if wait else self._queue.get_nowait())
+        except queue.Empty:
+            return items
+        while len(items) < self.batch_size:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def _write(self, items):
+        by_kind = {}
+        for kind, record in items:
+            by_kind.setdefault(kind, []).append(record)
+        with self._write_lock:
+            for kind, records in by_kind.items():
+                try:
+                    self.handlers[kind](records)
+                    self._count('written', len(records))
+                except Exception as e:
+                    self._count('failed', len(records))
+                    print(f"❌ Write-behind: {len(records)} {kind} records failed: {e}")
+
+    def _run(self):
+        try:
+            while not self._stopping.is_set():
+                items = self._take(POLL_INTERVAL)
+                if items:
+                    # Like a request: drop a connection that broke or outlived CONN_MAX_AGE.
+                    close_old_connections()
+                    self._write(items)
+        finally:
+            connections.close_all()
+
+    def flush(self):
+        """Write everything queued so far from the calling thread. Returns the number of records taken."""
+        taken = 0
+        while True:
+            items = self._take(None)
+            if not items:
+                break
+            self._write(items)
+            taken += len(items)
+        with self._write_lock:  # wait for a batch the worker is writing
+            pass
+        return taken
+
+    def close(self, timeout=5.0):
+        """Stop the worker and write what is left."""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        written = self.flush()
+        if written:
+            print(f"✅ Write-behind: flushed {written} queued records")
+
+    def stats(self):
+        with self._counter_lock:
+            return {
+                'queued': self._queue.qsize(),
+                'submitted': self.submitted,
+                'written': self.written,
+                'dropped': self.dropped,
+                'failed': self.failed,
+            }
+
+
+_lock = threading.Lock()
+_queue = None
+
+
+def get_write_behind():
+    """Process-wide queue built from settings; flushed at interpreter exit."""
+    global _queue
+    if _queue is None:
+        with _lock:
+            if _queue is None:
+                _queue = WriteBehindQueue(
+                    HANDLERS,
+                    maxsize=getattr(settings, "WRITE_BEHIND_QUEUE_SIZE", 10000),
+                    batch_size=getattr(settings, "WRITE_BEHIND_BATCH_SIZE", 200),
+                    put_timeout=getattr(settings, "WRITE_BEHIND_PUT_TIMEOUT", 0.05),
+                    background=getattr(settings, "WRITE_BEHIND_BACKGROUND", True),
+                )
+                atexit.register(_queue.close)
+    return _queue
+
+
+def write_behind_stats():
+    return _queue.stats() if _queue is not None else None
+
+
+def reset_write_behind():
+    """Close the process-wide queue, writing what is left (tests, settings changes)."""
+    global _queue
+    with _lock:
+        q, _queue = _queue, None
+    if q is not None:
+        atexit.unregister(q.close)
+        q.close()
+    _pruned_at.clear()
+
+
+def log_query(question, mode, answer, citations, latency_ms=None, block=True):
+    """Queue a QueryLog row when QUERY_LOG_ENABLED is on; never writes synchronously."""
+    if not getattr(settings, "QUERY_LOG_ENABLED", False):
+        return
+    get_write_behind().submit('query_log', {
+        'question': question,
+        'mode': mode,
+        'answer': answer or "",
+        'citations': list(citations or []),
+        'latency_ms': latency_ms,
+    }, block=block)
+
+
+def persist_query_embedding(model, text_hash, vector, block=True):
+    """
+    Queue a query embedding for the EmbeddingCache table (persistent query
+    cache tier); `model` is already namespaced (embedding_cache.query_model_key).
+    """
+    get_write_behind().submit('query_embedding', {
+        'model': model, 'text_hash': text_hash, 'vector': list(vector),
+    }, block=block)